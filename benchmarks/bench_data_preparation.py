@@ -0,0 +1,102 @@
+"""
+Benchmark error flagging / filtering / splitting in `prepare_data`.
+
+Compares the previous per-record implementation (one coroutine per record, gathered on the
+event loop) with the columnar implementation used by `prepare_data`, on synthetic data.
+
+    python benchmarks/bench_data_preparation.py --rows 2000000 --datasets 4
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from error_map.core.config import Config
+from error_map.stages.data_preparation import _flag_errors
+from error_map.utils.constants import dataset2params
+
+
+def _make_frames(rows: int, num_datasets: int, num_models: int, seed: int) -> List[pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    per_dataset = rows // num_datasets
+    frames = []
+    for i in range(num_datasets):
+        frames.append(pd.DataFrame({
+            "example_id": np.arange(per_dataset) // num_models,
+            "model": np.array([f"model_{j}" for j in range(num_models)])[np.arange(per_dataset) % num_models],
+            "score": rng.random(per_dataset).round(2),
+            "dataset": "omni_math" if i == 0 else f"dataset_{i}",
+        }))
+    return frames
+
+
+async def _legacy_record(record: Dict, config: Config, models: Optional[List[str]], thresholds: Dict) -> Dict:
+    dataset = record['dataset']
+    threshold = config.dataset_params.get(dataset, {}).get('success_threshold', thresholds.get(dataset, 0.7))
+    record['error'] = record['score'] < threshold
+    if models and record['model'] not in models and record['error']:
+        record['_filtered'] = True
+    else:
+        record['_filtered'] = False
+    return record
+
+
+async def _legacy(frames: List[pd.DataFrame], config: Config, models: Optional[List[str]]) -> int:
+    records = []
+    for df in frames:
+        records.extend(df.to_dict('records'))
+    df = pd.DataFrame(records)
+    thresholds_df = df.groupby("dataset")["score"].mean().reset_index()
+    ds2threshold = {item["dataset"]: round(item["score"] * 0.7, 2) for item in thresholds_df.to_dict(orient="records")}
+    records = await asyncio.gather(*[_legacy_record(record, config, models, ds2threshold) for record in records])
+    records = [r for r in records if not r.get('_filtered', False)]
+    failures = [r for r in records if r['error']]
+    successes = [r for r in records if not r['error']]
+    return len(failures) + len(successes)
+
+
+def _columnar(frames: List[pd.DataFrame], config: Config, models: Optional[List[str]]) -> int:
+    ds2threshold = {df["dataset"].iat[0]: round(df["score"].mean() * 0.7, 2) for df in frames}
+    total = 0
+    for df in frames:
+        df = _flag_errors(df.copy(), config, models, ds2threshold)
+        df = df[~df['_filtered'].to_numpy()]
+        error_mask = df['error'].to_numpy()
+        total += len(df[error_mask]) + len(df[~error_mask])
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--datasets", type=int, default=4)
+    parser.add_argument("--models", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frames = _make_frames(args.rows, args.datasets, args.models, args.seed)
+    config = Config(output_dir=Path(tempfile.mkdtemp()), dataset_params=dataset2params, datasets=["unused"])
+    models = ["model_0", "model_1"]
+
+    start = time.perf_counter()
+    legacy_total = asyncio.run(_legacy(frames, config, models))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columnar_total = _columnar(frames, config, models)
+    columnar_time = time.perf_counter() - start
+
+    assert legacy_total == columnar_total, (legacy_total, columnar_total)
+    print(f"rows={args.rows:,} datasets={args.datasets} models={args.models} kept={columnar_total:,}")
+    print(f"per-record coroutines: {legacy_time:8.3f}s")
+    print(f"columnar:              {columnar_time:8.3f}s  ({legacy_time / columnar_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark the HTTP path (LiteLLM, connection handling, JSON decoding) against the bundled local
+OpenAI-compatible server, at several `max_workers` settings.
+
+Starts `python -m error_map.inference.local_server` in a subprocess (so its work doesn't show up in the
+client's event loop), runs `ErrorMap.run` against it once per `--max-workers` value (fixed concurrency,
+fresh caches), and reports judge calls/s, p50/p99 call latency, event-loop lag and the connections opened.
+
+    python benchmarks/bench_http.py --errors 5000 --max-workers 50 200 800 --latency 0.2 --jitter 0.5
+"""
+
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench_pipeline import _write_dataset
+from error_map import ErrorMap
+
+
+class _TimedClient:
+    """Records the latency of every `acompletion` call"""
+
+    def __init__(self, client):
+        self.client = client
+        self.latencies = []
+
+    async def acompletion(self, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self.client.acompletion(**kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+async def _monitor_lag(lags, interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Local judge server didn't start on port {port}")
+
+
+async def _run(error_map: ErrorMap):
+    timed = _TimedClient(error_map.inference_client.client)
+    error_map.inference_client.client = timed
+    lags = []
+    monitor = asyncio.create_task(_monitor_lag(lags))
+    start = time.perf_counter()
+    try:
+        await error_map.run()
+    finally:
+        monitor.cancel()
+    return time.perf_counter() - start, timed.latencies, lags, error_map.inference_client.connection_pool.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--errors", type=int, default=2000, help="Approximate number of failures to analyze")
+    parser.add_argument("--max-workers", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency spread, relative to the mean")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--overload-rate", type=float, default=0.0)
+    parser.add_argument("--tpm", type=int, help="Server tokens-per-minute cap")
+    parser.add_argument("--adaptive", action="store_true", help="Use the adaptive concurrency limit (default: fixed max_workers)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="error_map_bench_http_"))
+    data_dir = work_dir / "data"
+    data_dir.mkdir()
+    _write_dataset(data_dir, args.errors, 4, args.seed)
+
+    port = _free_port()
+    server_args = [sys.executable, "-m", "error_map.inference.local_server", "--port", str(port),
+                   "--latency", str(args.latency), "--jitter", str(args.jitter), "--seed", str(args.seed),
+                   "--failure-rate", str(args.failure_rate), "--overload-rate", str(args.overload_rate)]
+    if args.tpm:
+        server_args += ["--tpm", str(args.tpm)]
+    server = subprocess.Popen(server_args, stdout=subprocess.DEVNULL)
+    rows = []
+    try:
+        _wait_for_port(port)
+        for max_workers in args.max_workers:
+            error_map = ErrorMap(
+                inference_type="litellm",
+                litellm_config={"model": "openai/local-judge", "api_base": f"http://127.0.0.1:{port}/v1", "api_key": "local"},
+                exp_id=f"workers_{max_workers}",
+                data_path=str(data_dir),
+                output_dir=work_dir / f"workers_{max_workers}",
+                datasets=["bench"],
+                ratio=1.0,
+                seed=args.seed,
+                max_workers=max_workers,
+                adaptive_concurrency=args.adaptive,
+                export_csv=False,
+            )
+            elapsed, latencies, lags, connections = asyncio.run(_run(error_map))
+            calls = len(latencies)
+            rows.append((max_workers, calls, calls / elapsed, *np.percentile(latencies, [50, 99]),
+                         *np.percentile(lags, [50, 99]), max(lags), connections["connections_opened"]))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"\nerrors~{args.errors:,} latency={args.latency}s jitter={args.jitter} "
+          f"failure_rate={args.failure_rate} overload_rate={args.overload_rate} tpm={args.tpm}")
+    print(f"{'max_workers':>11} {'calls':>7} {'calls/s':>9} {'p50 (s)':>8} {'p99 (s)':>8} {'lag p50 (ms)':>13} {'lag p99 (ms)':>13} {'lag max (ms)':>13} {'connections':>11}")
+    for max_workers, calls, rate, p50, p99, lag50, lag99, lag_max, connections in rows:
+        print(f"{max_workers:>11} {calls:>7} {rate:>9.1f} {p50:>8.3f} {p99:>8.3f} {lag50 * 1000:>13.1f} {lag99 * 1000:>13.1f} {lag_max * 1000:>13.1f} {connections:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark (and optionally profile) the whole pipeline with the synthetic judge, without a provider.
+
+Writes a synthetic dataset with about `--errors` failures, runs `ErrorMap` with `inference_type="synthetic"`
+(every stage runs its real code path) and reports the time per stage and the judge throughput.
+
+    python benchmarks/bench_pipeline.py --errors 100000 --latency 0.5 --max-workers 500
+    python benchmarks/bench_pipeline.py --errors 20000 --latency 0 --profile pipeline.prof
+"""
+
+import argparse
+import asyncio
+import cProfile
+import pstats
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from error_map import ErrorMap
+
+
+def _write_dataset(data_dir: Path, num_errors: int, num_models: int, seed: int) -> None:
+    """One dataset where about half the rows are failures"""
+    rng = np.random.default_rng(seed)
+    rows = num_errors * 2
+    example_ids = np.arange(rows) // num_models
+    pd.DataFrame({
+        "example_id": example_ids,
+        "model": np.array([f"model_{j}" for j in range(num_models)])[np.arange(rows) % num_models],
+        "input_text": [f"Question {i}: what is {i} + {i}?" for i in example_ids],
+        "output_text": [f"The answer is {v}" for v in rng.integers(0, 1000, rows)],
+        "score": (rng.random(rows) < 0.5).astype(float),
+        "correct_answer": [str(2 * i) for i in example_ids],
+    }).to_csv(data_dir / "bench.csv", index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--errors", type=int, default=10_000, help="Approximate number of failures to analyze")
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean synthetic judge latency in seconds")
+    parser.add_argument("--latency-distribution", default="lognormal")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--overload-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, help="Synthetic endpoint capacity (429s beyond it)")
+    parser.add_argument("--max-workers", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", help="Write a cProfile dump of the run to this file, and print the top functions")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="error_map_bench_"))
+    data_dir = work_dir / "data"
+    data_dir.mkdir()
+    _write_dataset(data_dir, args.errors, args.models, args.seed)
+
+    error_map = ErrorMap(
+        inference_type="synthetic",
+        exp_id="bench",
+        data_path=str(data_dir),
+        output_dir=work_dir / "output",
+        datasets=["bench"],
+        ratio=1.0,
+        seed=args.seed,
+        max_workers=args.max_workers,
+        export_csv=False,
+        synthetic_params={
+            "latency_mean": args.latency,
+            "latency": args.latency_distribution,
+            "failure_rate": args.failure_rate,
+            "overload_rate": args.overload_rate,
+            "max_concurrency": args.max_concurrency,
+        },
+    )
+
+    # time each stage through its cached wrapper
+    timings = {}
+    for stage in ["prepare_data", "analyze_single_errors", "construct_taxonomy_recursively"]:
+        func = getattr(error_map, stage)
+
+        async def timed(*a, _func=func, _stage=stage, **kw):
+            start = time.perf_counter()
+            try:
+                return await _func(*a, **kw)
+            finally:
+                timings[_stage] = time.perf_counter() - start
+        setattr(error_map, stage, timed)
+
+    profiler = cProfile.Profile() if args.profile else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    result = asyncio.run(error_map.run())
+    if profiler:
+        profiler.disable()
+    total = time.perf_counter() - start
+
+    judge = error_map.inference_client.client
+    print(f"\nerrors={result['error_records']:,} judge calls={judge.calls:,} latency={args.latency}s ({args.latency_distribution}) "
+          f"max_workers={args.max_workers}")
+    for stage, seconds in timings.items():
+        print(f"{stage:32s} {seconds:9.2f}s")
+    print(f"{'total':32s} {total:9.2f}s  ({judge.calls / total:,.0f} judge calls/s)")
+    print(f"outputs: {work_dir}")
+
+    if profiler:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,30 @@
+import asyncio
 import json
 import os
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 from datetime import datetime
 from error_map.utils.constants import TaxonomyParams, dataset2params
 from .core.config import Config
 from .stages import prepare_data, analyze_single_errors, construct_taxonomy_recursively
-from .utils.cache import cached
+from .utils.cache import cached, StageResult
+from .utils.cache_store import CacheStore
 from .inference import InferenceClient
+from .inference.retry import RetryPolicy
+from .inference.metering import Meter, metered
+from .inference.synthetic import SyntheticJudge
+
+# Judge templates used by each stage, for per-stage call statistics
+STAGE_TEMPLATES = {
+    "single_error": ["single_error_analysis.j2"],
+    "taxonomy": ["taxonomy_generation.j2", "taxonomy_update.j2", "taxonomy_review.j2", "classify_errors.j2"],
+}
+
+
+def _cache_store(cache_dir: Optional[str], output_dir: Optional[Path], cache_max_size: Optional[str], cache_ttl: Optional[str]) -> CacheStore:
+    """Cache store of an experiment: `cache_dir`, else $ERROR_MAP_CACHE_DIR, else `<output_dir>/cache`"""
+    cache_limits = {"max_size": cache_max_size, "ttl": cache_ttl}
+    return CacheStore(cache_dir, **cache_limits) if cache_dir else CacheStore.default(Path(output_dir or "output"), **cache_limits)
 
 
 class ErrorMap:
@@ -29,11 +46,31 @@ class ErrorMap:
                  use_correct_predictions: bool = True,
                  rare_freq: float = 0.0,
                  cols_to_keep: List[str] = None,
+                 chunk_size: Optional[int] = None,
+                 export_csv: bool = True,
+                 cache_dir: Optional[str] = None,
+                 cache_max_size: Optional[str] = None,
+                 cache_ttl: Optional[str] = None,
+                 inference_client: Optional[InferenceClient] = None,
+                 adaptive_concurrency: bool = True,
+                 max_retries: int = 5,
+                 rpm_limit: Optional[int] = None,
+                 tpm_limit: Optional[int] = None,
+                 endpoints: Optional[List[Union[str, Dict]]] = None,
+                 streaming: bool = False,
+                 http2: bool = False,
+                 prompt_caching: Optional[bool] = None,
+                 prompt_token_budgets: Optional[Dict[str, int]] = None,
+                 max_tokens: Optional[Dict[str, int]] = None,
+                 response_cache_bypass: Optional[List[str]] = None,
+                 batch_mode: Optional[str] = None,
+                 batch_dir: Optional[str] = None,
+                 synthetic_params: Optional[Dict] = None,
                  ):
         
         
         """
-            inference_type (str): Specifies the inference backend type. Default is "litellm-mock" for testing without actual model calls.
+            inference_type (str): Specifies the inference backend type. Default is "litellm-mock" for testing without actual model calls. "synthetic" answers every prompt with schema-valid JSON from a local synthetic judge, so that all stages run their real code paths (for load tests and profiling).
             litellm_config (Optional[Dict]): Configuration dictionary for LiteLLM, used when inference_type involves real model inference.
             exp_id (str): Unique identifier for the experiment, useful for tracking and logging results.
             output_dir (Path): Directory to store output files.
@@ -45,10 +82,30 @@ class ErrorMap:
             seed (Optional[int]): Random seed for reproducibility.
             models (List[str]): List of model names to be used.
             ratio (float): Sampling ratio for data.
-            max_workers (int): Maximum number of parallel workers for processing.
+            max_workers (int): Maximum number of concurrent judge calls (the ceiling of the adaptive concurrency limit).
             use_correct_predictions (bool): Utilize correct predictions from other models as references for the analyzer.
             rare_freq (float): Avoid long-tail categories (categories with a frequency below the specified threshold will be combined into an “Other” category).
             cols_to_keep (List[str]): Control the output file and include additional instance-level information from the input data file.
+            chunk_size (Optional[int]): Read datasets in chunks of this many rows (bounded-memory mode, keeps only the sampled errors and their reference successes). Default is None (load whole files).
+            export_csv (bool): Also export every stage's results as CSV next to the Parquet output files. Default is True.
+            cache_dir (Optional[str]): Location of the stage and judge-response caches. Default is $ERROR_MAP_CACHE_DIR, or `<output_dir>/cache`.
+            cache_max_size (Optional[str]): Maximum size of each cache (e.g. "20GB"), least recently used entries are evicted first. Default is None (stage cache unbounded, judge-response cache 1GB).
+            cache_ttl (Optional[str]): Expire cached stage results unused for this long, and judge responses this long after they were stored (e.g. "7d"). Default is None (no expiry).
+            inference_client (Optional[InferenceClient]): Use an existing client (and its concurrency budget and judge-response cache), e.g. one shared by several experiments, left open for its owner to close. Default is None (a new client from the inference parameters above, closed at the end of `run`).
+            adaptive_concurrency (bool): Adapt the number of concurrent judge calls to the endpoint: raise it while calls succeed with healthy latency, and cut it on rate limits (429), unavailability (503) and timeouts. Default is True (False: always `max_workers`).
+            max_retries (int): Retries of judge calls that failed with a retryable error (rate limit, timeout, 5xx, connection error), with exponential backoff and jitter, honoring `Retry-After`. Default is 5.
+            rpm_limit (Optional[int]): Requests-per-minute quota of the judge endpoint, calls are paced to stay within it. Default is None (no limit).
+            tpm_limit (Optional[int]): Tokens-per-minute quota of the judge endpoint. Each call reserves its estimated prompt tokens plus `max_tokens`, and gives back what the response didn't use. Default is None (no limit).
+            endpoints (Optional[List[Union[str, Dict]]]): Several deployments of the judge to spread the calls over: api_base URLs, or dicts of LiteLLM parameters overriding `litellm_config`/the provider's (`api_base`, `api_key`, `api_version`, `model`, ...) with an optional `max_concurrency`. Calls go to the deployment with the fewest outstanding requests, deployments failing repeatedly cool down, and `rpm_limit`/`tpm_limit` apply to each. Default is None (the single endpoint of the provider or `litellm_config`).
+            streaming (bool): Stream the judge responses and validate them against their schema as they arrive: a response breaking its schema or running away (repeating itself, or past `max_tokens`) is aborted and retried instead of waited for. Costs client CPU per streamed chunk. Default is False.
+            prompt_caching (Optional[bool]): Send the stable prefix of the prompts (instructions and shared taxonomy, identical across calls) as a separate content part marked for the provider's prompt cache. Default is None (when LiteLLM knows the judge supports prompt caching). Cached prompt tokens are reported in the run summary either way.
+            http2 (bool): Send the judge calls to OpenAI-compatible and Azure https endpoints over HTTP/2, multiplexed on a few connections of the client's keep-alive pool (other endpoints use HTTP/1.1 keep-alive connections). Default is False.
+            prompt_token_budgets (Optional[Dict[str, int]]): Token budget of the template variables per template, e.g. {"single_error_analysis.j2": 16000}: when the inputs exceed it, the longest are trimmed to fit, keeping their head and tail. Default is None (24000 tokens for the single-error analysis, other templates untrimmed).
+            max_tokens (Optional[Dict[str, int]]): Completion budget (`max_tokens`) per template, used instead of a `max_tokens` in `litellm_config`. Default is None (4096 for the single-error analysis, 8192 for the taxonomy construction, 10000 for classification).
+            response_cache_bypass (Optional[List[str]]): Stages ("single_error", "taxonomy") whose judge calls skip the judge-response cache lookup (their fresh responses still replace the cached ones). Default is None (all stages use the cache).
+            batch_mode (Optional[str]): Send the single-error judge calls as one OpenAI-batch-format job instead of interactive calls: "openai" (submit to the judge provider's batch API and wait for it), "offline" (write the request shards for an external runner, and ingest its results on a re-run) or "local" (file-based stand-in answering mock responses, for testing). Default is None (interactive calls).
+            batch_dir (Optional[str]): Where batch request shards and results are written. Default is `<cache_dir>/batches`.
+            synthetic_params (Optional[Dict]): `SyntheticJudge` parameters for `inference_type="synthetic"`, e.g. {"latency_mean": 0.5, "latency": "lognormal", "failure_rate": 0.01, "overload_rate": 0.01, "max_concurrency": 200}. Default is None (its defaults, seeded with `seed`).
         """
         
         self.inference_type = inference_type
@@ -61,6 +118,8 @@ class ErrorMap:
         self.litellm_config = litellm_config
         self.rare_freq = rare_freq
         self.cols_to_keep = cols_to_keep
+        self.chunk_size = chunk_size
+        self.export_csv = export_csv
         
         # save exp. config params
         params = {
@@ -79,6 +138,26 @@ class ErrorMap:
             "ratio": ratio,
             "litellm_config": litellm_config,
             "rare_freq": rare_freq,
+            "chunk_size": chunk_size,
+            "export_csv": export_csv,
+            "cache_dir": cache_dir,
+            "cache_max_size": cache_max_size,
+            "cache_ttl": cache_ttl,
+            "adaptive_concurrency": adaptive_concurrency,
+            "max_retries": max_retries,
+            "rpm_limit": rpm_limit,
+            "tpm_limit": tpm_limit,
+            "endpoints": [{k: v for k, v in endpoint.items() if k != "api_key"} if isinstance(endpoint, dict) else endpoint
+                          for endpoint in endpoints] if endpoints else None,
+            "streaming": streaming,
+            "http2": http2,
+            "prompt_caching": prompt_caching,
+            "prompt_token_budgets": prompt_token_budgets,
+            "max_tokens": max_tokens,
+            "response_cache_bypass": response_cache_bypass,
+            "batch_mode": batch_mode,
+            "batch_dir": batch_dir,
+            "synthetic_params": synthetic_params,
         }
         with open(os.path.join(self.output_dir, "config__exp_id=" + self.exp_id + ".json"), "w") as f:
             json.dump(params, f, indent=4)
@@ -93,57 +172,121 @@ class ErrorMap:
             seed=seed,
         )
 
-        # Setup inference client
-        self.inference_client = InferenceClient(
+        # Setup caches and inference client
+        self.cache_store = _cache_store(cache_dir, self.output_dir, cache_max_size, cache_ttl)
+        # a client passed in (e.g. shared by several experiments) is closed by its owner, not by this experiment
+        self._owns_client = inference_client is None
+        self.inference_client = inference_client or InferenceClient(
             inference_type=inference_type,
             judge=judge,
             max_workers=max_workers,
             provider=provider,
             litellm_config=litellm_config,
+            cache_store=self.cache_store,
+            adaptive_concurrency=adaptive_concurrency,
+            retry_policy=RetryPolicy(max_retries=max_retries),
+            rpm_limit=rpm_limit,
+            tpm_limit=tpm_limit,
+            endpoints=endpoints,
+            streaming=streaming,
+            http2=http2,
+            prompt_caching=prompt_caching,
+            prompt_token_budgets=prompt_token_budgets,
+            max_tokens=max_tokens,
+            cache_bypass=[template for stage in response_cache_bypass or [] for template in STAGE_TEMPLATES[stage]],
+            batch_executor=batch_mode,
+            batch_dir=batch_dir,
+            synthetic_judge=SyntheticJudge(**{"seed": seed or 0, **(synthetic_params or {})}) if inference_type == "synthetic" else None,
         )
         
-        # Apply output_dir to cached functions
-        global prepare_data, analyze_single_errors, construct_taxonomy_recursively
-        prepare_data = cached("data_preparation", self.output_dir)(prepare_data.__wrapped__)
-        analyze_single_errors = cached("single_error", self.output_dir)(analyze_single_errors.__wrapped__)
-        construct_taxonomy_recursively = cached("construct_taxonomy_recursively", self.output_dir)(construct_taxonomy_recursively.__wrapped__)
+        # Stages cached in this experiment's output_dir and cache store
+        self.prepare_data = cached("data_preparation", self.output_dir, export_csv=export_csv, store=self.cache_store)(prepare_data.__wrapped__)
+        self.analyze_single_errors = cached("single_error", self.output_dir, export_csv=export_csv, store=self.cache_store)(analyze_single_errors.__wrapped__)
+        self.construct_taxonomy_recursively = cached("construct_taxonomy_recursively", self.output_dir, export_csv=export_csv, store=self.cache_store)(construct_taxonomy_recursively.__wrapped__)
     
     async def run(self) -> Dict:
+        """
+        Run all stages. Returns a summary of the run, incl. `run_summary`: the judge calls' tokens, cost,
+        latency, retries and cache hits per stage, template and taxonomy recursion depth (also written to
+        `run_summary__exp_id=<exp_id>.json` next to the config file).
+        """
+        meter = Meter()
+        try:
+            with metered(meter):
+                summary = await self._run_stages(meter)
+        finally:
+            if self._owns_client:
+                await self.inference_client.aclose()
+        summary["run_summary"] = {"exp_id": self.exp_id, **meter.summary()}
+        with open(os.path.join(self.output_dir, "run_summary__exp_id=" + self.exp_id + ".json"), "w") as f:
+            json.dump(summary["run_summary"], f, indent=4)
+        self._print_usage(summary["run_summary"])
+        return summary
+
+    async def _run_stages(self, meter: Meter) -> Dict:
         print(f"🚀 Running error analysis: {self.exp_id}")
         
-        data = await prepare_data(
-            exp_id=self.exp_id,
-            config=self.config,
-            models=self.models,
-            ratio=self.ratio,
-        )
+        with meter.stage("data_preparation"):
+            data = await self.prepare_data(
+                exp_id=self.exp_id,
+                config=self.config,
+                models=self.models,
+                ratio=self.ratio,
+                chunk_size=self.chunk_size,
+                cols_to_keep=self.cols_to_keep,
+            )
         print(f"📊 Prepared {len(data)} records")
 
         errors = [r for r in data if r.get('error', False)]
         if errors:
-            analyzed = await analyze_single_errors(
-                records=data,
-                config=self.config,
-                exp_id=self.exp_id,
-                inference_client=self.inference_client,
-                use_correct_predictions = self.use_correct_predictions,
-            )
+            with meter.stage("single_error"):
+                analyzed = await self.analyze_single_errors(
+                    records=data,
+                    config=self.config,
+                    exp_id=self.exp_id,
+                    inference_client=self.inference_client,
+                    use_correct_predictions = self.use_correct_predictions,
+                )
             print(f"🔍 Analyzed {len(analyzed)} errors")
+            concurrency = self.inference_client.concurrency_stats()
+            # the limiter, quotas, endpoints and connections belong to the client: shared with the other experiments using it
+            shared = "" if self._owns_client else " (client shared with other experiments)"
+            print(f"⚙️ Judge concurrency{shared}: limit {concurrency['limit']}/{concurrency['max_limit']}, "
+                  f"{concurrency['overloads']} overloaded calls, {concurrency['errors']} failed calls"
+                  + (f", {concurrency['rate_limit_wait_s']}s total wait for the RPM/TPM quotas" if "rate_limit_wait_s" in concurrency else ""))
+            for name, endpoint in concurrency.get("endpoints", {}).items():
+                print(f"🌐 {name}{shared}: {endpoint['calls']} calls, {endpoint['errors']} failed, {endpoint['cooldowns']} cooldowns")
+            if "connections" in concurrency:
+                connections = concurrency["connections"]
+                print(f"🔌 Judge connections{shared}: {connections['connections_opened']} opened for {connections['requests']} requests "
+                      f"({connections['connections_reused']} reused a kept-alive connection), {connections['pool_waits']} waits for a free connection")
+            self._print_call_stats("single_error", meter)
         else:
             analyzed = []
             print("ℹ️ No errors to analyze")
 
-        if analyzed:
-            await construct_taxonomy_recursively(
-                records=analyzed, 
-                config=self.config, 
-                exp_id=self.exp_id,
-                inference_client=self.inference_client,
-                rare_freq=self.rare_freq,
-                cols_to_keep=self.cols_to_keep,
-            )
+        # errors the judge couldn't analyze have no description to build the taxonomy from
+        judged = [r for r in analyzed if r.get('inference_success')]
+        if len(judged) < len(analyzed):
+            print(f"⚠️ Leaving {len(analyzed) - len(judged)} errors without a judge analysis out of the taxonomy")
+            judged = StageResult(judged, f"{analyzed.cache_key}:judged" if getattr(analyzed, "cache_key", None) else None)
+        else:
+            judged = analyzed
+
+        if judged:
+            with meter.stage("taxonomy"):
+                await self.construct_taxonomy_recursively(
+                    records=judged, 
+                    config=self.config, 
+                    exp_id=self.exp_id,
+                    inference_client=self.inference_client,
+                    rare_freq=self.rare_freq,
+                    cols_to_keep=self.cols_to_keep,
+                )
+            self._print_call_stats("taxonomy", meter)
         else:
             print("ℹ️ No errors to build taxonomy")
+        self.inference_client.response_cache.flush()
 
         return {
             "exp_id": self.exp_id,
@@ -153,6 +296,21 @@ class ErrorMap:
         }
 
 
+    def _print_call_stats(self, stage: str, meter: Meter) -> None:
+        """This experiment's judge calls of a stage (counted in its meter, also when the client is shared)"""
+        stats = meter.call_stats(STAGE_TEMPLATES[stage])
+        print(f"🔁 {stage} judge calls: {stats['calls']} calls, {stats['retried']} retried ({stats['retries']} retries, "
+              f"{stats['recovered']} recovered), {stats['failed_permanent']} failed permanently, "
+              f"{stats['failed_retryable']} failed after {self.inference_client.retry_policy.max_retries} retries, "
+              f"{stats['cache_hits']} served from the response cache, {stats['coalesced']} coalesced with identical calls in flight"
+              + (f", {stats['aborted']} streamed responses aborted for breaking their schema" if stats['aborted'] else "")
+              + (f", {stats['trimmed']} prompts trimmed to their token budget ({stats['trimmed_tokens']} tokens)" if stats['trimmed'] else ""))
+
+    def _print_usage(self, run_summary: Dict) -> None:
+        for stage, usage in run_summary["stages"].items():
+            print(f"🧾 {stage}: {usage.get('wall_time_s', 0)}s, {usage['calls']} judge calls, "
+                  f"{usage['prompt_tokens']} prompt ({usage['cached_tokens']} cached) + {usage['completion_tokens']} completion tokens, ${usage['cost_usd']:.4f}")
+
 
 async def run(
             inference_type: str = "litellm-mock",
@@ -176,5 +334,49 @@ async def run(
     return await error_map.run()
 
 
+async def run_experiments(
+            experiments: List[Union[ErrorMap, Dict]],
+            inference_client: Optional[InferenceClient] = None,
+            **client_kwargs,
+            ) -> List[Union[Dict, BaseException]]:
+    """
+    Run several experiments concurrently in one event loop.
+
+    experiments (List[ErrorMap | Dict]): ErrorMap instances, or ErrorMap keyword arguments. Experiments given
+        as arguments share `inference_client`, i.e. one concurrency budget (`max_workers`) and one judge-response cache.
+    inference_client (Optional[InferenceClient]): The shared client, left open. Default is a new client created from `client_kwargs`
+        (`inference_type`, `judge`, `provider`, `max_workers`, `litellm_config`, `cache_store`), closed once all the experiments are done.
+        Without a `cache_store`, its judge-response cache is in the cache store of the first experiment given as arguments
+        (its `cache_dir`, else $ERROR_MAP_CACHE_DIR, else `<output_dir>/cache`), like a single experiment's.
+
+    Returns each experiment's run() summary, in order, or the exception it failed with.
+    """
+    owns_client = inference_client is None and any(isinstance(experiment, dict) for experiment in experiments)
+    if owns_client:
+        if "cache_store" not in client_kwargs:
+            first = next(experiment for experiment in experiments if isinstance(experiment, dict))
+            client_kwargs["cache_store"] = _cache_store(first.get("cache_dir"), first.get("output_dir"), first.get("cache_max_size"), first.get("cache_ttl"))
+        inference_client = InferenceClient(**{"max_workers": 100, **client_kwargs})
+
+    error_maps = []
+    run_id = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    for ind, experiment in enumerate(experiments):
+        if isinstance(experiment, dict):
+            # default exp ids are per second, keep them distinct
+            experiment = ErrorMap(**{"exp_id": f"{run_id}_{ind}", **experiment, "inference_client": inference_client})
+        error_maps.append(experiment)
+
+    print(f"🚀 Running {len(error_maps)} experiments concurrently")
+    try:
+        results = await asyncio.gather(*[error_map.run() for error_map in error_maps], return_exceptions=True)
+    finally:
+        if owns_client:
+            await inference_client.aclose()
+    for error_map, result in zip(error_maps, results):
+        if isinstance(result, BaseException):
+            print(f"❌ Experiment {error_map.exp_id} failed: {result!r}")
+    return results
+
+
 __version__ = "0.1.0"
-__all__ = ["ErrorMap", "run"]
\ No newline at end of file
+__all__ = ["ErrorMap", "run", "run_experiments"]
\ No newline at end of file
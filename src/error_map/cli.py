@@ -2,7 +2,13 @@
 
 import asyncio
 import argparse
+import datetime
+import sys
+from pathlib import Path
 from . import ErrorMap
+from .inference import BatchPendingError
+from .inference.synthetic import LATENCY_DISTRIBUTIONS
+from .utils.cache_store import CacheStore, format_size
 
 
 async def main():
@@ -10,17 +16,48 @@ async def main():
     parser.add_argument("--models", nargs="+", help="Models to analyze")
     parser.add_argument("--ratio", type=float, default=0.1, help="Error sampling ratio")
     parser.add_argument("--seed", type=int, default=42, help="Random seed")
-    parser.add_argument("--inference-type", choices=["litellm", "litellm-mock"], 
+    parser.add_argument("--inference-type", choices=["litellm", "litellm-mock", "synthetic"], 
                        default="litellm-mock", help="Inference type")
+    parser.add_argument("--synthetic-latency", type=float, default=0.5, help="synthetic: mean judge latency in seconds (default: 0.5)")
+    parser.add_argument("--synthetic-latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                       help="synthetic: judge latency distribution (default: lognormal)")
+    parser.add_argument("--synthetic-failure-rate", type=float, default=0.0, help="synthetic: share of calls failing with a 500")
+    parser.add_argument("--synthetic-overload-rate", type=float, default=0.0, help="synthetic: share of calls failing with a 429")
+    parser.add_argument("--synthetic-max-concurrency", type=int, help="synthetic: calls beyond this many in flight get a 429")
     parser.add_argument("--exp-id", help="Experiment ID")
     parser.add_argument("--max-workers", type=int, default=100, 
-                       help="Max concurrent inference workers (default: 100)")
+                       help="Max concurrent inference workers, the ceiling of the adaptive limit (default: 100)")
+    parser.add_argument("--no-adaptive-concurrency", action="store_false", dest="adaptive_concurrency",
+                       help="Always run --max-workers concurrent calls instead of adapting to the endpoint (adaptive by default)")
+    parser.add_argument("--max-retries", type=int, default=5,
+                       help="Retries of judge calls failing with rate limits, timeouts, 5xx or connection errors (default: 5)")
+    parser.add_argument("--rpm", type=int, help="Requests-per-minute quota of the judge endpoint")
+    parser.add_argument("--tpm", type=int, help="Tokens-per-minute quota of the judge endpoint")
+    parser.add_argument("--endpoints", nargs="+", help="api_base URLs of several deployments of the judge to spread the calls over")
+    parser.add_argument("--prompt-caching", action=argparse.BooleanOptionalAction, default=None,
+                       help="Send the stable prompt prefix as a separate part marked for the provider's prompt cache (default: when the judge supports it)")
+    parser.add_argument("--http2", action="store_true", help="Send judge calls to https OpenAI-compatible/Azure endpoints over HTTP/2")
+    parser.add_argument("--stream", action="store_true", dest="streaming",
+                       help="Stream judge responses, aborting and retrying the ones that break their schema or run away")
+    parser.add_argument("--prompt-token-budget", type=int,
+                       help="Token budget of the single-error analysis inputs, the longest are trimmed to fit (default: 24000)")
+    parser.add_argument("--max-tokens", type=int, help="Completion budget of the single-error analysis (default: 4096)")
     parser.add_argument("--datasets", nargs="+", help="Dataset names to process")
     parser.add_argument("--data-path", default="data", help="Path to data directory")
     parser.add_argument("--output-dir", help="Path to outputs")
     parser.add_argument("--judge", help="Judge model")
     parser.add_argument("--provider", help="Inference provider", choices=["azure", "rits"])
     parser.add_argument("--no-use-correct-predictions", action="store_false", dest="use_correct_predictions", help="Disable adding correct predictions from other models (enabled by default)")
+    parser.add_argument("--chunk-size", type=int, help="Read datasets in chunks of this many rows (bounded-memory mode: the prepared data keeps only the sampled errors and the successes on their examples)")
+    parser.add_argument("--no-csv-export", action="store_false", dest="export_csv", help="Only write Parquet stage outputs, without the CSV exports (enabled by default)")
+    parser.add_argument("--cache-dir", help="Cache location (default: $ERROR_MAP_CACHE_DIR or <output-dir>/cache)")
+    parser.add_argument("--cache-max-size", help="Maximum size of each cache, e.g. 20GB")
+    parser.add_argument("--cache-ttl", help="Expire cache entries after this long, e.g. 7d")
+    parser.add_argument("--no-response-cache", nargs="+", choices=["single_error", "taxonomy"], dest="response_cache_bypass",
+                       help="Stages whose judge calls skip the judge-response cache lookup")
+    parser.add_argument("--batch-mode", choices=["openai", "offline", "local"],
+                       help="Send the single-error judge calls as a batch job: batch API, offline runner or local stand-in")
+    parser.add_argument("--batch-dir", help="Batch request shards and results location (default: <cache-dir>/batches)")
     args = parser.parse_args()
     
     error_map = ErrorMap(
@@ -36,15 +73,91 @@ async def main():
         use_correct_predictions=args.use_correct_predictions,
         models=args.models,
         ratio=args.ratio,
+        chunk_size=args.chunk_size,
+        export_csv=args.export_csv,
+        cache_dir=args.cache_dir,
+        cache_max_size=args.cache_max_size,
+        cache_ttl=args.cache_ttl,
+        adaptive_concurrency=args.adaptive_concurrency,
+        max_retries=args.max_retries,
+        rpm_limit=args.rpm,
+        tpm_limit=args.tpm,
+        endpoints=args.endpoints,
+        streaming=args.streaming,
+        http2=args.http2,
+        prompt_caching=args.prompt_caching,
+        prompt_token_budgets={"single_error_analysis.j2": args.prompt_token_budget} if args.prompt_token_budget else None,
+        max_tokens={"single_error_analysis.j2": args.max_tokens} if args.max_tokens else None,
+        response_cache_bypass=args.response_cache_bypass,
+        batch_mode=args.batch_mode,
+        batch_dir=args.batch_dir,
+        synthetic_params={
+            "latency_mean": args.synthetic_latency,
+            "latency": args.synthetic_latency_distribution,
+            "failure_rate": args.synthetic_failure_rate,
+            "overload_rate": args.synthetic_overload_rate,
+            "max_concurrency": args.synthetic_max_concurrency,
+        } if args.inference_type == "synthetic" else None,
     )
     
-    results = await error_map.run()
+    try:
+        results = await error_map.run()
+    except BatchPendingError as e:
+        print(f"⏸️ {e}")
+        sys.exit(2)
     
     print(f"\n✅ Complete! Experiment: {results['exp_id']}")
     print(f"Records: {results['total_records']}, Errors: {results['error_records']}")
 
 
+def cache_main(argv):
+    parser = argparse.ArgumentParser(prog="error-map cache", description="Inspect, prune and warm the ErrorMap caches")
+    parser.add_argument("command", choices=["inspect", "prune", "warm"])
+    parser.add_argument("--cache-dir", help="Cache location (default: $ERROR_MAP_CACHE_DIR or <output-dir>/cache)")
+    parser.add_argument("--output-dir", help="Path to outputs")
+    parser.add_argument("--max-size", help="prune: evict least recently used entries until each cache fits, e.g. 20GB")
+    parser.add_argument("--ttl", help="prune: expire entries older than this, e.g. 7d")
+    parser.add_argument("--all", action="store_true", help="prune: remove all entries")
+    parser.add_argument("--from", dest="source", help="warm: cache location to copy missing entries from")
+    args = parser.parse_args(argv)
+
+    store = CacheStore(args.cache_dir) if args.cache_dir else CacheStore.default(Path(args.output_dir or "output"))
+
+    if args.command == "inspect":
+        summary = store.summary()
+        stages, responses = summary["stages"], summary["responses"]
+        print(f"📦 Cache: {summary['root']}")
+        print(f"Stage results: {stages['entries']} entries, {format_size(stages['bytes'])}, "
+              f"{stages.get('hits', 0)} hits / {stages.get('misses', 0)} misses, "
+              f"{format_size(stages.get('hits_bytes', 0))} served, {format_size(stages.get('writes_bytes', 0))} written, "
+              f"{stages.get('evictions', 0)} evicted")
+        print(f"Judge responses: {responses['entries']} entries, {format_size(responses['bytes'])}, "
+              f"{responses['hits']} hits / {responses['misses']} misses")
+        for template, stats in responses["templates"].items():
+            print(f"  {template or '(no template)'}: {stats['hits']} hits / {stats['misses']} misses, {stats['writes']} writes")
+        for entry in reversed(store.stage_entries()):
+            last_used = datetime.datetime.fromtimestamp(entry["last_used"]).strftime("%Y-%m-%d %H:%M")
+            print(f"  {entry['stem']}  {format_size(entry['bytes']):>9}  last used {last_used}")
+
+    elif args.command == "prune":
+        if not (args.max_size or args.ttl or args.all):
+            parser.error("prune needs --max-size, --ttl or --all")
+        evicted = store.prune(max_size=args.max_size, ttl=args.ttl, clear=args.all)
+        print(f"🧹 Evicted {evicted['stage_entries_evicted']} stage results ({format_size(evicted['stage_bytes_evicted'])}) "
+              f"and {evicted['responses_evicted']} judge responses")
+
+    elif args.command == "warm":
+        if not args.source:
+            parser.error("warm needs --from")
+        copied = store.warm(args.source)
+        print(f"🔥 Copied {copied['stage_entries_copied']} stage results and {copied['responses_copied']} judge responses "
+              f"from {args.source}")
+
+
 def cli_main():
+    if sys.argv[1:2] == ["cache"]:
+        cache_main(sys.argv[2:])
+        return
     asyncio.run(main())
 
 
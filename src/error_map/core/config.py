@@ -2,8 +2,8 @@ import csv
 import os
 from pathlib import Path
 import sys
-from typing import Dict, List
-from error_map.utils.constants import TaxonomyParams
+from typing import Dict, List, Optional
+from error_map.utils.constants import DATA_FILE_FORMATS, TaxonomyParams
 
 
 class Config:
@@ -26,6 +26,33 @@ class Config:
 
         # in case you are provided with a path but no datasets, run all of them
         if self.data_path and not self.datasets:
-            self.datasets = [f.split(".")[0] for f in os.listdir(self.data_path) 
-                             if os.path.isfile(os.path.join(self.data_path, f)) 
-                             and f.endswith(".csv")]
+            self.datasets = list(dict.fromkeys(
+                Path(f).stem for f in os.listdir(self.data_path)
+                if os.path.isfile(os.path.join(self.data_path, f))
+                and Path(f).suffix in DATA_FILE_FORMATS
+            ))
+
+    def dataset_file(self, dataset: str) -> Optional[Path]:
+        """Path of the dataset's file in `data_path` (CSV, Parquet or Arrow IPC), or None if there is none"""
+        for extension in DATA_FILE_FORMATS:
+            path = Path(self.data_path) / f"{dataset}{extension}"
+            if path.is_file():
+                return path
+        return None
+
+
+    def cache_fingerprint(self) -> Dict:
+        """Inputs that determine stage outputs (output location excluded); dataset files are identified by name, size and mtime"""
+        files = {}
+        for dataset in self.datasets:
+            path = self.dataset_file(dataset)
+            if path is not None:
+                stat = path.stat()
+                files[dataset] = [path.name, stat.st_size, stat.st_mtime_ns]
+        return {
+            "datasets": self.datasets,
+            "dataset_params": self.dataset_params,
+            "taxonomy_params": self.taxonomy_params,
+            "seed": self.seed,
+            "files": files,
+        }
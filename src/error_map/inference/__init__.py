@@ -1,3 +1,15 @@
 from .client import InferenceClient
+from .limiter import AdaptiveLimiter
+from .retry import RetryPolicy
+from .rate_limit import EndpointRateLimiter
+from .synthetic import SyntheticJudge
+from .metering import Meter, metered, meter_scope
+from .budget import TokenBudget
+from .endpoints import EndpointPool
+from .streaming import StreamingJSONValidator, StreamAbortedError
+from .connection_pool import ConnectionPool
+from .batch import LocalBatchExecutor, OfflineBatchExecutor, OpenAIBatchExecutor, BatchPendingError
 
-__all__ = ["InferenceClient"]
\ No newline at end of file
+__all__ = ["InferenceClient", "AdaptiveLimiter", "RetryPolicy", "EndpointRateLimiter", "EndpointPool", "SyntheticJudge",
+           "Meter", "metered", "meter_scope", "TokenBudget", "StreamingJSONValidator", "StreamAbortedError", "ConnectionPool",
+           "LocalBatchExecutor", "OfflineBatchExecutor", "OpenAIBatchExecutor", "BatchPendingError"]
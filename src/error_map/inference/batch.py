@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import litellm
+
+from .retry import PERMANENT, RETRYABLE, RETRYABLE_STATUS_CODES
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+REQUESTS_PREFIX = "requests_"
+RESULTS_PREFIX = "results_"
+# OpenAI batch input limits
+MAX_REQUESTS_PER_SHARD = 50000
+MAX_BYTES_PER_SHARD = 190 * 1024 ** 2
+
+# Parameters that belong to the connection, not to the request body
+CONNECTION_PARAMS = {"api_key", "api_base", "api_version", "extra_headers", "timeout", "num_retries"}
+
+
+class BatchPendingError(Exception):
+    """The batch was handed to an offline runner and its results aren't there yet"""
+
+
+def batch_request(custom_id: str, infer_params: Dict[str, Any]) -> Dict[str, Any]:
+    """One line of an OpenAI-batch-format input file"""
+    body = {k: v for k, v in infer_params.items() if k not in CONNECTION_PARAMS and v is not None}
+    # the batch endpoint takes the provider's own model name
+    body["model"] = str(body["model"]).split("/", 1)[-1]
+    # prompts split for prompt caching go as one string: the cache markers are a LiteLLM extension
+    body["messages"] = [{**message, "content": "".join(part.get("text", "") for part in message["content"])}
+                        if isinstance(message.get("content"), list) else message for message in body.get("messages", [])]
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_batch_shards(requests: List[Dict], batch_dir: Union[str, Path],
+                       max_requests: int = MAX_REQUESTS_PER_SHARD, max_bytes: int = MAX_BYTES_PER_SHARD) -> List[Path]:
+    """Write the requests to `requests_00000.jsonl`, ... shards within the batch input limits"""
+    batch_dir = Path(batch_dir)
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    shards, lines, num_bytes = [], [], 0
+
+    def flush():
+        path = batch_dir / f"{REQUESTS_PREFIX}{len(shards):05d}.jsonl"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        tmp_path.replace(path)
+        shards.append(path)
+
+    for request in requests:
+        line = json.dumps(request, ensure_ascii=False, default=str) + "\n"
+        size = len(line.encode("utf-8"))
+        if lines and (len(lines) >= max_requests or num_bytes + size > max_bytes):
+            flush()
+            lines, num_bytes = [], 0
+        lines.append(line)
+        num_bytes += size
+    if lines:
+        flush()
+    return shards
+
+
+def results_path(shard: Path) -> Path:
+    """Where the results of a request shard are expected: `results_00000.jsonl` next to `requests_00000.jsonl`"""
+    return shard.with_name(RESULTS_PREFIX + shard.name[len(REQUESTS_PREFIX):])
+
+
+def batch_id(requests: Iterable[Dict]) -> str:
+    """Content hash of a batch: re-running the same requests finds the same batch directory (and its results)"""
+    digest = hashlib.sha256()
+    for request in requests:
+        digest.update(json.dumps(request, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _error_type(status_code: Optional[int]) -> str:
+    if status_code is None or status_code >= 500 or status_code in RETRYABLE_STATUS_CODES:
+        return RETRYABLE
+    return PERMANENT
+
+
+def read_batch_results(paths: Iterable[Union[str, Path]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse OpenAI-batch-format output (and error) files into {custom_id: result}, each result with `success`,
+    `content`, `full_response`, and for failures `error` and `error_type`
+    """
+    results = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                status_code = response.get("status_code")
+                body = response.get("body") or {}
+                if entry.get("error") or status_code != 200:
+                    error = entry.get("error") or body.get("error") or f"status {status_code}"
+                    results[entry["custom_id"]] = {
+                        "success": False,
+                        "error": json.dumps(error) if isinstance(error, dict) else str(error),
+                        "error_type": _error_type(status_code),
+                        "full_response": None,
+                        "content": None,
+                    }
+                    continue
+                results[entry["custom_id"]] = {
+                    "success": True,
+                    "full_response": body,
+                    "content": body["choices"][0]["message"]["content"],
+                }
+    return results
+
+
+class LocalBatchExecutor:
+    """
+    File-based stand-in for a batch endpoint, for tests and dry runs: answers every request of a shard
+    with `respond(body)` (default: a mock response) and writes the OpenAI-batch-format results file.
+    """
+
+    caches_responses = False
+
+    def __init__(self, respond: Optional[Callable[[Dict], str]] = None):
+        self.respond = respond or (lambda body: "mock response content")
+
+    async def run(self, shards: List[Path]) -> List[Path]:
+        outputs = []
+        for shard in shards:
+            output = results_path(shard)
+            with open(shard, "r", encoding="utf-8") as f_in, open(output, "w", encoding="utf-8") as f_out:
+                for ind, line in enumerate(f_in):
+                    request = json.loads(line)
+                    body = {
+                        "id": f"local-{request['custom_id']}",
+                        "object": "chat.completion",
+                        "model": request["body"].get("model"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": self.respond(request["body"])}}],
+                    }
+                    result = {"id": f"batch_req_{ind}", "custom_id": request["custom_id"],
+                              "response": {"status_code": 200, "request_id": f"local-{ind}", "body": body}, "error": None}
+                    f_out.write(json.dumps(result) + "\n")
+            outputs.append(output)
+        return outputs
+
+
+class OfflineBatchExecutor:
+    """
+    Hands the shards to an offline runner: waits for its `results_*.jsonl` files next to the
+    `requests_*.jsonl` shards, and raises `BatchPendingError` if they don't show up within `wait` seconds.
+    Re-running the same experiment later finds the same batch directory and ingests the results.
+    """
+
+    def __init__(self, wait: float = 0.0, poll_interval: float = 30.0):
+        self.wait = wait
+        self.poll_interval = poll_interval
+
+    async def run(self, shards: List[Path]) -> List[Path]:
+        outputs = [results_path(shard) for shard in shards]
+        waited = 0.0
+        while not all(output.exists() for output in outputs):
+            if waited >= self.wait:
+                missing = [shard.name for shard, output in zip(shards, outputs) if not output.exists()]
+                raise BatchPendingError(
+                    f"Waiting for the offline runner: run {', '.join(missing)} in {shards[0].parent} and write each "
+                    f"shard's OpenAI-batch-format output to {RESULTS_PREFIX}<n>.jsonl, then re-run")
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+        return outputs
+
+
+class OpenAIBatchExecutor:
+    """
+    Submits the shards to an OpenAI-compatible batch API (through LiteLLM) and polls until they are done,
+    downloading the output and error files next to the shards. Batch ids are kept in `<shard>.batch_id`,
+    so an interrupted run picks its batches up again instead of submitting them twice.
+    """
+
+    def __init__(self, custom_llm_provider: str = "openai", api_base: Optional[str] = None, api_key: Optional[str] = None,
+                 poll_interval: float = 60.0, completion_window: str = "24h"):
+        self.custom_llm_provider = custom_llm_provider
+        self.credentials = {k: v for k, v in {"api_base": api_base, "api_key": api_key}.items() if v}
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    async def _submit(self, shard: Path) -> str:
+        id_path = shard.with_suffix(".batch_id")
+        if id_path.exists():
+            return id_path.read_text().strip()
+        with open(shard, "rb") as f:
+            file = await litellm.acreate_file(file=f, purpose="batch", custom_llm_provider=self.custom_llm_provider, **self.credentials)
+        batch = await litellm.acreate_batch(completion_window=self.completion_window, endpoint=BATCH_ENDPOINT, input_file_id=file.id,
+                                            custom_llm_provider=self.custom_llm_provider, **self.credentials)
+        id_path.write_text(batch.id)
+        print(f"📤 Submitted {shard.name} as batch {batch.id}")
+        return batch.id
+
+    async def _download(self, file_id: str, path: Path) -> None:
+        content = await litellm.afile_content(file_id=file_id, custom_llm_provider=self.custom_llm_provider, **self.credentials)
+        path.write_bytes(content.content)
+
+    async def _run_shard(self, shard: Path) -> List[Path]:
+        output = results_path(shard)
+        errors = output.with_name(output.stem + "_errors.jsonl")
+        if output.exists():
+            return [output] + ([errors] if errors.exists() else [])
+        batch_id = await self._submit(shard)
+        while True:
+            batch = await litellm.aretrieve_batch(batch_id=batch_id, custom_llm_provider=self.custom_llm_provider, **self.credentials)
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                break
+            await asyncio.sleep(self.poll_interval)
+        if batch.status != "completed":
+            print(f"⚠️ Batch {batch_id} ({shard.name}) ended as {batch.status}, its unanswered requests count as failed")
+            # submitted again on the next run
+            shard.with_suffix(".batch_id").unlink(missing_ok=True)
+        outputs = []
+        if batch.error_file_id:
+            await self._download(batch.error_file_id, errors)
+            outputs.append(errors)
+        if batch.output_file_id:
+            await self._download(batch.output_file_id, output)
+            outputs.insert(0, output)
+        return outputs
+
+    async def run(self, shards: List[Path]) -> List[Path]:
+        outputs = await asyncio.gather(*[self._run_shard(shard) for shard in shards])
+        return [path for shard_outputs in outputs for path in shard_outputs]
+
+
+BATCH_MODES = ["local", "offline", "openai"]
+
+
+def make_batch_executor(mode: str, judge: str = "", api_base: Optional[str] = None, api_key: Optional[str] = None):
+    """Executor of a batch mode: "local" (stand-in), "offline" (external runner) or "openai" (batch API)"""
+    if mode == "local":
+        return LocalBatchExecutor()
+    if mode == "offline":
+        return OfflineBatchExecutor()
+    if mode == "openai":
+        provider = "azure" if str(judge).startswith("azure/") else "openai"
+        return OpenAIBatchExecutor(custom_llm_provider=provider, api_base=api_base, api_key=api_key)
+    raise ValueError(f"Unknown batch mode: {mode} (expected one of {BATCH_MODES})")
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import litellm
+
+# Token budget of the template variables, per template (templates without one aren't trimmed)
+PROMPT_TOKEN_BUDGETS = {
+    "single_error_analysis.j2": 24000,
+}
+
+# Completion budget (`max_tokens`) per template, with room for reasoning models' thinking
+MAX_TOKENS = {
+    "single_error_analysis.j2": 4096,
+    "taxonomy_generation.j2": 8192,
+    "taxonomy_update.j2": 8192,
+    "taxonomy_review.j2": 8192,
+    "classify_errors.j2": 10000,
+}
+DEFAULT_MAX_TOKENS = 10000
+
+TRIM_MARKER = "\n[... {} tokens trimmed ...]\n"
+MARKER_TOKENS = 16
+CHARS_PER_TOKEN = 4  # for models without a tokenizer
+
+
+def _fair_share(counts: List[int], budget: int) -> int:
+    """Largest per-field cap such that the fields, each cut to it, fit the budget (water filling)"""
+    remaining = budget
+    ordered = sorted(counts)
+    for ind, count in enumerate(ordered):
+        share = remaining // (len(ordered) - ind)
+        if count > share:
+            return share
+        remaining -= count
+    return ordered[-1]
+
+
+class TokenBudget:
+    """
+    Per-template token budgets of judge calls.
+
+    `fit` counts the tokens of each string template variable (and each string in a list variable, e.g.
+    `correct_outputs`) with the judge's tokenizer and, when they exceed the template's prompt budget,
+    cuts the longest ones down to a fair share of it, keeping their head and tail (`head_share` of the
+    kept tokens from the start) around a marker with the number of tokens trimmed. `max_tokens_for`
+    gives the template's completion budget.
+    """
+
+    def __init__(self, model: str, prompt_budgets: Optional[Dict[str, int]] = None, max_tokens: Optional[Dict[str, int]] = None,
+                 head_share: float = 0.5):
+        self.model = model
+        self.prompt_budgets = {**PROMPT_TOKEN_BUDGETS, **(prompt_budgets or {})}
+        self.max_tokens = {**MAX_TOKENS, **(max_tokens or {})}
+        self.head_share = head_share
+        self._has_tokenizer = True
+
+    def max_tokens_for(self, template_name: str) -> int:
+        return self.max_tokens.get(template_name, DEFAULT_MAX_TOKENS)
+
+    def _encode(self, text: str) -> Optional[List[int]]:
+        if self._has_tokenizer:
+            try:
+                return litellm.encode(model=self.model, text=text)
+            except Exception:
+                self._has_tokenizer = False
+        return None
+
+    def count(self, text: str) -> int:
+        tokens = self._encode(text)
+        return len(tokens) if tokens is not None else -(-len(text) // CHARS_PER_TOKEN)
+
+    def trim(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """`text` cut to about `max_tokens` tokens, keeping its head and tail; and the number of tokens trimmed"""
+        keep = max(max_tokens - MARKER_TOKENS, 0)
+        head = int(keep * self.head_share)
+        tokens = self._encode(text)
+        if tokens is None:
+            count = -(-len(text) // CHARS_PER_TOKEN)
+            if count <= max_tokens:
+                return text, 0
+            trimmed = count - keep
+            head_chars, tail_chars = head * CHARS_PER_TOKEN, (keep - head) * CHARS_PER_TOKEN
+            return text[:head_chars] + TRIM_MARKER.format(trimmed) + (text[-tail_chars:] if tail_chars else ""), trimmed
+        if len(tokens) <= max_tokens:
+            return text, 0
+        trimmed = len(tokens) - keep
+        tail = keep - head
+        return (litellm.decode(model=self.model, tokens=tokens[:head]) + TRIM_MARKER.format(trimmed)
+                + (litellm.decode(model=self.model, tokens=tokens[-tail:]) if tail else "")), trimmed
+
+    def fit(self, template_name: str, template_vars: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """Template variables fitted to the template's prompt budget, and the tokens trimmed per variable"""
+        budget = self.prompt_budgets.get(template_name)
+        if not budget:
+            return template_vars, {}
+        fields = [(name, None, value) for name, value in template_vars.items() if isinstance(value, str)]
+        fields += [(name, ind, item) for name, value in template_vars.items() if isinstance(value, list)
+                   for ind, item in enumerate(value) if isinstance(item, str)]
+        # a token is at least a byte: short prompts fit without tokenizing them
+        if not fields or sum(len(text.encode("utf-8")) for _, _, text in fields) <= budget:
+            return template_vars, {}
+        counts = [self.count(text) for _, _, text in fields]
+        if sum(counts) <= budget:
+            return template_vars, {}
+
+        cap = _fair_share(counts, budget)
+        fitted = {name: list(value) if isinstance(value, list) else value for name, value in template_vars.items()}
+        trimmed = {}
+        for (name, ind, text), count in zip(fields, counts):
+            if count <= cap:
+                continue
+            text, num_trimmed = self.trim(text, cap)
+            if ind is None:
+                fitted[name] = text
+            else:
+                fitted[name][ind] = text
+            trimmed[name] = trimmed.get(name, 0) + num_trimmed
+        return fitted, trimmed
@@ -1,11 +1,27 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Union
 import os
+import time
+from pathlib import Path
 import asyncio
-import aiohttp
+from collections import Counter, defaultdict
 import litellm
 from error_map.templates.json_renderer import JSONRenderer
 from ..templates import TemplateRenderer
-from litellm.caching.caching import Cache
+from ..utils.cache_store import CacheStore
+from ..utils.response_cache import response_cache_key
+from .limiter import AdaptiveLimiter, SUCCESS, OVERLOAD, ERROR
+from .retry import RetryPolicy, RETRYABLE
+from .rate_limit import EndpointRateLimiter
+from .synthetic import SyntheticJudge
+from .metering import CALL_EVENTS, CallCounters, current_meter, response_usage
+from .budget import TokenBudget, CHARS_PER_TOKEN
+from .endpoints import EndpointPool
+from .streaming import StreamAbortedError, StreamingJSONValidator
+from .connection_pool import ConnectionPool
+from .batch import batch_id, batch_request, make_batch_executor, read_batch_results, write_batch_shards
+
+# Errors that signal an overloaded endpoint (429, 503, timeouts): the concurrency limit is cut on them
+OVERLOAD_ERRORS = (litellm.RateLimitError, litellm.ServiceUnavailableError, litellm.Timeout, asyncio.TimeoutError)
 
 
 class InferenceClient:
@@ -16,29 +32,89 @@ class InferenceClient:
         provider: Optional[str] = None,
         max_workers: int = None,
         litellm_config: Optional[Dict] = None,
+        cache_store: Optional[CacheStore] = None,
+        adaptive_concurrency: bool = True,
+        retry_policy: Optional[RetryPolicy] = None,
+        rpm_limit: Optional[int] = None,
+        tpm_limit: Optional[int] = None,
+        cache_bypass: Optional[Iterable[str]] = None,
+        batch_executor: Optional[Any] = None,
+        batch_dir: Optional[str] = None,
+        synthetic_judge: Optional[SyntheticJudge] = None,
+        endpoints: Optional[Union[List[Any], EndpointPool]] = None,
+        streaming: bool = False,
+        prompt_caching: Optional[bool] = None,
+        connection_pool: Optional[ConnectionPool] = None,
+        http2: bool = False,
+        prompt_token_budgets: Optional[Dict[str, int]] = None,
+        max_tokens: Optional[Dict[str, int]] = None,
     ):
         """
         LLM client on top of LiteLLM.
 
-        Currently supported providers: Azure, Rits.
+        Currently supported providers: Azure, Rits. With `inference_type="synthetic"`, calls go to `synthetic_judge`
+        (default: `SyntheticJudge()`), a local stand-in answering schema-valid JSON, for load tests.
         You must either select one of the supported providers or provide a `litellm_config` with all the required parameters for your chosen provider.
+        Judge responses are cached in the responses namespace of `cache_store` (default: `CacheStore.default()`),
+        keyed on the normalized prompt, model, schema and generation parameters. Templates in `cache_bypass`
+        skip the lookup (their fresh responses still refresh the cache). The lookup comes first: calls answered
+        from the cache take no concurrency slot nor quota.
+        Concurrent calls are limited by an AIMD limit that adapts to the endpoint's health, up to `max_workers`
+        (a fixed limit of `max_workers` when `adaptive_concurrency` is False).
+        Failed calls are retried according to `retry_policy` (default: `RetryPolicy()`).
+        Template variables are trimmed (head and tail kept) to the template's token budget, and `max_tokens` is sized
+        per template: `prompt_token_budgets` and `max_tokens` override the defaults of `TokenBudget`.
+        With `streaming`, responses are streamed and validated against their schema as they arrive: a call
+        breaking its schema or running away (repeating itself, or past `max_tokens`) is aborted and retried.
+        Prompts are rendered as their template's stable prefix (instructions and shared context, byte-identical across
+        calls) followed by the per-call data, for the provider's prompt prefix cache. With `prompt_caching` (default: when
+        LiteLLM knows the judge supports prompt caching), the prefix is sent as a separate content part marked for caching.
+        HTTP calls go through `connection_pool` (default: a `ConnectionPool` of `max_workers` keep-alive connections,
+        over HTTP/2 for OpenAI-compatible and Azure endpoints with `http2`), closed by `aclose()`.
+        Calls made inside `metered(meter)` are recorded in that `Meter` (tokens, cost, latency, retries, cache hits),
+        priced with LiteLLM's model prices, or `input_cost_per_token`/`output_cost_per_token` in `litellm_config`.
+        Calls to each endpoint are paced to `rpm_limit` requests and `tpm_limit` tokens per minute, when given.
+        With `endpoints` (an `EndpointPool`, or its list of deployments: api_base URLs or dicts of LiteLLM parameters
+        with an optional `max_concurrency`), calls are spread over several deployments of the judge by least outstanding
+        requests, with a cooldown for failing ones.
+        With a `batch_executor` (`LocalBatchExecutor`, `OfflineBatchExecutor`, `OpenAIBatchExecutor`, or the name
+        of a batch mode: "local", "offline", "openai"), bulk stages
+        send their calls through `infer_batch` as OpenAI-batch-format shards in `batch_dir` (default: `<cache>/batches`).
         """
         self.inference_type = inference_type.lower() if inference_type else None
         self.provider = provider or "rits"
         self.max_workers = max_workers
         self.litellm_config = litellm_config
-        self.semaphore = asyncio.Semaphore(max_workers)
+        self.limiter = AdaptiveLimiter(max_limit=max_workers, adaptive=adaptive_concurrency)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._call_stats = defaultdict(Counter)
+        self._in_flight_calls = {}
+        self._token_prices = None
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.rate_limiters = {}
         self.template_renderer = TemplateRenderer()
         self.schema_renderer = JSONRenderer()
         
-        self.client = litellm
-        litellm.cache = Cache(type="disk", path="./litellm_cache")    
+        self.client = (synthetic_judge or SyntheticJudge()) if self.inference_type == "synthetic" else litellm
+        self._cache_namespace = self.client.cache_namespace() if self.inference_type == "synthetic" else self.inference_type or ""
+        self.cache_store = cache_store or CacheStore.default()
+        self.response_cache = self.cache_store.response_cache()
+        self.cache_bypass = set(cache_bypass or [])
+        self.batch_dir = Path(batch_dir) if batch_dir else self.cache_store.root / "batches"
 
         if litellm_config:
+            if "max_tokens" in litellm_config:
+                print(f"⚠️ Ignoring max_tokens={litellm_config['max_tokens']} in litellm_config, max_tokens is sized per template (see the max_tokens argument)")
             self.judge = litellm_config.get("model", "")
             self.api_base = litellm_config.get("api_base", "")
             self.api_key = litellm_config.get("api_key", "")
 
+        elif self.inference_type == "synthetic":
+            self.judge = judge or "synthetic/judge"
+            self.api_base = None
+            self.api_key = None
+
         elif self.provider == "azure":
             judge = judge or "Azure/gpt-4.1"
             self.api_base = os.getenv("AZURE_API_BASE")
@@ -61,8 +137,87 @@ class InferenceClient:
         
         else:
             raise Exception("Neither a LiteLLM config nor a valid provider was provided!")
+
+        self.streaming = streaming
+        self.prompt_caching = prompt_caching
+        if connection_pool is None and self.inference_type not in ("synthetic", "litellm-mock"):
+            connection_pool = ConnectionPool(max_connections=max_workers or 100, http2=http2)
+        self.connection_pool = connection_pool
+        self.endpoint_pool = endpoints if isinstance(endpoints, EndpointPool) or endpoints is None else EndpointPool(endpoints)
+        self.token_budget = TokenBudget(self.judge, prompt_budgets=prompt_token_budgets, max_tokens=max_tokens)
+
+        if isinstance(batch_executor, str):
+            batch_executor = make_batch_executor(batch_executor, self.judge, self.api_base, self.api_key)
+        self.batch_executor = batch_executor
        
 
+    def _rate_limiter(self, api_base: Optional[str] = None) -> Optional[EndpointRateLimiter]:
+        """Request/token buckets of the judge endpoint (default: the client's `api_base`)"""
+        if not (self.rpm_limit or self.tpm_limit):
+            return None
+        endpoint = (self.judge, api_base or self.api_base)
+        if endpoint not in self.rate_limiters:
+            self.rate_limiters[endpoint] = EndpointRateLimiter(self.rpm_limit, self.tpm_limit)
+        return self.rate_limiters[endpoint]
+
+    def _estimate_prompt_tokens(self, messages) -> int:
+        """Estimated prompt tokens, for the tokens-per-minute quota"""
+        if not self.tpm_limit:
+            return 0
+        try:
+            return litellm.token_counter(model=self.judge, messages=messages)
+        except Exception:
+            return sum(len(str(message.get("content", ""))) for message in messages) // 4
+
+    def _prompt_parts(self) -> bool:
+        """Whether prompts are sent as their stable prefix and the rest, in separate content parts"""
+        if self.prompt_caching is None:
+            try:
+                self.prompt_caching = bool(litellm.supports_prompt_caching(model=self.judge))
+            except Exception:
+                self.prompt_caching = False
+        return self.prompt_caching
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        """USD cost of a call's tokens, cached prompt tokens at the model's cache read price (0 for models without known prices)"""
+        if self._token_prices is None:
+            config = self.litellm_config or {}
+            if "input_cost_per_token" in config or "output_cost_per_token" in config:
+                input_cost = config.get("input_cost_per_token") or 0.0
+                self._token_prices = (input_cost, config.get("output_cost_per_token") or 0.0, input_cost)
+            else:
+                try:
+                    prompt_cost, completion_cost = litellm.cost_per_token(model=self.judge, prompt_tokens=10 ** 6, completion_tokens=10 ** 6)
+                    input_cost = prompt_cost / 10 ** 6
+                    try:
+                        cached_cost = litellm.get_model_info(self.judge).get("cache_read_input_token_cost")
+                    except Exception:
+                        cached_cost = None
+                    self._token_prices = (input_cost, completion_cost / 10 ** 6, input_cost if cached_cost is None else cached_cost)
+                except Exception:
+                    self._token_prices = (0.0, 0.0, 0.0)
+        input_cost, output_cost, cached_cost = self._token_prices
+        return (prompt_tokens - cached_tokens) * input_cost + cached_tokens * cached_cost + completion_tokens * output_cost
+
+    def _call_counters(self, template_name: str) -> CallCounters:
+        """Call counters of a template: the client's (all the runs using it) and the current run's meter's"""
+        meter = current_meter()
+        counters = [self._call_stats[template_name]]
+        if meter is not None:
+            counters.append(meter.call_counts[template_name])
+        return CallCounters(*counters)
+
+    def _meter(self, template_name: str, start: float, result: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        """Record a call in the current run's meter"""
+        meter = current_meter()
+        if meter is None:
+            return
+        if result is not None:
+            prompt_tokens, completion_tokens, cached_tokens = response_usage(result["full_response"]) if result["success"] else (0, 0, 0)
+            kwargs.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens,
+                          cost=self._cost(prompt_tokens, completion_tokens, cached_tokens), attempts=result.get("attempts", 1), success=result["success"])
+        meter.record(template_name, time.perf_counter() - start, **kwargs)
+
     def _normalize_model(self, model: str) -> str:
         """
         Normalize model name based on provider.
@@ -74,19 +229,17 @@ class InferenceClient:
             return f"openai/{model}"
         return model
 
-    async def infer(
-        self,
-        template_name: str,
-        template_vars: Dict[str, Any],
-        schema_name: str = "",
-        timeout: float = 1000.0,  # max seconds per infer
-        max_tokens: int = 10000,
-        **kwargs,
-    ) -> Dict[str, Any]:
-        """
-        Async call to LLM with worker control.
-        """
-        prompt = self.render_prompt(template_name, **template_vars)
+    def _prepare_call(self, template_name: str, template_vars: Dict[str, Any], schema_name: str, timeout: float,
+                      max_tokens: Optional[int], kwargs: Dict[str, Any]):
+        """Rendered prompt (template variables fitted to its token budget), call parameters, response cache key and tokens trimmed of a judge call"""
+        template_vars, trimmed = self.token_budget.fit(template_name, template_vars)
+        trimmed_tokens = sum(trimmed.values())
+        if trimmed_tokens:
+            stats = self._call_counters(template_name)
+            stats.add("trimmed")
+            stats.add("trimmed_tokens", trimmed_tokens)
+        prefix, rest = self.template_renderer.render_parts(template_name, **template_vars)
+        prompt = prefix + rest
         message = [{"role": "user", "content": prompt}]
 
         infer_params = {
@@ -95,7 +248,6 @@ class InferenceClient:
             "api_key": self.api_key,
             "messages": message,
             "timeout": timeout,
-            "max_tokens": max_tokens,
             "extra_headers": {'RITS_API_KEY': self.api_key} if self.provider == "rits" else None,
         }
 
@@ -109,46 +261,338 @@ class InferenceClient:
 
         if self.litellm_config:
             infer_params.update(self.litellm_config)
+        # sized per template, after the config (its max_tokens is ignored)
+        infer_params["max_tokens"] = max_tokens or self.token_budget.max_tokens_for(template_name)
+
+        if prefix and self._prompt_parts():
+            # same prompt, split at the end of the stable prefix (LiteLLM drops the marker for providers caching prefixes by themselves)
+            infer_params["messages"] = [{"role": "user", "content": [
+                {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": rest},
+            ]}]
+
+        # keyed on the whole prompt, however it is split
+        cache_key = response_cache_key(
+            self.judge, message, infer_params.get("response_format"), {**infer_params, **kwargs}, namespace=self._cache_namespace)
+        return prompt, infer_params, cache_key, trimmed_tokens
+
+    async def infer(
+        self,
+        template_name: str,
+        template_vars: Dict[str, Any],
+        schema_name: str = "",
+        timeout: float = 1000.0,  # max seconds per infer
+        max_tokens: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        stream: Optional[bool] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Async call to LLM with worker control.
+        With `stream` (default: the client's `streaming`), the response is validated as it streams in,
+        and aborted and retried when it breaks its schema or runs away.
+        Responses are served from and stored in the response cache, unless `use_cache` is False
+        (default: True unless the template is in `cache_bypass`). A call identical (same response cache key)
+        to one in flight waits for that one's result instead of calling the provider again.
+        """
+        start = time.perf_counter()
+        prompt, infer_params, cache_key, trimmed_tokens = self._prepare_call(template_name, template_vars, schema_name, timeout, max_tokens, kwargs)
+        stats = self._call_counters(template_name)
+        stats.add("calls")
 
-        async with self.semaphore: # worker limit
-            
-            if self.inference_type == "litellm-mock":
+        if use_cache if use_cache is not None else template_name not in self.cache_bypass:
+            cached = self.response_cache.get(cache_key, template_name)
+            if cached is not None:
+                stats.add("cache_hits")
+                self._meter(template_name, start, cache_hit=True, trimmed_tokens=trimmed_tokens)
                 return {
                     "model": self.judge,
                     "prompt": prompt,
                     "template": template_name,
                     "success": True,
-                    "full_response": "mock response",
-                    "content": "mock response content",
+                    "cached": True,
+                    "full_response": cached["full_response"],
+                    "content": cached["content"],
                 }
-            
+
+        # single flight: identical calls already in flight are served by the same provider call
+        while cache_key in self._in_flight_calls:
+            in_flight = self._in_flight_calls[cache_key]
             try:
-                response = await self.client.acompletion(
-                        **infer_params,
-                        **kwargs
-                    )
-                
-            except Exception as e:
-                print("EXCEPTION: ", e)
+                result = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if in_flight.cancelled():
+                    continue  # the leading call was cancelled, make our own
+                raise
+            stats.add("coalesced")
+            self._meter(template_name, start, coalesced=True, trimmed_tokens=trimmed_tokens)
+            return {**result, "template": template_name, "coalesced": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight_calls[cache_key] = future
+        try:
+            result = await self._call(template_name, template_vars, prompt, infer_params, cache_key, kwargs,
+                                      stream=self.streaming if stream is None else stream)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, whether or not anyone was waiting
+            raise
+        else:
+            future.set_result(result)
+            self._meter(template_name, start, result, trimmed_tokens=trimmed_tokens)
+            return result
+        finally:
+            self._in_flight_calls.pop(cache_key, None)
+
+    async def _call(self, template_name: str, template_vars: Dict[str, Any], prompt: str, infer_params: Dict[str, Any],
+                    cache_key: str, kwargs: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
+        """Call the judge (paced, within the concurrency limit and retried), caching a successful response"""
+        message = infer_params["messages"]
+        stats = self._call_counters(template_name)
+        if self.inference_type == "synthetic":
+            # the synthetic judge answers from the template inputs, not by parsing the prompt
+            kwargs = {**kwargs, "template_name": template_name, "template_vars": template_vars}
+        rate_limiter = self._rate_limiter()
+        prompt_tokens = self._estimate_prompt_tokens(message)
+        # reserve the prompt and the whole completion budget, the unused part is given back
+        estimated_tokens = prompt_tokens + (infer_params.get("max_tokens") or 0) if self.tpm_limit else 0
+
+        if self.inference_type == "litellm-mock":
+            if rate_limiter is not None:
+                rate_limiter.reconcile(await rate_limiter.reserve(estimated_tokens), prompt_tokens)
+            token = await self.limiter.acquire() # worker limit
+            self.limiter.release(token, SUCCESS)
+            await self.response_cache.aset(cache_key, {"content": "mock response content", "full_response": "mock response"}, template_name)
+            return {
+                "model": self.judge,
+                "prompt": prompt,
+                "template": template_name,
+                "success": True,
+                "full_response": "mock response",
+                "content": "mock response content",
+            }
+
+        attempt = 0
+        while True:
+            # pick a deployment, then pace to its quotas, before taking a concurrency slot
+            endpoint = await self.endpoint_pool.acquire() if self.endpoint_pool is not None else None
+            call_params = {**infer_params, **endpoint.params} if endpoint is not None else infer_params
+            if endpoint is not None:
+                rate_limiter = self._rate_limiter(call_params.get("api_base"))
+            error = None
+            # quota reserved for this attempt and not settled yet
+            reserved_tokens = None
+            try:
+                if rate_limiter is not None:
+                    reserved_tokens = await rate_limiter.reserve(estimated_tokens)
+                token = await self.limiter.acquire() # worker limit
+                outcome = ERROR
+                try:
+                    if stream and self.inference_type != "synthetic":
+                        response = await self._stream_completion(call_params, kwargs)
+                    else:
+                        response = await self.client.acompletion(
+                                **call_params,
+                                **self._transport_kwargs(call_params),
+                                **kwargs
+                            )
+                    outcome = SUCCESS
+                    if reserved_tokens is not None:
+                        rate_limiter.reconcile(reserved_tokens, getattr(getattr(response, "usage", None), "total_tokens", None))
+                        reserved_tokens = None
+                    break
+
+                except Exception as e:
+                    outcome = OVERLOAD if isinstance(e, OVERLOAD_ERRORS) else ERROR
+                    error = e
+                    if isinstance(e, StreamAbortedError):
+                        stats.add("aborted")
+                    if reserved_tokens is not None:
+                        # a failed call generated no completion
+                        rate_limiter.reconcile(reserved_tokens, prompt_tokens)
+                        reserved_tokens = None
+                finally:
+                    if endpoint is not None:
+                        # the deployment is unhealthy when its calls fail retryably, not when the judge strays from the schema
+                        unhealthy = error is not None and self.retry_policy.classify(error) == RETRYABLE and not isinstance(error, StreamAbortedError)
+                        self.endpoint_pool.release(endpoint, error if unhealthy else None)
+                        endpoint = None
+                        # an overloaded deployment cools down and the others take its calls: only cut the limit when all are overloaded
+                        if outcome == OVERLOAD and not self.endpoint_pool.all_cooling_down():
+                            outcome = ERROR
+                    self.limiter.release(token, outcome)
+            finally:
+                if endpoint is not None:  # cancelled before the call
+                    self.endpoint_pool.release(endpoint)
+                if reserved_tokens is not None:
+                    # cancelled (e.g. a timeout) while waiting for a slot or during the call: give back the completion budget
+                    rate_limiter.reconcile(reserved_tokens, prompt_tokens)
+
+            if not self.retry_policy.should_retry(error, attempt):
+                error_type = self.retry_policy.classify(error)
+                stats.add("failed_" + error_type)
+                print(f"EXCEPTION ({error_type}, {attempt + 1} attempts): ", error)
                 return {
                     "model": self.judge,
                     "prompt": prompt,
                     "template": template_name,
                     "success": False,
-                    "error": str(e),
+                    "error": str(error),
+                    "error_type": error_type,
+                    "attempts": attempt + 1,
                     "full_response": None,
                     "content": None,
                 }
 
+            # back off outside the concurrency limit
+            stats.add("retries")
+            if attempt == 0:
+                stats.add("retried")
+            await asyncio.sleep(self.retry_policy.delay(error, attempt))
+            attempt += 1
+
+        if attempt:
+            stats.add("recovered")
+        content = response.choices[0].message.content
+        full_response = response.model_dump() if hasattr(response, "model_dump") else str(response)
+        await self.response_cache.aset(cache_key, {"content": content, "full_response": full_response}, template_name)
         return {
             "model": self.judge,
             "prompt": prompt,
             "template": template_name,
             "success": True,
+            "attempts": attempt + 1,
             "full_response": response,
-            "content": response.choices[0].message.content,
+            "content": content,
         }
     
+    async def _stream_completion(self, call_params: Dict[str, Any], kwargs: Dict[str, Any]):
+        """
+        Streamed judge call, validated as it arrives when it has a response schema: the stream is closed
+        (StreamAbortedError) as soon as the response breaks its schema or runs away, or if it ends truncated
+        """
+        schema = ((call_params.get("response_format") or {}).get("json_schema") or {}).get("schema")
+        max_tokens = call_params.get("max_tokens")
+        # free-text responses (no schema) aren't JSON: streamed as they are
+        validator = StreamingJSONValidator(schema, max_chars=max_tokens * CHARS_PER_TOKEN if max_tokens else None) if schema is not None else None
+        stream = await self.client.acompletion(**call_params, **self._transport_kwargs(call_params), **kwargs, stream=True, stream_options={"include_usage": True})
+        content, usage, finish_reason = [], None, "stop"
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    content.append(delta)
+                    if validator is not None:
+                        validator.feed(delta)
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            if validator is not None:
+                validator.finish()
+        except BaseException:
+            try:
+                await stream.aclose()
+            except Exception:
+                pass
+            raise
+        return litellm.ModelResponse(
+            model=self.judge,
+            choices=[{"index": 0, "finish_reason": finish_reason, "message": {"role": "assistant", "content": "".join(content)}}],
+            usage=usage.model_dump() if hasattr(usage, "model_dump") else usage,
+        )
+
+    async def infer_batch(
+        self,
+        template_name: str,
+        template_vars_list: List[Dict[str, Any]],
+        schema_name: str = "",
+        max_tokens: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        """
+        Judge calls through `batch_executor`, for bulk jobs: the calls missing from the response cache are
+        written as OpenAI-batch-format shards to `{batch_dir}/{batch id}/`, run by the executor, and their
+        results ingested. Returns infer()-like results, in order. The batch id hashes the requests, so
+        re-running the same calls picks up the results of an earlier (e.g. offline) run.
+        """
+        start = time.perf_counter()
+        stats = self._call_counters(template_name)
+        use_cache = use_cache if use_cache is not None else template_name not in self.cache_bypass
+        results = [None] * len(template_vars_list)
+        requests, pending = [], []
+        for ind, template_vars in enumerate(template_vars_list):
+            prompt, infer_params, cache_key, trimmed_tokens = self._prepare_call(template_name, template_vars, schema_name, None, max_tokens, kwargs)
+            stats.add("calls")
+            base = {"model": self.judge, "prompt": prompt, "template": template_name}
+            cached = self.response_cache.get(cache_key, template_name) if use_cache else None
+            if cached is not None:
+                results[ind] = {**base, "success": True, "cached": True, "full_response": cached["full_response"], "content": cached["content"]}
+                stats.add("cache_hits")
+                self._meter(template_name, start, cache_hit=True, trimmed_tokens=trimmed_tokens)
+                continue
+            requests.append(batch_request(f"request-{len(requests)}", {**infer_params, **kwargs}))
+            pending.append((ind, base, cache_key, trimmed_tokens))
+
+        if not requests:
+            return results
+
+        batch_dir = self.batch_dir / batch_id(requests)
+        shards = write_batch_shards(requests, batch_dir)
+        print(f"📦 Batch of {len(requests)} {template_name} requests in {len(shards)} shards: {batch_dir}")
+        batch_results = read_batch_results(await self.batch_executor.run(shards))
+        # stand-in executors don't answer like the judge would
+        caches_responses = getattr(self.batch_executor, "caches_responses", True)
+
+        for request, (ind, base, cache_key, trimmed_tokens) in zip(requests, pending):
+            result = batch_results.get(request["custom_id"]) or {
+                "success": False, "error": "No result in the batch output", "error_type": RETRYABLE,
+                "full_response": None, "content": None,
+            }
+            if result["success"] and caches_responses:
+                await self.response_cache.aset(cache_key, {"content": result["content"], "full_response": result["full_response"]}, template_name)
+            elif not result["success"]:
+                stats.add("failed_" + result["error_type"])
+            results[ind] = {**base, **result, "attempts": 1}
+            self._meter(template_name, start, results[ind], trimmed_tokens=trimmed_tokens)
+        print(f"📥 Ingested {sum(results[ind]['success'] for ind, *_ in pending)} of {len(requests)} batch results")
+        return results
+
+    def call_stats(self, templates: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Judge call counters of all the runs using this client, summed over `templates` (default: all): calls, retries (attempts beyond the first),
+        retried calls, recovered calls (succeeded after retrying), calls that failed permanently
+        (`failed_permanent`) or still failed after the last retry (`failed_retryable`), calls served by an identical
+        call in flight (`coalesced`), streamed responses aborted for breaking their schema (`aborted`), prompts trimmed to their token budget (`trimmed`, `trimmed_tokens`), and response
+        cache hits/misses
+        """
+        total = Counter()
+        for template_name, stats in self._call_stats.items():
+            if templates is None or template_name in templates:
+                total.update(stats)
+        cache_stats = self.response_cache.stats(templates)
+        return {
+            **{key: total[key] for key in CALL_EVENTS if key != "cache_hits"},
+            "cache_hits": cache_stats["hits"],
+            "cache_misses": cache_stats["misses"],
+        }
+
+    def concurrency_stats(self) -> Dict[str, Any]:
+        """Current concurrency limit, in-flight calls and queue depth, with outcome counts (and rate limiting waits, per-endpoint stats and connection pool stats)"""
+        stats = self.limiter.stats()
+        for rate_limiter in self.rate_limiters.values():
+            for key, value in rate_limiter.stats().items():
+                stats[key] = stats.get(key, 0) + value
+        if self.endpoint_pool is not None:
+            stats["endpoints"] = self.endpoint_pool.stats()
+        if self.connection_pool is not None:
+            stats["connections"] = self.connection_pool.stats()
+        return stats
+
     def render_prompt(self, template_name: str, **kwargs) -> str:
         """Render a Jinja2 template with given variables"""
         return self.template_renderer.render(template_name, **kwargs)
@@ -156,11 +600,36 @@ class InferenceClient:
     def render_schema(self, schema_name: str) -> Any:
         return self.schema_renderer.render(schema_name)
 
+    def cache_fingerprint(self) -> Dict[str, Any]:
+        """Everything that determines the judge's responses (credentials and endpoints excluded), incl. template and schema versions"""
+        litellm_config = {k: v for k, v in (self.litellm_config or {}).items() if k not in ("api_key", "api_base")}
+        fingerprint = {
+            "inference_type": self.inference_type,
+            # stand-in executors don't answer like the judge
+            "batch_stand_in": type(self.batch_executor).__name__ if not getattr(self.batch_executor, "caches_responses", True) else None,
+            "judge": self.judge,
+            "litellm_config": litellm_config,
+            "token_budget": {"prompt": self.token_budget.prompt_budgets, "max_tokens": self.token_budget.max_tokens},
+            "templates": {name: self.template_renderer.fingerprint(name) for name in self.template_renderer.list_templates()},
+            "schemas": {name: self.schema_renderer.fingerprint(name) for name in sorted(os.listdir(self.schema_renderer.schema_dir))},
+        }
+        if self.inference_type == "synthetic":
+            fingerprint["synthetic"] = self._cache_namespace
+        return fingerprint
+
+    def _transport_kwargs(self, call_params: Dict[str, Any]) -> Dict[str, Any]:
+        """LiteLLM arguments sending a call over the client's connection pool"""
+        if self.connection_pool is None or self.inference_type == "synthetic":
+            return {}
+        return self.connection_pool.call_kwargs(call_params)
+
+    async def aclose(self) -> None:
+        """Close the pooled connections (reopened by the next call)"""
+        if self.connection_pool is not None:
+            await self.connection_pool.aclose()
+
     async def __aenter__(self):
-        # open session once
-        self.session = aiohttp.ClientSession()
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        # close session when done
-        await self.session.close()
\ No newline at end of file
+        await self.aclose()
\ No newline at end of file
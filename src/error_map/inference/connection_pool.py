@@ -0,0 +1,148 @@
+import asyncio
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import aiohttp
+import httpx
+import litellm
+
+# Providers whose LiteLLM handler takes an OpenAI SDK client (`client=`), through which calls can go over HTTP/2
+HTTP2_PROVIDERS = ("openai", "azure")
+
+
+class ConnectionPool:
+    """
+    Long-lived keep-alive connection pool of a judge client's HTTP calls.
+
+    Calls share one aiohttp session (LiteLLM's `shared_session`), with at most `max_connections` connections
+    (all hosts together), idle connections kept open for `keepalive_timeout` seconds and DNS answers cached
+    for `dns_cache_ttl` seconds, instead of LiteLLM's per-client sessions. With `http2`, calls to OpenAI-compatible
+    and Azure https endpoints go through a shared HTTP/2 httpx client (several calls multiplexed on a connection);
+    other providers and plain-HTTP endpoints stay on HTTP/1.1.
+
+    The sessions belong to the event loop that opened them: they are reopened when used from another
+    loop (e.g. a later `asyncio.run`). `aclose` closes them. `stats` counts the connections opened and the
+    requests that reused one, to check that connections are kept alive.
+    """
+
+    def __init__(self, max_connections: int = 100, keepalive_timeout: float = 60.0, dns_cache_ttl: int = 300, http2: bool = False):
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.http2 = http2
+        self._loop = None
+        self._session = None
+        self._http2_client = None
+        self._sdk_clients = {}
+        self._counts = Counter()
+
+    def _check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # sessions of a finished loop can't be closed any more, nor used
+            self._session, self._http2_client, self._sdk_clients = None, None, {}
+            self._loop = loop
+
+    # aiohttp (HTTP/1.1)
+
+    async def _on_request_start(self, session, context, params) -> None:
+        self._counts["requests"] += 1
+
+    async def _on_connection_create_end(self, session, context, params) -> None:
+        self._counts["connections_opened"] += 1
+
+    async def _on_connection_reuse(self, session, context, params) -> None:
+        self._counts["connections_reused"] += 1
+
+    async def _on_connection_queued(self, session, context, params) -> None:
+        self._counts["pool_waits"] += 1
+
+    def session(self) -> aiohttp.ClientSession:
+        self._check_loop()
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create_end)
+            trace.on_connection_reuseconn.append(self._on_connection_reuse)
+            trace.on_connection_queued_start.append(self._on_connection_queued)
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=0, keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=self.dns_cache_ttl, enable_cleanup_closed=True)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace], cookie_jar=aiohttp.DummyCookieJar())
+        return self._session
+
+    # httpx (HTTP/2)
+
+    async def _on_http2_request(self, request: httpx.Request) -> None:
+        self._counts["http2_requests"] += 1
+        request.extensions["trace"] = self._on_http2_trace
+
+    async def _on_http2_trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self._counts["http2_connections_opened"] += 1
+        elif event_name.endswith("send_request_headers.started"):
+            self._counts["http2_sent"] += 1
+
+    def _sdk_client(self, call_params: Dict[str, Any]) -> Optional[Any]:
+        """OpenAI SDK client of the call's endpoint on the shared HTTP/2 client, None for other providers"""
+        try:
+            _, provider, _, _ = litellm.get_llm_provider(model=call_params["model"], api_base=call_params.get("api_base"))
+        except Exception:
+            return None
+        # HTTP/2 is negotiated during the TLS handshake: plain-HTTP endpoints would get an HTTP/1.1 httpx pool, much slower than aiohttp's
+        if provider not in HTTP2_PROVIDERS or not str(call_params.get("api_base") or "https://").startswith("https://"):
+            return None
+        key = (provider, call_params.get("api_base"), call_params.get("api_key"), call_params.get("api_version"))
+        if key not in self._sdk_clients:
+            if self._http2_client is None:
+                limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections,
+                                      keepalive_expiry=self.keepalive_timeout)
+                self._http2_client = httpx.AsyncClient(http2=True, limits=limits, timeout=None,
+                                                       event_hooks={"request": [self._on_http2_request]})
+            if provider == "azure":
+                from openai import AsyncAzureOpenAI
+                self._sdk_clients[key] = AsyncAzureOpenAI(api_key=call_params.get("api_key"), azure_endpoint=call_params.get("api_base"),
+                                                          api_version=call_params.get("api_version"), http_client=self._http2_client)
+            else:
+                from openai import AsyncOpenAI
+                self._sdk_clients[key] = AsyncOpenAI(api_key=call_params.get("api_key") or "none", base_url=call_params.get("api_base"),
+                                                     http_client=self._http2_client)
+        return self._sdk_clients[key]
+
+    def call_kwargs(self, call_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Extra `litellm.acompletion` arguments routing a call through the pool"""
+        self._check_loop()
+        if self.http2:
+            client = self._sdk_client(call_params)
+            if client is not None:
+                return {"client": client}
+        return {"shared_session": self.session()}
+
+    async def aclose(self) -> None:
+        self._check_loop()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._http2_client is not None:
+            await self._http2_client.aclose()
+        self._session, self._http2_client, self._sdk_clients = None, None, {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Requests, connections opened, requests on a kept-alive connection, waits for a free connection and open connections"""
+        counts = self._counts
+        # every request sent beyond a connection's first reused it (HTTP/2 multiplexes them)
+        http2_reused = max(counts["http2_sent"] - counts["http2_connections_opened"], 0)
+        stats = {
+            "requests": counts["requests"] + counts["http2_requests"],
+            "connections_opened": counts["connections_opened"] + counts["http2_connections_opened"],
+            "connections_reused": counts["connections_reused"] + http2_reused,
+            "pool_waits": counts["pool_waits"],
+        }
+        open_connections = 0
+        if self._session is not None and not self._session.closed:
+            connector = self._session.connector
+            open_connections += sum(len(conns) for conns in getattr(connector, "_conns", {}).values()) + len(getattr(connector, "_acquired", ()))
+        if self._http2_client is not None:
+            open_connections += len(getattr(getattr(self._http2_client._transport, "_pool", None), "connections", ()))
+        stats["open_connections"] = open_connections
+        stats["max_connections"] = self.max_connections
+        stats["http2"] = self.http2
+        return stats
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from .retry import retry_after
+
+
+class Endpoint:
+    """One deployment of the judge: its LiteLLM parameters (`api_base`, `api_key`, ...), cap and health"""
+
+    def __init__(self, params: Dict[str, Any], max_concurrency: Optional[int] = None):
+        self.params = params
+        self.name = params.get("api_base") or params.get("model") or "default"
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.cooldowns = 0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until and (self.max_concurrency is None or self.in_flight < self.max_concurrency)
+
+
+class EndpointPool:
+    """
+    Routes judge calls over several deployments of the same judge.
+
+    Each call goes to the available endpoint with the fewest outstanding requests (ties: the fewest calls
+    so far). Endpoints are unavailable at their `max_concurrency` cap, and for a cooldown after
+    `failure_threshold` consecutive failed calls: `cooldown` seconds, doubled on each further
+    failure up to `max_cooldown`, and at least the endpoint's `Retry-After`. When no endpoint is
+    available, calls wait for one.
+
+    `endpoints` are dicts of LiteLLM parameters overriding the client's (`api_base`, `api_key`, `api_version`,
+    `model` for a differently named deployment, ...), with an optional `max_concurrency`.
+    """
+
+    def __init__(self, endpoints: List[Union[Dict[str, Any], str]], cooldown: float = 5.0, max_cooldown: float = 60.0,
+                 failure_threshold: int = 3):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = []
+        for endpoint in endpoints:
+            params = {"api_base": endpoint} if isinstance(endpoint, str) else dict(endpoint)
+            max_concurrency = params.pop("max_concurrency", None)
+            self.endpoints.append(Endpoint(params, max_concurrency))
+            if sum(other.name == self.endpoints[-1].name for other in self.endpoints) > 1:
+                self.endpoints[-1].name += f"#{len(self.endpoints)}"
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failure_threshold = failure_threshold
+        self._released = asyncio.Event()
+
+    def _pick(self, now: float) -> Optional[Endpoint]:
+        available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        if not available:
+            return None
+        return min(available, key=lambda endpoint: (endpoint.in_flight, endpoint.calls))
+
+    async def acquire(self) -> Endpoint:
+        """Wait for an available endpoint, and take one of its slots"""
+        while True:
+            now = time.monotonic()
+            endpoint = self._pick(now)
+            if endpoint is not None:
+                endpoint.in_flight += 1
+                endpoint.calls += 1
+                return endpoint
+            # wait for a release, or for the first cooldown to end
+            cooling = [endpoint.cooldown_until - now for endpoint in self.endpoints if endpoint.cooldown_until > now]
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), min(cooling) if cooling else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, endpoint: Endpoint, error: Optional[BaseException] = None) -> None:
+        """Free the endpoint's slot; `error`: the call failed in a way that says the endpoint is unhealthy"""
+        endpoint.in_flight -= 1
+        if error is None:
+            endpoint.consecutive_errors = 0
+        else:
+            endpoint.errors += 1
+            endpoint.consecutive_errors += 1
+            failures = endpoint.consecutive_errors - self.failure_threshold
+            if failures >= 0:
+                now = time.monotonic()
+                cooldown = max(min(self.cooldown * 2 ** failures, self.max_cooldown), retry_after(error) or 0.0)
+                endpoint.cooldowns += endpoint.cooldown_until <= now
+                endpoint.cooldown_until = max(endpoint.cooldown_until, now + cooldown)
+        self._released.set()
+
+    def all_cooling_down(self) -> bool:
+        now = time.monotonic()
+        return all(endpoint.cooldown_until > now for endpoint in self.endpoints)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            endpoint.name: {
+                "in_flight": endpoint.in_flight,
+                "calls": endpoint.calls,
+                "errors": endpoint.errors,
+                "cooldowns": endpoint.cooldowns,
+                "cooling_down": endpoint.cooldown_until > now,
+            }
+            for endpoint in self.endpoints
+        }
@@ -0,0 +1,126 @@
+import asyncio
+import collections
+import time
+from typing import Dict, Optional
+
+SUCCESS = "success"
+OVERLOAD = "overload"
+ERROR = "error"
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter with an AIMD (additive increase, multiplicative decrease) limit.
+
+    The limit starts at `initial_limit` and grows while it is the bottleneck (all slots taken) and requests
+    succeed with healthy latency: by one per
+    success until the first overload (slow start), then by about one per `limit` successes. Overloads
+    (rate limits, unavailable endpoints, timeouts) multiply it by `backoff`, at most once per round
+    trip: requests started before the last cut don't cut it again. Latency counts as unhealthy when its
+    moving average exceeds `latency_tolerance` times the lowest average seen (slowly forgotten), and then
+    the limit doesn't grow. The limit always stays between `min_limit` and `max_limit`.
+
+    With `adaptive=False` it is a plain semaphore of `max_limit` slots.
+    """
+
+    def __init__(self,
+                 max_limit: int,
+                 initial_limit: Optional[int] = None,
+                 min_limit: int = 1,
+                 backoff: float = 0.5,
+                 latency_tolerance: float = 2.0,
+                 adaptive: bool = True):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.adaptive = adaptive
+        initial_limit = initial_limit if initial_limit is not None else min(max_limit, 10)
+        self._limit = float(max_limit if not adaptive else max(self.min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._slow_start = True
+        self._last_cut = 0.0
+        self._latency_ewma = None
+        self._latency_floor = None
+        self.successes = 0
+        self.overloads = 0
+        self.errors = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the token to `release` it with"""
+        if self._in_flight >= self.limit or self._waiters:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # the slot was handed over to us, pass it on
+                    self._in_flight -= 1
+                    self._wake()
+                raise
+        else:
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, token: float, outcome: str = SUCCESS) -> None:
+        """Free the slot taken at `token`, updating the limit with the request's outcome"""
+        saturated = self._in_flight >= self.limit
+        self._in_flight -= 1
+        if outcome == SUCCESS:
+            self.successes += 1
+            self._on_success(time.monotonic() - token, saturated)
+        elif outcome == OVERLOAD:
+            self.overloads += 1
+            self._on_overload(token)
+        else:
+            self.errors += 1
+        self._wake()
+
+    def _on_success(self, latency: float, saturated: bool) -> None:
+        self._latency_ewma = latency if self._latency_ewma is None else 0.9 * self._latency_ewma + 0.1 * latency
+        self._latency_floor = self._latency_ewma if self._latency_floor is None else min(self._latency_floor * 1.001, self._latency_ewma)
+        if not (self.adaptive and saturated) or self._latency_ewma > self.latency_tolerance * self._latency_floor:
+            return
+        self._limit = min(self.max_limit, self._limit + (1.0 if self._slow_start else 1.0 / self._limit))
+
+    def _on_overload(self, token: float) -> None:
+        if not self.adaptive or token < self._last_cut:
+            return
+        self._slow_start = False
+        self._last_cut = time.monotonic()
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "errors": self.errors,
+            "latency_ewma": self._latency_ewma,
+        }
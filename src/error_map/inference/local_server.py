@@ -0,0 +1,214 @@
+"""
+Local OpenAI-compatible chat-completions server, for end-to-end benchmarks of the HTTP path without a provider.
+
+    python -m error_map.inference.local_server --port 8011 --latency 0.5 --overload-rate 0.01 --tpm 2000000
+
+Point the client at it with `litellm_config={"model": "openai/local-judge", "api_base": "http://127.0.0.1:8011/v1", "api_key": "local"}`.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+import uuid
+from typing import Optional
+
+import litellm
+from aiohttp import web
+
+from .synthetic import LATENCY_DISTRIBUTIONS, SyntheticJudge, message_text
+
+# HTTP status of the synthetic judge's failures
+FAILURE_STATUS = [(litellm.RateLimitError, 429), (litellm.InternalServerError, 500), (litellm.BadRequestError, 400)]
+
+# Answer of a judge stuck in a loop, for `off_schema_rate`
+RUNAWAY_CONTENT = '{"required_criteria": [{"criterion": "' + "the model repeats the same step and then " * 1000
+STREAM_CHUNK_CHARS = 16
+
+# Prompt prefix cache: prompts are cached in blocks of this many characters, for the last this many blocks
+PREFIX_BLOCK_CHARS = 512
+PREFIX_CACHE_BLOCKS = 100000
+
+
+class LocalJudgeServer:
+    """
+    Serves `POST /v1/chat/completions` with the answers, latency and failures of a `SyntheticJudge`
+    (429 for overloads, 500 for internal errors, 400 for bad requests), and rejects requests beyond
+    `tpm_limit` tokens per minute (sliding window) with a 429 and `Retry-After`.
+
+    Over HTTP the judge only sees the prompt and the response schema: single-error analyses get
+    synthetic error titles, other schemas a generic valid instance.
+
+    Streamed requests get the answer in chunks of 16 characters, `chunk_delay` seconds apart. `off_schema_rate`
+    of the answers are a runaway loop instead of valid JSON.
+
+    Like providers' prompt caching, the leading 512-character blocks of a prompt that earlier prompts started
+    with are reported as cached prompt tokens (`usage.prompt_tokens_details.cached_tokens`).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8011, tpm_limit: Optional[int] = None, off_schema_rate: float = 0.0,
+                 chunk_delay: float = 0.0, **judge_params):
+        self.host = host
+        self.port = port
+        self.tpm_limit = tpm_limit
+        self.off_schema_rate = off_schema_rate
+        self.chunk_delay = chunk_delay
+        self.rng = random.Random(judge_params.get("seed", 0))
+        self.judge = SyntheticJudge(**judge_params)
+        self._token_window = collections.deque()  # (time, tokens) of the last minute
+        self._window_tokens = 0
+        self._runner = None
+        self.requests = 0
+        self.rejected = 0
+        self.aborted = 0
+        self._prefix_blocks = collections.OrderedDict()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """Tokens of the prompt's leading blocks seen at the start of earlier prompts; caches its blocks"""
+        cached, key = 0, None
+        for start in range(0, len(prompt) - PREFIX_BLOCK_CHARS + 1, PREFIX_BLOCK_CHARS):
+            key = hash((key, prompt[start:start + PREFIX_BLOCK_CHARS]))
+            if key in self._prefix_blocks and cached == start:
+                cached += PREFIX_BLOCK_CHARS
+                self._prefix_blocks.move_to_end(key)
+            else:
+                self._prefix_blocks[key] = True
+        while len(self._prefix_blocks) > PREFIX_CACHE_BLOCKS:
+            self._prefix_blocks.popitem(last=False)
+        return cached // 4
+
+    def _reserve_tokens(self, tokens: int) -> Optional[float]:
+        """Seconds until the request fits the TPM limit (None: it fits and is counted)"""
+        if not self.tpm_limit:
+            return None
+        now = time.monotonic()
+        while self._token_window and self._token_window[0][0] <= now - 60:
+            self._window_tokens -= self._token_window.popleft()[1]
+        if self._window_tokens + tokens > self.tpm_limit and self._token_window:
+            return max(self._token_window[0][0] + 60 - now, 0.0)
+        self._token_window.append((now, tokens))
+        self._window_tokens += tokens
+        return None
+
+    async def _chat_completions(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json()
+        messages = body.get("messages") or []
+        response_format = body.get("response_format")
+        prompt = "".join(message_text(message) for message in messages)
+        prompt_tokens = len(prompt) // 4
+
+        retry_after = self._reserve_tokens(prompt_tokens + int(body.get("max_tokens") or 0))
+        if retry_after is not None:
+            self.rejected += 1
+            return web.json_response({"error": {"message": "Local judge: tokens per minute exceeded", "type": "rate_limit_exceeded"}},
+                                     status=429, headers={"Retry-After": f"{retry_after:.1f}"})
+
+        schema = ((response_format or {}).get("json_schema") or {}).get("schema") or {}
+        template_name = "single_error_analysis.j2" if "final_answer" in schema.get("properties", {}) else ""
+        try:
+            response = await self.judge.acompletion(model=body.get("model", "local-judge"), messages=messages,
+                                                    response_format=response_format, template_name=template_name)
+        except Exception as e:
+            self.rejected += 1
+            status = next((status for error_type, status in FAILURE_STATUS if isinstance(e, error_type)), 500)
+            return web.json_response({"error": {"message": str(e), "type": type(e).__name__}}, status=status)
+
+        content = response.choices[0].message.content
+        if self.off_schema_rate and self.rng.random() < self.off_schema_rate:
+            content = RUNAWAY_CONTENT
+        completion_tokens = len(content) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": self._cached_tokens(prompt)}}
+        if body.get("stream"):
+            return await self._stream(request, body, content, usage)
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "local-judge"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    async def _stream(self, request: web.Request, body: dict, content: str, usage: dict) -> web.StreamResponse:
+        """Server-sent chat.completion.chunk events, until the client disconnects"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "local-judge")}
+        events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[start:start + STREAM_CHUNK_CHARS]},
+                                        "finish_reason": None}]}
+                  for start in range(0, len(content), STREAM_CHUNK_CHARS)]
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append({**base, "choices": [], "usage": usage})
+        try:
+            for event in events:
+                await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                if self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:  # the client aborted the stream
+            self.aborted += 1
+        return response
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        app.router.add_post("/chat/completions", self._chat_completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(server: LocalJudgeServer) -> None:
+    print(f"🧪 Local judge listening on {await server.start()}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean latency in seconds (default: 0.5)")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency spread, relative to the mean (default: 0.5)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--overload-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--max-concurrency", type=int, help="Requests beyond this many in flight get a 429")
+    parser.add_argument("--tpm", type=int, help="Tokens per minute, requests beyond it get a 429")
+    parser.add_argument("--off-schema-rate", type=float, default=0.0, help="Share of answers that are a runaway loop instead of valid JSON")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between the chunks of streamed answers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = LocalJudgeServer(
+        host=args.host, port=args.port, tpm_limit=args.tpm, off_schema_rate=args.off_schema_rate, chunk_delay=args.chunk_delay, seed=args.seed, latency=args.latency_distribution,
+        latency_mean=args.latency, latency_spread=args.jitter, failure_rate=args.failure_rate,
+        overload_rate=args.overload_rate, max_concurrency=args.max_concurrency,
+    )
+    try:
+        asyncio.run(_serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
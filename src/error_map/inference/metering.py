@@ -0,0 +1,173 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Counters of each (stage, template, depth) group
+METRICS = ["calls", "provider_calls", "cache_hits", "coalesced", "retries", "failed",
+           "prompt_tokens", "cached_tokens", "completion_tokens", "trimmed", "trimmed_tokens", "cost_usd", "latency_s"]
+
+# Judge call events counted per template (`InferenceClient.call_stats`, `Meter.call_stats`)
+CALL_EVENTS = ["calls", "retries", "retried", "recovered", "failed_permanent", "failed_retryable", "coalesced", "aborted",
+               "trimmed", "trimmed_tokens", "cache_hits"]
+
+# The meter of the running experiment, and the labels (stage, recursion depth) of the code calling the judge
+_current_meter: ContextVar[Optional["Meter"]] = ContextVar("error_map_meter", default=None)
+_labels: ContextVar[Dict[str, Any]] = ContextVar("error_map_meter_labels", default={})
+
+
+def current_meter() -> Optional["Meter"]:
+    return _current_meter.get()
+
+
+@contextmanager
+def metered(meter: "Meter"):
+    """Record the judge calls made in this block (and the tasks it starts) in `meter`"""
+    token = _current_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _current_meter.reset(token)
+
+
+@contextmanager
+def meter_scope(**labels):
+    """Label the judge calls made in this block, e.g. `meter_scope(depth=1)`"""
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def response_usage(full_response: Any) -> Tuple[int, int, int]:
+    """Prompt, completion and cached prompt tokens (served from the provider's prompt cache) of a response (a litellm response or its dict form)"""
+    usage = full_response.get("usage") if isinstance(full_response, dict) else getattr(full_response, "usage", None)
+    if not usage:
+        return 0, 0, 0
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    details = usage.get("prompt_tokens_details") or {}
+    details = details if isinstance(details, dict) else vars(details)
+    cached = details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0
+    return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0), int(cached)
+
+
+class CallCounters:
+    """Event counters of a template's judge calls, updated together (e.g. a client's and a run's)"""
+
+    def __init__(self, *counters: Counter):
+        self._counters = counters
+
+    def add(self, event: str, amount: int = 1) -> None:
+        for counter in self._counters:
+            counter[event] += amount
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _summarize(counters: Iterable[Counter], latencies: Iterable[List[float]]) -> Dict[str, Any]:
+    total = Counter()
+    for counter in counters:
+        total.update(counter)
+    summary = {metric: total[metric] for metric in METRICS}
+    summary["cost_usd"] = round(summary["cost_usd"], 6)
+    summary["latency_s"] = round(summary["latency_s"], 3)
+    if summary["prompt_tokens"]:
+        summary["cached_token_share"] = round(summary["cached_tokens"] / summary["prompt_tokens"], 4)
+    values = [value for group in latencies for value in group]
+    if values:
+        summary["latency_mean_s"] = round(sum(values) / len(values), 4)
+        summary["latency_p50_s"] = round(_percentile(values, 0.5), 4)
+        summary["latency_p99_s"] = round(_percentile(values, 0.99), 4)
+    return summary
+
+
+class Meter:
+    """
+    Token, cost and latency accounting of one run's judge calls.
+
+    Each call is recorded under the stage and recursion depth labels of the code that made it
+    (`stage()`, `meter_scope()`) and its template: calls, provider calls, response cache hits,
+    coalesced calls, retries, failures, prompt/completion tokens (and prompt tokens served from the provider's
+    prompt cache), prompts trimmed to their token budget
+    (and tokens trimmed), cost and latency (from the call
+    to its result, incl. queueing and retries). Tokens and cost only count provider calls.
+    """
+
+    def __init__(self):
+        self._counters = defaultdict(Counter)
+        self._latencies = defaultdict(list)
+        self.call_counts = defaultdict(Counter)
+        self.stage_times = {}
+        self.started_at = time.time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Label the judge calls of a stage, and time it"""
+        start = time.perf_counter()
+        try:
+            with meter_scope(stage=name):
+                yield
+        finally:
+            self.stage_times[name] = self.stage_times.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self, template_name: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, cost: float = 0.0,
+               cached_tokens: int = 0, attempts: int = 1, success: bool = True, cache_hit: bool = False, coalesced: bool = False, trimmed_tokens: int = 0) -> None:
+        labels = _labels.get()
+        key = (labels.get("stage"), template_name, labels.get("depth"))
+        counter = self._counters[key]
+        counter["calls"] += 1
+        counter["latency_s"] += latency
+        self._latencies[key].append(latency)
+        counter["trimmed"] += bool(trimmed_tokens)
+        counter["trimmed_tokens"] += trimmed_tokens
+        if cache_hit:
+            counter["cache_hits"] += 1
+            return
+        if coalesced:
+            counter["coalesced"] += 1
+            return
+        counter["provider_calls"] += attempts
+        counter["retries"] += attempts - 1
+        counter["failed"] += not success
+        counter["prompt_tokens"] += prompt_tokens
+        counter["cached_tokens"] += cached_tokens
+        counter["completion_tokens"] += completion_tokens
+        counter["cost_usd"] += cost
+
+    def call_stats(self, templates: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """This run's judge call counters (`CALL_EVENTS`, as `InferenceClient.call_stats`), summed over `templates` (default: all)"""
+        total = Counter()
+        for template_name, counts in self.call_counts.items():
+            if templates is None or template_name in templates:
+                total.update(counts)
+        return {event: total[event] for event in CALL_EVENTS}
+
+    def _group_by(self, position: int) -> Dict[str, Dict[str, Any]]:
+        groups = defaultdict(list)
+        for key in self._counters:
+            if key[position] is not None:
+                groups[str(key[position])].append(key)
+        return {name: _summarize([self._counters[key] for key in keys], [self._latencies[key] for key in keys])
+                for name, keys in sorted(groups.items())}
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals, per stage (with its wall-clock time), per template and per taxonomy recursion depth"""
+        judged = self._group_by(0)
+        stages = {}
+        for name, seconds in self.stage_times.items():
+            stages[name] = {"wall_time_s": round(seconds, 3), **judged.pop(name, _summarize([], []))}
+        stages.update(judged)
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "wall_time_s": round(time.time() - self.started_at, 3),
+            "total": _summarize(self._counters.values(), self._latencies.values()),
+            "stages": stages,
+            "templates": self._group_by(1),
+            "depths": self._group_by(2),
+        }
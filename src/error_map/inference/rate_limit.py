@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate_per_minute`, holding at most `burst_seconds` worth of tokens.
+
+    Waiters are served in arrival order. A request larger than the bucket waits for a full bucket and
+    leaves it in debt, which later requests wait out.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 10.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._refunded = asyncio.Event()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Take `amount` tokens, waiting for them; returns the seconds waited"""
+        start = time.monotonic()
+        async with self._lock:
+            needed = min(amount, self.capacity)
+            self._refill()
+            while self.tokens < needed:
+                # wait for the refill, or for tokens given back in the meantime
+                self._refunded.clear()
+                try:
+                    await asyncio.wait_for(self._refunded.wait(), (needed - self.tokens) / self.rate)
+                except asyncio.TimeoutError:
+                    pass
+                self._refill()
+            self.tokens -= amount
+        return time.monotonic() - start
+
+    def refund(self, amount: float) -> None:
+        """Give back tokens that were reserved but not used (negative: take more)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+        if amount > 0:
+            self._refunded.set()
+
+
+class EndpointRateLimiter:
+    """
+    Paces the calls to one endpoint to its requests-per-minute and tokens-per-minute quotas.
+
+    Each call reserves one request and its estimated tokens (prompt + max_tokens) before it is sent, and
+    `reconcile` gives back the difference to the tokens the response reports as used. Calls answered
+    from the judge-response cache never get here.
+    """
+
+    def __init__(self, rpm_limit: Optional[float] = None, tpm_limit: Optional[float] = None, burst_seconds: float = 10.0):
+        self.requests = TokenBucket(rpm_limit, burst_seconds) if rpm_limit else None
+        self.tokens = TokenBucket(tpm_limit, burst_seconds) if tpm_limit else None
+        self.waited = 0.0
+        self.reserved_tokens = 0
+        self.used_tokens = 0
+
+    async def reserve(self, estimated_tokens: int) -> int:
+        """Wait until the call fits in the quotas; returns the reserved tokens"""
+        if self.requests is not None:
+            self.waited += await self.requests.acquire(1)
+        if self.tokens is not None:
+            self.waited += await self.tokens.acquire(estimated_tokens)
+        self.reserved_tokens += estimated_tokens
+        return estimated_tokens
+
+    def reconcile(self, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        """Settle a reservation with the tokens actually used (None: unknown, keep the reservation)"""
+        if used_tokens is None:
+            used_tokens = reserved_tokens
+        self.used_tokens += used_tokens
+        if self.tokens is not None:
+            self.tokens.refund(reserved_tokens - used_tokens)
+
+    def stats(self) -> Dict:
+        return {
+            "rate_limit_wait_s": round(self.waited, 2),
+            "reserved_tokens": self.reserved_tokens,
+            "used_tokens": self.used_tokens,
+        }
@@ -0,0 +1,100 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+import litellm
+
+from .streaming import StreamAbortedError
+
+RETRYABLE = "retryable"
+PERMANENT = "permanent"
+
+# Checked in order: context-length and content-policy errors are BadRequestErrors, and Timeout is an APIConnectionError
+PERMANENT_ERRORS = (
+    litellm.ContextWindowExceededError,
+    litellm.ContentPolicyViolationError,
+    litellm.AuthenticationError,
+    litellm.PermissionDeniedError,
+    litellm.NotFoundError,
+    litellm.BadRequestError,
+    litellm.UnprocessableEntityError,
+)
+RETRYABLE_ERRORS = (
+    litellm.RateLimitError,
+    litellm.ServiceUnavailableError,
+    litellm.BadGatewayError,
+    litellm.InternalServerError,
+    litellm.Timeout,
+    litellm.APIConnectionError,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+    ConnectionError,
+    StreamAbortedError,
+)
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+
+def _headers(exc: BaseException) -> Dict[str, str]:
+    headers = {}
+    for source in (getattr(getattr(exc, "response", None), "headers", None), getattr(exc, "headers", None),
+                   getattr(exc, "litellm_response_headers", None)):
+        if source:
+            headers.update({str(k).lower(): str(v) for k, v in dict(source).items()})
+    return headers
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds to wait before retrying, as asked by the server's `Retry-After` (or `retry-after-ms`) header"""
+    headers = _headers(exc)
+    try:
+        if "retry-after-ms" in headers:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class RetryPolicy:
+    """
+    Retries of failed judge calls: exponential backoff with full jitter for retryable errors.
+
+    Rate limits, timeouts, 5xx, connection errors and aborted streams are retried up to `max_retries` times, waiting a random
+    time up to min(max_delay, base_delay * 2**attempt), or the server's `Retry-After` when it sends one
+    (up to `max_retry_after`). Other errors (context length, auth, bad requests) fail right away.
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0, max_retry_after: float = 600.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @staticmethod
+    def classify(exc: BaseException) -> str:
+        if isinstance(exc, PERMANENT_ERRORS):
+            return PERMANENT
+        if isinstance(exc, RETRYABLE_ERRORS):
+            return RETRYABLE
+        status_code = getattr(exc, "status_code", None)
+        if isinstance(status_code, int) and (status_code >= 500 or status_code in RETRYABLE_STATUS_CODES):
+            return RETRYABLE
+        return PERMANENT
+
+    def should_retry(self, exc: BaseException, attempt: int) -> bool:
+        """Whether to retry after failing attempt number `attempt` (0-based) with `exc`"""
+        return attempt < self.max_retries and self.classify(exc) == RETRYABLE
+
+    def delay(self, exc: BaseException, attempt: int) -> float:
+        server_delay = retry_after(exc)
+        if server_delay is not None:
+            return min(server_delay, self.max_retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
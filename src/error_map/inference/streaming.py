@@ -0,0 +1,268 @@
+from typing import Any, Dict, List, Optional
+
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789+-.eE"
+LITERALS = {"t": "true", "f": "false", "n": "null"}
+JSON_TYPES = {"{": "object", "[": "array", '"': "string", "t": "boolean", "f": "boolean", "n": "null"}
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+HEX_DIGITS = "0123456789abcdefABCDEF"
+
+# A judge stuck in a loop: the last REPEAT_WINDOW characters occur REPEAT_LIMIT times in the last REPEAT_SPAN
+REPEAT_WINDOW = 128
+REPEAT_LIMIT = 10
+REPEAT_SPAN = 8192
+
+
+class StreamAbortedError(Exception):
+    """A streamed judge response was cut short: it broke its schema or ran away. Retryable."""
+
+
+def _type_matches(json_type: str, schema: Dict) -> bool:
+    allowed = schema.get("type")
+    if allowed is None:
+        return True
+    allowed = allowed if isinstance(allowed, list) else [allowed]
+    return json_type in allowed or (json_type == "number" and "integer" in allowed)
+
+
+class StreamingJSONValidator:
+    """
+    Incremental JSON parser checking a streamed response against its JSON schema.
+
+    `feed` raises `StreamAbortedError` as soon as the response can no longer be valid: a syntax error,
+    text around the JSON value (a Markdown fence is allowed), a value of the wrong type, a string
+    that is no prefix of its enum (escapes decoded), a non-integer where an integer is expected, an
+    unknown property (with `additionalProperties: false`), a missing required property or more than
+    `maxItems` items. It also aborts runaway responses: longer than `max_chars`, or repeating themselves.
+    `finish`, at the end of the stream, raises if the JSON value is incomplete (a truncated response).
+    """
+
+    def __init__(self, schema: Optional[Dict], max_chars: Optional[int] = None):
+        self.max_chars = max_chars
+        self.length = 0
+        self._tail = ""
+        # parse stack: containers ({"kind", "schema", "state", ...}), the scalar being read and the schema of the next value
+        self._stack: List[Dict[str, Any]] = []
+        self._scalar = None
+        self._expect = schema or {}
+        self._done = False
+        self._prefix = ""
+        self._fence = 0
+
+    def _fail(self, reason: str) -> None:
+        raise StreamAbortedError(f"Judge response aborted after {self.length} characters: {reason}")
+
+    def feed(self, chunk: str) -> None:
+        self.length += len(chunk)
+        if self.max_chars is not None and self.length > self.max_chars:
+            self._fail(f"longer than {self.max_chars} characters")
+        self._tail = (self._tail + chunk)[-REPEAT_SPAN:]
+        if len(self._tail) >= REPEAT_WINDOW * REPEAT_LIMIT and self._tail.count(self._tail[-REPEAT_WINDOW:]) >= REPEAT_LIMIT:
+            self._fail("the response repeats itself")
+        ind = 0
+        while ind < len(chunk):
+            scalar = self._scalar
+            if scalar is not None and scalar["kind"] == "string" and not scalar["keep"] and scalar["escape"] is False:
+                # skip to the end of a plain string (or its next escape)
+                ends = [found for found in (chunk.find('"', ind), chunk.find("\\", ind)) if found >= 0]
+                if not ends:
+                    return
+                ind = min(ends)
+            self._char(chunk[ind])
+            ind += 1
+
+    def finish(self) -> None:
+        """The stream ended: the response must hold a complete JSON value"""
+        scalar = self._scalar
+        if scalar is not None and not self._stack:
+            # a top-level number or literal ends with the response
+            if scalar["kind"] == "number":
+                self._end_number()
+            elif scalar["kind"] == "literal" and scalar["read"] == len(scalar["literal"]):
+                self._scalar = None
+                self._end_value()
+        if not self._done:
+            self._fail("truncated response, the JSON value is incomplete")
+
+    # values
+
+    def _start_value(self, char: str) -> None:
+        schema = self._expect
+        json_type = JSON_TYPES.get(char, "number" if char in "-0123456789" else None)
+        if json_type is None:
+            self._fail(f"unexpected {char!r} instead of a value")
+        if not _type_matches(json_type, schema):
+            self._fail(f"{json_type} instead of {schema.get('type')}")
+        if char == "{":
+            self._stack.append({"kind": "object", "schema": schema, "state": "key_or_end", "keys": set()})
+        elif char == "[":
+            self._stack.append({"kind": "array", "schema": schema, "state": "value_or_end", "items": 0})
+        elif char == '"':
+            self._scalar = {"kind": "string", "chars": [], "escape": False, "enum": schema.get("enum"), "keep": "enum" in schema}
+        elif char in LITERALS:
+            self._scalar = {"kind": "literal", "literal": LITERALS[char], "read": 1}
+        else:
+            self._scalar = {"kind": "number", "schema": schema, "chars": [char]}
+
+    def _end_value(self) -> None:
+        """A value is complete: back to its container"""
+        if not self._stack:
+            self._done = True
+            return
+        frame = self._stack[-1]
+        frame["state"] = "comma_or_end"
+
+    def _escape_char(self, char: str) -> Optional[str]:
+        """Next character of an escape sequence: the decoded character once it is complete, else None"""
+        scalar = self._scalar
+        escape = scalar["escape"]
+        if escape is True:
+            if char == "u":
+                scalar["escape"] = ""
+                return None
+            if char not in ESCAPES:
+                self._fail(f"invalid escape \\{char}")
+            scalar["escape"] = False
+            return ESCAPES[char]
+        # \uXXXX
+        if char not in HEX_DIGITS:
+            self._fail(f"invalid escape \\u{escape}{char}")
+        escape += char
+        if len(escape) < 4:
+            scalar["escape"] = escape
+            return None
+        scalar["escape"] = False
+        decoded = chr(int(escape, 16))
+        chars = scalar["chars"]
+        if chars and "\ud800" <= chars[-1] <= "\udbff" and "\udc00" <= decoded <= "\udfff":
+            # low half of a surrogate pair
+            decoded = (chars.pop() + decoded).encode("utf-16", "surrogatepass").decode("utf-16")
+        return decoded
+
+    def _string_char(self, char: str) -> None:
+        scalar = self._scalar
+        if scalar["escape"] is not False:
+            char = self._escape_char(char)
+            if char is None:
+                return
+        elif char == "\\":
+            scalar["escape"] = True
+            return
+        elif char == '"':
+            return self._end_string()
+        if scalar["keep"]:
+            scalar["chars"].append(char)
+        if scalar["enum"] is not None and not "\ud800" <= char <= "\udbff":
+            prefix = "".join(scalar["chars"])
+            if not any(str(option).startswith(prefix) for option in scalar["enum"]):
+                self._fail(f"{prefix!r} is not one of {scalar['enum']}")
+
+    def _end_string(self) -> None:
+        scalar = self._scalar
+        value = "".join(scalar["chars"])
+        self._scalar = None
+        if scalar["enum"] is not None and value not in scalar["enum"]:
+            self._fail(f"{value!r} is not one of {scalar['enum']}")
+        if scalar.get("key"):
+            self._end_key(value)
+        else:
+            self._end_value()
+
+    def _end_number(self) -> None:
+        number = "".join(self._scalar["chars"])
+        try:
+            value = float(number)
+        except ValueError:
+            self._fail(f"invalid number {number}")
+        # 1.0 and 1e2 are integers too
+        if self._scalar["schema"].get("type") == "integer" and not value.is_integer():
+            self._fail(f"{number} is not an integer")
+        self._scalar = None
+        self._end_value()
+
+    def _end_key(self, key: str) -> None:
+        frame = self._stack[-1]
+        properties = frame["schema"].get("properties", {})
+        if frame["schema"].get("additionalProperties") is False and key not in properties:
+            self._fail(f"unknown property {key!r}")
+        frame["keys"].add(key)
+        frame["key"] = key
+        frame["state"] = "colon"
+
+    # structure
+
+    def _char(self, char: str) -> None:
+        if self._scalar is not None:
+            kind = self._scalar["kind"]
+            if kind == "string":
+                return self._string_char(char)
+            if kind == "literal":
+                literal, read = self._scalar["literal"], self._scalar["read"]
+                if read < len(literal):
+                    if char != literal[read]:
+                        self._fail(f"invalid literal, expected {literal!r}")
+                    self._scalar["read"] += 1
+                    return
+                self._scalar = None
+                self._end_value()
+            elif kind == "number":
+                if char in NUMBER_CHARS:
+                    self._scalar["chars"].append(char)
+                    return
+                self._end_number()
+            # the character after a literal or number belongs to the enclosing structure
+
+        if char in WHITESPACE:
+            return
+        if self._done:
+            # a closing Markdown fence
+            if char == "`" and self._fence < 3:
+                self._fence += 1
+                return
+            self._fail("text after the JSON value")
+        if not self._stack:
+            # an opening Markdown fence
+            candidate = self._prefix + char
+            if "```json".startswith(candidate) and (self._prefix or char == "`"):
+                self._prefix = candidate
+                return
+            if self._prefix not in ("", "```", "```json"):
+                self._fail("text before the JSON value")
+            self._start_value(char)
+            return
+
+        frame = self._stack[-1]
+        state = frame["state"]
+        if frame["kind"] == "object":
+            if state in ("key_or_end", "key") and char == '"':
+                self._scalar = {"kind": "string", "chars": [], "escape": False, "enum": None, "keep": True, "key": True}
+            elif state == "key_or_end" and char == "}" or state == "comma_or_end" and char == "}":
+                missing = [key for key in frame["schema"].get("required", []) if key not in frame["keys"]]
+                if missing:
+                    self._fail(f"missing required properties {missing}")
+                self._stack.pop()
+                self._end_value()
+            elif state == "comma_or_end" and char == ",":
+                frame["state"] = "key"
+            elif state == "colon" and char == ":":
+                frame["state"] = "value"
+            elif state == "value":
+                self._expect = frame["schema"].get("properties", {}).get(frame["key"], {})
+                self._start_value(char)
+            else:
+                self._fail(f"unexpected {char!r} in an object")
+        else:
+            if state == "comma_or_end" and char == "]" or state == "value_or_end" and char == "]":
+                self._stack.pop()
+                self._end_value()
+            elif state == "comma_or_end" and char == ",":
+                frame["state"] = "value"
+            elif state in ("value_or_end", "value"):
+                frame["items"] += 1
+                max_items = frame["schema"].get("maxItems")
+                if max_items is not None and frame["items"] > max_items:
+                    self._fail(f"more than {max_items} items")
+                self._expect = frame["schema"].get("items", {})
+                self._start_value(char)
+            else:
+                self._fail(f"unexpected {char!r} in an array")
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+from typing import Any, Dict, List, Optional
+
+import litellm
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "exponential", "lognormal"]
+
+# Skills the synthetic error titles are about: top-level taxonomy categories
+SKILLS = [
+    "Arithmetic", "Factual recall", "Instruction following", "Logical reasoning", "Unit conversion",
+    "Code syntax", "Reading comprehension", "Output format", "Temporal reasoning", "Hallucinated detail",
+    "Multi-step planning", "Answer extraction", "Commonsense", "Spatial reasoning", "Translation",
+]
+TITLE_SEPARATOR = " error #"
+
+
+def message_text(message: Dict) -> str:
+    """Text of a chat message, whose content is a string or a list of content parts"""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _hash(*parts: Any) -> int:
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _skill(title: str) -> str:
+    return str(title).split(TITLE_SEPARATOR, 1)[0]
+
+
+def _cluster_of(title: str, names: List[str]) -> str:
+    """Cluster of an error title: the one named after its skill, else a stable pick"""
+    skill = _skill(title)
+    if skill in names:
+        return skill
+    return names[_hash(title) % len(names)]
+
+
+def _load_clusters(cluster_list: Any) -> List[Dict]:
+    try:
+        clusters = json.loads(cluster_list) if isinstance(cluster_list, str) else cluster_list
+        return list(clusters["clusters"])
+    except (TypeError, ValueError, KeyError):
+        return []
+
+
+def generate_from_schema(schema: Dict, rng: random.Random, name: str = "value") -> Any:
+    """A random instance of a JSON schema (objects, arrays, enums, strings, numbers, booleans)"""
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    schema_type = schema.get("type", "string")
+    if schema_type == "object":
+        return {key: generate_from_schema(sub_schema, rng, key) for key, sub_schema in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        num_items = rng.randint(max(schema.get("minItems", 1), 1), max(schema.get("minItems", 1), 3))
+        return [generate_from_schema(schema.get("items", {}), rng, name) for _ in range(num_items)]
+    if schema_type == "integer":
+        return rng.randint(schema.get("minimum", 0), schema.get("maximum", 100))
+    if schema_type == "number":
+        return rng.uniform(schema.get("minimum", 0), schema.get("maximum", 1))
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    return f"synthetic {name} {rng.randint(0, 999)}"
+
+
+class SyntheticJudge:
+    """
+    Stand-in judge endpoint for load tests and profiling: an `acompletion` answering valid JSON for each
+    response schema, after a random latency, with random failures.
+
+    Answers are consistent across the pipeline, so every stage runs its real code path: single-error
+    analyses get error titles from `num_error_types` types (log-uniform, so a few are frequent) about a
+    handful of skills, the taxonomy prompts get one cluster per skill (sub-clusters under a parent
+    category), and classification assigns each title to its skill's cluster. The content only depends
+    on `seed` and the prompt; the latency (`latency`: "fixed", "uniform", "exponential" or "lognormal",
+    with mean `latency_mean` seconds and relative `latency_spread`) and failures are drawn from `seed`.
+
+    Failures: `failure_rate` of the calls raise a 500, `overload_rate` a 429, `permanent_failure_rate` a 400.
+    Calls beyond `max_concurrency` in flight also get a 429.
+    """
+
+    def __init__(self,
+                 seed: int = 0,
+                 latency: str = "lognormal",
+                 latency_mean: float = 0.5,
+                 latency_spread: float = 0.5,
+                 failure_rate: float = 0.0,
+                 overload_rate: float = 0.0,
+                 permanent_failure_rate: float = 0.0,
+                 max_concurrency: Optional[int] = None,
+                 num_error_types: int = 200):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency} (expected one of {LATENCY_DISTRIBUTIONS})")
+        self.seed = seed
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_spread = latency_spread
+        self.failure_rate = failure_rate
+        self.overload_rate = overload_rate
+        self.permanent_failure_rate = permanent_failure_rate
+        self.max_concurrency = max_concurrency
+        self.num_error_types = num_error_types
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+
+    def cache_namespace(self) -> str:
+        """What determines the answers: part of the response cache key"""
+        return f"synthetic:seed={self.seed}:types={self.num_error_types}"
+
+    def _latency(self) -> float:
+        mean, spread = self.latency_mean, self.latency_spread
+        if mean <= 0:
+            return 0.0
+        if self.latency == "fixed":
+            return mean
+        if self.latency == "uniform":
+            return self.rng.uniform(mean * max(0.0, 1 - spread), mean * (1 + spread))
+        if self.latency == "exponential":
+            return self.rng.expovariate(1 / mean)
+        sigma = math.sqrt(math.log(1 + spread ** 2))  # lognormal with this mean and coefficient of variation
+        return self.rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+
+    def _failure(self, model: str) -> Optional[Exception]:
+        if self.max_concurrency is not None and self.in_flight > self.max_concurrency:
+            return litellm.RateLimitError("Synthetic judge: too many concurrent requests", llm_provider="synthetic", model=model)
+        draw = self.rng.random()
+        if draw < self.overload_rate:
+            return litellm.RateLimitError("Synthetic judge: rate limited", llm_provider="synthetic", model=model)
+        draw -= self.overload_rate
+        if draw < self.failure_rate:
+            return litellm.InternalServerError("Synthetic judge: internal error", llm_provider="synthetic", model=model)
+        draw -= self.failure_rate
+        if draw < self.permanent_failure_rate:
+            return litellm.BadRequestError("Synthetic judge: bad request", llm_provider="synthetic", model=model)
+        return None
+
+    async def acompletion(self, model: str = "synthetic", messages: List[Dict] = None, response_format: Optional[Dict] = None,
+                          template_name: str = "", template_vars: Optional[Dict] = None, **kwargs) -> litellm.ModelResponse:
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self._latency())
+            failure = self._failure(model)
+            if failure is not None:
+                raise failure
+        finally:
+            self.in_flight -= 1
+
+        prompt = "".join(message_text(message) for message in messages or [])
+        schema = ((response_format or {}).get("json_schema") or {}).get("schema") or {}
+        content = json.dumps(self.answer(template_name, template_vars or {}, schema, prompt), ensure_ascii=False)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        return litellm.ModelResponse(
+            model=model,
+            choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+    def answer(self, template_name: str, template_vars: Dict, schema: Dict, prompt: str) -> Any:
+        """JSON answer to a prompt, valid for its response schema"""
+        rng = random.Random(_hash(self.seed, prompt))
+        if template_name == "single_error_analysis.j2":
+            return self._single_error(rng)
+        if template_name in ("taxonomy_generation.j2", "taxonomy_update.j2", "taxonomy_review.j2"):
+            return self._taxonomy(template_name, template_vars, rng)
+        if template_name == "classify_errors.j2":
+            return self._classify(template_vars)
+        return generate_from_schema(schema, rng)
+
+    def _single_error(self, rng: random.Random) -> Dict:
+        error_type = min(int(self.num_error_types ** rng.random()) - 1, self.num_error_types - 1)
+        skill = SKILLS[_hash(self.seed, error_type) % len(SKILLS)]
+        title = f"{skill}{TITLE_SEPARATOR}{error_type}"
+        return {
+            "required_criteria": [
+                {
+                    "criterion": f"{skill} criterion {ind + 1}",
+                    "present_in_wrong": rng.random() < 0.5,
+                    "quality": rng.choice(["incorrect", "correct", "partially correct"]),
+                    "evidence": f"synthetic evidence {rng.randint(0, 999)}",
+                    "comment": f"synthetic comment {rng.randint(0, 999)}",
+                }
+                for ind in range(rng.randint(1, 3))
+            ],
+            "final_answer": {"error_summary": f"The model made a {skill.lower()} mistake (type {error_type}).", "error_title": title},
+        }
+
+    def _taxonomy(self, template_name: str, template_vars: Dict, rng: random.Random) -> Dict:
+        max_clusters = max(int(template_vars.get("max_num_clusters") or 1), 1)
+        parent = template_vars.get("parent_category")
+        clusters = _load_clusters(template_vars.get("cluster_list"))
+        names = [cluster.get("name", "") for cluster in clusters]
+        titles = [item[0] if isinstance(item, (list, tuple)) else item for item in template_vars.get("data") or []]
+        if parent:
+            # sub-categories of one skill: stable groups of its titles
+            if not names:
+                num_clusters = min(max_clusters, max(2, len(titles) // 3))
+                names = [f"{parent}: variant {ind + 1}" for ind in range(num_clusters)]
+        else:
+            for title in titles:
+                if len(names) >= max_clusters:
+                    break
+                if _skill(title) not in names:
+                    names.append(_skill(title))
+        clusters = [{"id": ind + 1, "name": name, "description": f"Errors of the kind: {name}"} for ind, name in enumerate(names)]
+        explanation = f"Synthetic taxonomy with {len(clusters)} categories."
+        if template_name == "taxonomy_generation.j2":
+            return {"clusters": clusters, "explanation": explanation}
+        suggestions = [f"synthetic suggestion {rng.randint(0, 999)}"]
+        if template_name == "taxonomy_update.j2":
+            return {"explanation": explanation, "suggestions": suggestions, "clusters": clusters}
+        return {"rating_score": rng.randint(60, 100), "explanation": explanation, "suggestions": suggestions, "clusters": clusters}
+
+    def _classify(self, template_vars: Dict) -> Dict:
+        names = [cluster.get("name", "") for cluster in _load_clusters(template_vars.get("taxonomy"))] or ["Other"]
+        return {"classified_errors": [{"error_text": str(title), "category": _cluster_of(title, names)}
+                                      for title in template_vars.get("data") or []]}
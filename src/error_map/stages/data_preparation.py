@@ -1,54 +1,420 @@
 import asyncio
-from typing import List, Dict, Optional, Union
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterator, List, Dict, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
-from ..utils.constants import REQUIRED_DATA_COLUMNS
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pa_ds
+from concurrent.futures import ProcessPoolExecutor
+from ..utils.constants import REQUIRED_DATA_COLUMNS, OPTIONAL_DATA_COLUMNS, LIGHT_DATA_COLUMNS, DATA_FILE_FORMATS
 from ..utils.cache import cached
+from ..utils.sampling import StratifiedReservoirSampler
 from ..core.config import Config
 
+# Default thresholds are rounded to 1 / SCORE_GRID: the failure counts below them are derived from per-bucket score counts
+SCORE_GRID = 100
+MAX_HISTOGRAM_BUCKETS = 100_000
 
-async def _process_and_filter_record(record: Dict, config: Config, models: Optional[List[str]], thresholds: List[Dict]) -> Dict:
-    dataset = record['dataset']
-    threshold = config.dataset_params.get(dataset, {}).get('success_threshold', thresholds.get(dataset, 0.7))
-    record['error'] = record['score'] < threshold
-    
-    # Mark for filtering if needed
-    if models and record['model'] not in models and record['error']:
-        record['_filtered'] = True
+
+def _open_dataset(config: Config, dataset: str) -> Optional[Tuple[Path, List[str]]]:
+    """Locate the dataset file and validate its columns, without reading any rows"""
+    path = config.dataset_file(dataset)
+    if path is None:
+        print(f"Dataset {dataset} not found (expected one of: {', '.join(DATA_FILE_FORMATS)}), skipping...")
+        return None
+
+    if DATA_FILE_FORMATS[path.suffix] == "csv":
+        columns = list(pd.read_csv(path, nrows=0).columns)
     else:
-        record['_filtered'] = False
-    
-    return record
+        columns = pa_ds.dataset(path, format=DATA_FILE_FORMATS[path.suffix]).schema.names
+
+    missing_cols = [col for col in REQUIRED_DATA_COLUMNS if col not in columns]
+    if missing_cols:
+        raise ValueError(f"Dataset '{path.name}' is missing required columns: {missing_cols}")
+    return path, columns
+
+
+def _projection(path: Path, columns: List[str], cols_to_keep: Optional[List[str]]) -> Optional[List[str]]:
+    """
+    Columns to load: for columnar files, the ones used by the pipeline (required and optional data
+    columns plus `cols_to_keep`). CSV files keep all their columns (None), as in the stage outputs
+    of CSV datasets (e.g. `index`, `dataset_category`).
+    """
+    if DATA_FILE_FORMATS[path.suffix] == "csv":
+        return None
+    wanted = REQUIRED_DATA_COLUMNS + OPTIONAL_DATA_COLUMNS + (cols_to_keep or [])
+    return [col for col in columns if col in wanted]
+
+
+def _iter_frames(
+    path: Path,
+    columns: Optional[List[str]] = None,
+    row_filter: Optional[Tuple[List[str], float]] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a dataset file as DataFrames, whole (a single frame) or in chunks of at most `chunk_size` rows.
+
+    Only `columns` are read: Parquet and Arrow IPC files are read through a pyarrow dataset, which decodes
+    only those and applies `row_filter` while scanning. CSV files are parsed with pandas (`usecols`), and
+    `row_filter` is applied to each parsed chunk.
+    """
+    file_format = DATA_FILE_FORMATS[path.suffix]
+    if file_format == "csv":
+        frames = pd.read_csv(path, usecols=columns, chunksize=chunk_size) if chunk_size else [pd.read_csv(path, usecols=columns)]
+        for df in frames:
+            yield _filter_frame(df, row_filter) if row_filter is not None else df
+        return
+
+    source = pa_ds.dataset(path, format=file_format)
+    expression = _filter_expression(row_filter) if row_filter is not None else None
+    if chunk_size:
+        for batch in source.to_batches(columns=columns, filter=expression, batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield source.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def _score_stats(path: Path) -> Tuple[float, int]:
+    """Sum and count of the (non-missing) scores of a columnar dataset, reading the score column only"""
+    scores = next(_iter_frames(path, columns=["score"]))["score"]
+    return float(scores.sum()), int(scores.count())
+
+
+def _default_threshold(score_sum: float, score_count: int) -> float:
+    return round(score_sum / score_count * 0.7, 2)
+
+
+def _success_threshold(config: Config, dataset: str, thresholds: Dict) -> float:
+    return config.dataset_params.get(dataset, {}).get('success_threshold', thresholds.get(dataset, 0.7))
+
+
+def _read_filter(config: Config, dataset: str, models: Optional[List[str]], thresholds: Dict) -> Optional[Tuple[List[str], float]]:
+    """
+    Row filter applied while reading, as (models, success threshold): drop errors of models outside
+    `models`, exactly like the `_filtered` flag. Successes of other models are kept, they serve as
+    correct references. None without a `models` filter.
+    """
+    if not models:
+        return None
+    return list(models), _success_threshold(config, dataset, thresholds)
+
+
+def _filter_expression(row_filter: Tuple[List[str], float]) -> pc.Expression:
+    models, threshold = row_filter
+    score = pc.field("score")
+    return pc.field("model").isin(models) | score.is_null(nan_is_null=True) | (score >= threshold)
+
+
+def _filter_frame(df: pd.DataFrame, row_filter: Tuple[List[str], float]) -> pd.DataFrame:
+    models, threshold = row_filter
+    keep = df["model"].isin(models) | df["score"].isna() | (df["score"] >= threshold)
+    return df[keep.to_numpy()]
 
 
-def _load_csv_sync(data_path: str, dataset: str) -> List[Dict]:
+def _columnar_read_plan(config: Config, dataset: str, path: Path, models: Optional[List[str]]) -> Tuple[Optional[Tuple[List[str], float]], Optional[Tuple[float, int]]]:
+    """
+    For columnar files with a `models` filter, scan the scores first (the default threshold is based on
+    all the rows) and build the row filter to push down. Returns (row_filter, score_stats).
+    """
+    if not models or DATA_FILE_FORMATS[path.suffix] == "csv":
+        return None, None
+    score_stats = _score_stats(path)
+    thresholds = {dataset: _default_threshold(*score_stats)} if score_stats[1] else {}
+    return _read_filter(config, dataset, models, thresholds), score_stats
+
+
+def _load_dataset_sync(config: Config, dataset: str, models: Optional[List[str]], cols_to_keep: Optional[List[str]]) -> Tuple[pd.DataFrame, Optional[Tuple[float, int]]]:
+    """Load a dataset file. Returns the frame and the score (sum, count) used for its default threshold."""
+    source = _open_dataset(config, dataset)
+    if source is None:
+        return pd.DataFrame(), None
+    path, columns = source
+
+    row_filter, score_stats = _columnar_read_plan(config, dataset, path, models)
+    df = next(_iter_frames(path, _projection(path, columns, cols_to_keep), row_filter))
+    df["dataset"] = dataset
+    if score_stats is None:
+        score_stats = (float(df["score"].sum()), int(df["score"].count()))
+    return df, score_stats
+
+
+def _serialize_frame(df: pd.DataFrame) -> Tuple[str, Any]:
+    """
+    Payload for sending a frame from a loader process to the parent: an Arrow IPC stream (columnar
+    buffers), or the pickled frame when a column can't be typed by Arrow (e.g. mixed ints and strings).
+    """
     try:
-        df = pd.read_csv(f"{data_path}/{dataset}.csv")
-        missing_cols = [col for col in REQUIRED_DATA_COLUMNS if col not in df.columns]
-        if missing_cols:
-            raise ValueError(f"Dataset '{dataset}.csv' is missing required columns: {missing_cols}")
-        df["dataset"] = dataset
-        return df.to_dict('records')
-    except FileNotFoundError:
-        print(f"Dataset {dataset}.csv not found, skipping...")
-        return []
-
-async def _load_dataset_async(data_path: str, dataset: str) -> List[Dict]:
-    """Async wrapper for CSV loading"""
-    # Run CSV loading in thread pool to avoid blocking
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, _load_csv_sync, data_path, dataset)
-
-
-def _sample_failures(failures: List[Dict], ratio: float, seed: int) -> List[Dict]:
-    df = pd.DataFrame(failures)
-    sampled_df = (
-        df.groupby(['model', 'dataset'], group_keys=False)
-        .sample(frac=ratio, random_state=seed)
-        .reset_index(drop=True)   
-    )
-    return sampled_df.to_dict('records')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return "pickle", df
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return "arrow", sink.getvalue()
+
+
+def _deserialize_frame(payload: Tuple[str, Any]) -> pd.DataFrame:
+    kind, data = payload
+    if kind == "pickle":
+        return data
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def _load_dataset_worker(config: Config, dataset: str, models: Optional[List[str]], cols_to_keep: Optional[List[str]]) -> Tuple[Tuple[str, Any], Tuple[float, int]]:
+    df, score_stats = _load_dataset_sync(config, dataset, models, cols_to_keep)
+    return _serialize_frame(df), score_stats
+
+
+def _collect_rows_worker(*args) -> Tuple[Tuple[str, Any], Tuple[str, Any]]:
+    failures, successes = _collect_rows_sync(*args)
+    return _serialize_frame(failures), _serialize_frame(successes)
+
+
+def _loader_pool(config: Config) -> ProcessPoolExecutor:
+    """One bounded process pool, sized to the CPUs, shared by all the file work of a `prepare_data` call"""
+    return ProcessPoolExecutor(max_workers=max(1, min(os.cpu_count() or 1, len(config.datasets))))
+
+
+async def _run_in_pool(executor: ProcessPoolExecutor, func, *args):
+    """Run blocking file parsing in the loader pool, off the event loop and the GIL"""
+    return await asyncio.get_event_loop().run_in_executor(executor, func, *args)
+
+
+async def _load_dataset_async(executor: ProcessPoolExecutor, config: Config, dataset: str, models: Optional[List[str]], cols_to_keep: Optional[List[str]]) -> Tuple[pd.DataFrame, Tuple[float, int]]:
+    """Async wrapper for dataset loading"""
+    payload, score_stats = await _run_in_pool(executor, _load_dataset_worker, config, dataset, models, cols_to_keep)
+    return _deserialize_frame(payload), score_stats
+
+
+def _flag_errors(df: pd.DataFrame, config: Config, models: Optional[List[str]], thresholds: Dict) -> pd.DataFrame:
+    """Mark errors (score below the dataset's success threshold) and errors of models outside `models` to filter out"""
+    ds2success = {dataset: _success_threshold(config, dataset, thresholds) for dataset in df['dataset'].unique()}
+    df['error'] = (df['score'] < df['dataset'].map(ds2success).astype(float)).to_numpy()
+    if models:
+        df['_filtered'] = (~df['model'].isin(models) & df['error']).to_numpy()
+    else:
+        df['_filtered'] = False
+    return df
+
+
+def _count_failures(chunk: pd.DataFrame, dataset: str, models: Optional[List[str]], threshold: float) -> Counter:
+    """Failures (score below `threshold`) of the models in `models` in a chunk, per (model, dataset) stratum"""
+    failures = (chunk['score'] < threshold).to_numpy()
+    if models:
+        failures = failures & chunk['model'].isin(models).to_numpy()
+    return Counter({(model, dataset): int(count) for model, count in chunk['model'][failures].value_counts(sort=False).items()})
+
+
+def _score_buckets(scores: np.ndarray) -> np.ndarray:
+    """
+    Index b of the SCORE_GRID bucket of each score, such that b / SCORE_GRID <= score < (b + 1) / SCORE_GRID
+    in floating point (NaN for missing scores, +-inf for infinite ones)
+    """
+    buckets = np.floor(scores * SCORE_GRID)
+    # scores * SCORE_GRID is rounded: move the scores next to a bucket boundary to the side the threshold comparison puts them
+    with np.errstate(invalid="ignore"):
+        buckets -= scores < buckets / SCORE_GRID
+        buckets += scores >= (buckets + 1) / SCORE_GRID
+    return buckets
+
+
+def _score_histogram(chunk: pd.DataFrame, models: Optional[List[str]]) -> Counter:
+    """Scores of the models in `models` in a chunk, counted per (model, score bucket)"""
+    frame = pd.DataFrame({"model": chunk['model'].to_numpy(), "bucket": _score_buckets(chunk['score'].to_numpy(dtype=float))})
+    if models:
+        frame = frame[chunk['model'].isin(models).to_numpy()]
+    return Counter(frame.groupby(["model", "bucket"], sort=False).size().to_dict())
+
+
+def _failures_from_histogram(histogram: Counter, dataset: str, threshold: float) -> Optional[Counter]:
+    """Failures per (model, dataset) stratum below a threshold on the score grid (None for other thresholds)"""
+    grid_index = round(threshold * SCORE_GRID)
+    if grid_index / SCORE_GRID != threshold:
+        return None
+    counts = Counter()
+    for (model, bucket), count in histogram.items():
+        if bucket < grid_index:
+            counts[(model, dataset)] += count
+    return counts
+
+
+def _scan_dataset_sync(config: Config, dataset: str, models: Optional[List[str]], chunk_size: int) -> Optional[Dict]:
+    """
+    First streaming pass over the scoring columns of all the rows: running score aggregates for the
+    default threshold, and the failure counts of every (model, dataset) stratum the sampler is sized
+    with. The default threshold isn't known before the end of the pass, but it is rounded to the score
+    grid (0.01), so the scores are counted per model and grid bucket and the failures below it are
+    summed up afterwards. A configured threshold is counted directly. Returns None if the dataset file
+    doesn't exist.
+    """
+    source = _open_dataset(config, dataset)
+    if source is None:
+        return None
+    path, columns = source
+    threshold = config.dataset_params.get(dataset, {}).get('success_threshold')
+
+    score_sum, score_count = 0.0, 0
+    failure_counts = Counter() if threshold is not None else None
+    histogram = Counter() if threshold is None else None
+    for chunk in _iter_frames(path, ["model", "score"], chunk_size=chunk_size):
+        score_sum += chunk['score'].sum()
+        score_count += int(chunk['score'].count())
+        if failure_counts is not None:
+            failure_counts.update(_count_failures(chunk, dataset, models, threshold))
+        elif histogram is not None:
+            histogram.update(_score_histogram(chunk, models))
+            if len(histogram) > MAX_HISTOGRAM_BUCKETS:
+                histogram = None  # scores spread too widely, counted in a second pass
+
+    # the row filter is set once the thresholds are known
+    return {"dataset": dataset, "path": path, "columns": columns, "row_filter": None, "score_sum": score_sum,
+            "score_count": score_count, "failure_counts": failure_counts, "histogram": histogram}
+
+
+def _scan_failure_counts(scan: Dict, config: Config, thresholds: Dict) -> Optional[Counter]:
+    """
+    Failure counts of every (model, dataset) stratum derived by the scan; None when it couldn't
+    (a threshold off the score grid, or too many score buckets)
+    """
+    if scan["failure_counts"] is not None:
+        return scan["failure_counts"]
+    if scan["histogram"] is None:
+        return None
+    return _failures_from_histogram(scan["histogram"], scan["dataset"], _success_threshold(config, scan["dataset"], thresholds))
+
+
+def _count_failures_sync(scan: Dict, config: Config, models: Optional[List[str]], thresholds: Dict, chunk_size: int) -> Counter:
+    """Streaming pass over the scoring columns counting the failures of every (model, dataset) stratum"""
+    dataset = scan["dataset"]
+    threshold = _success_threshold(config, dataset, thresholds)
+    counts = Counter()
+    for chunk in _iter_frames(scan["path"], ["model", "score"], scan["row_filter"], chunk_size):
+        counts.update(_count_failures(chunk, dataset, models, threshold))
+    return counts
+
+
+def _sample_dataset_sync(scan: Dict, config: Config, models: Optional[List[str]], thresholds: Dict, ratio: float, chunk_size: int, failure_counts: Dict) -> pd.DataFrame:
+    """Streaming pass that reservoir-samples the failures of a dataset, keeping their row position and example_id"""
+    dataset = scan["dataset"]
+    sampler = StratifiedReservoirSampler(ratio, failure_counts, config.seed)
+    offset = 0
+    for chunk in _iter_frames(scan["path"], LIGHT_DATA_COLUMNS, scan["row_filter"], chunk_size):
+        chunk['_row'] = np.arange(offset, offset + len(chunk))
+        chunk['dataset'] = dataset
+        offset += len(chunk)
+        chunk = _flag_errors(chunk, config, models, thresholds)
+        failures = chunk[chunk['error'].to_numpy() & ~chunk['_filtered'].to_numpy()]
+        for model, positions in failures.groupby('model', sort=False).indices.items():
+            sampler.add((model, dataset), failures[['_row', 'example_id']].iloc[positions].to_records(index=False))
+
+    sample = sampler.sample()
+    return pd.DataFrame({
+        "model": [model for (model, _), _ in sample],
+        "dataset": dataset,
+        "_row": np.array([item[0] for _, item in sample], dtype=np.int64),
+        "example_id": [item[1] for _, item in sample],
+        "error": True,
+    })
+
+
+def _collect_rows_sync(scan: Dict, config: Config, models: Optional[List[str]], thresholds: Dict, chunk_size: int, sampled: pd.DataFrame, cols_to_keep: Optional[List[str]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Last streaming pass: materialize the sampled failures of the dataset (by row position), and the
+    successes on the same examples (the only ones used later, as correct references)
+    """
+    path = scan["path"]
+    columns = _projection(path, scan["columns"], cols_to_keep)
+
+    wanted = np.sort(sampled['_row'].to_numpy())
+    example_ids = set(sampled['example_id'])
+    failures, successes, offset = [], [], 0
+    for chunk in _iter_frames(path, columns, scan["row_filter"], chunk_size):
+        positions = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        chunk['dataset'] = scan["dataset"]
+        chunk = _flag_errors(chunk, config, models, thresholds)
+
+        failure_mask = np.isin(positions, wanted, assume_unique=True)
+        if failure_mask.any():
+            failures.append(chunk[failure_mask].assign(_row=positions[failure_mask]))
+        success_mask = ~chunk['error'].to_numpy() & chunk['example_id'].isin(example_ids).to_numpy()
+        if success_mask.any():
+            successes.append(chunk[success_mask])
+
+    failures = pd.concat(failures, ignore_index=True) if failures else pd.DataFrame(columns=['_row'])
+    # keep the sampler's order
+    failures = failures.set_index('_row').loc[sampled['_row'].to_numpy()].reset_index(drop=True)
+    successes = pd.concat(successes, ignore_index=True) if successes else pd.DataFrame()
+    return failures, successes
+
+
+async def _prepare_data_chunked(
+    executor: ProcessPoolExecutor,
+    config: Config,
+    models: Optional[List[str]],
+    ratio: float,
+    chunk_size: int,
+    cols_to_keep: Optional[List[str]],
+) -> List[Dict]:
+    """
+    Bounded-memory variant of `prepare_data`.
+
+    Datasets are streamed in chunks of `chunk_size` rows, in three passes: a pass over the scoring
+    columns for the thresholds and the failure count of every stratum, a pass that reservoir-samples
+    the failures, and a pass that materializes only the sampled failures and the successes on the same
+    examples. Peak memory therefore scales with the sample rather than the corpus.
+
+    Sampling takes exactly round(ratio * failures) of each stratum, like the in-memory path, so the
+    failure counts must be known before the sampling pass starts: a single-pass reservoir would need
+    them up front too (or give approximate sizes). Hence the counting in the first pass, which only
+    falls back to a separate counting pass when the threshold is off the 0.01 score grid or the scores
+    spread over too many grid buckets.
+    """
+    scans = await asyncio.gather(*[
+        _run_in_pool(executor, _scan_dataset_sync, config, dataset, models, chunk_size) for dataset in config.datasets
+    ])
+    scans = [scan for scan in scans if scan is not None]
+
+    # Default threshold for each dataset, from the running score aggregates
+    ds2threshold = {
+        scan["dataset"]: _default_threshold(scan["score_sum"], scan["score_count"])
+        for scan in scans if scan["score_count"]
+    }
+    for scan in scans:
+        scan["row_filter"] = _read_filter(config, scan["dataset"], models, ds2threshold)
+    # the sampler needs the stratum sizes up front (round(ratio * size) items each): counted by the scan,
+    # or in one more pass over the scoring columns when it couldn't
+    failure_counts = [_scan_failure_counts(scan, config, ds2threshold) for scan in scans]
+    recounted = iter(await asyncio.gather(*[
+        _run_in_pool(executor, _count_failures_sync, scan, config, models, ds2threshold, chunk_size)
+        for scan, counts in zip(scans, failure_counts) if counts is None
+    ]))
+    failure_counts = [counts if counts is not None else next(recounted) for counts in failure_counts]
+    num_failures = sum(sum(counts.values()) for counts in failure_counts)
+
+    samples = await asyncio.gather(*[
+        _run_in_pool(executor, _sample_dataset_sync, scan, config, models, ds2threshold, ratio, chunk_size, counts)
+        for scan, counts in zip(scans, failure_counts)
+    ])
+    collected = await asyncio.gather(*[
+        _run_in_pool(executor, _collect_rows_worker, scan, config, models, ds2threshold, chunk_size, sampled, cols_to_keep)
+        for scan, sampled in zip(scans, samples) if len(sampled)
+    ])
+    collected = [(_deserialize_frame(failures), _deserialize_frame(successes)) for failures, successes in collected]
+
+    failures = [df for df, _ in collected if len(df)]
+    successes = [df for _, df in collected if len(df)]
+    sampled_failures = pd.concat(failures, ignore_index=True).to_dict('records') if failures else []
+
+    print(f"Total Num. of Errors: {num_failures}, "
+          f"Sampled for Analysis: {len(sampled_failures)} "
+          f"(ratio: {ratio*100:.1f}%)")
+
+    return sampled_failures + (pd.concat(successes, ignore_index=True).to_dict('records') if successes else [])
 
 
 @cached("data_preparation", None)
@@ -57,41 +423,58 @@ async def prepare_data(
     config: Config,
     models: Optional[List[str]] = None,
     ratio: float = 0.1,
+    chunk_size: Optional[int] = None,
+    cols_to_keep: Optional[List[str]] = None,
 ) -> List[Dict]:
+    """
+    Load the datasets, flag the errors (score below the dataset's success threshold) and sample `ratio`
+    of the errors of each (model, dataset). Returns the sampled errors followed by the successes.
+
+    The successes differ between the modes: loading whole files returns the successes of every example,
+    while chunked mode (`chunk_size`) returns only the successes on the sampled examples, the only ones
+    used later (as correct references). The judge gets the same inputs either way, but the chunked output
+    (and the `Prepared N records` count) holds far fewer rows.
+    """
     print("Loading data...")
-    
-    tasks = [_load_dataset_async(config.data_path, dataset) for dataset in config.datasets]
-    dataset_results = await asyncio.gather(*tasks)
-    
-    # Flatten all records - let exceptions propagate
-    records = []
-    for dataset_records in dataset_results:
-        records.extend(dataset_records)
+
+    with _loader_pool(config) as executor:
+        if chunk_size:
+            return await _prepare_data_chunked(executor, config, models, ratio, chunk_size, cols_to_keep)
+
+        tasks = [_load_dataset_async(executor, config, dataset, models, cols_to_keep) for dataset in config.datasets]
+        dataset_results = [(df, score_stats) for df, score_stats in await asyncio.gather(*tasks) if len(df)]
 
     # Calculate the default threshold fro each dataset
-    if records:
-        df = pd.DataFrame(records)
-        thresholds_df = df.groupby("dataset")["score"].mean().reset_index()
-        thresholds_dicts = thresholds_df.to_dict(orient="records")
-        ds2threshold = {item["dataset"]: round(item["score"] * 0.7, 2) for item in thresholds_dicts}
-
-    # Process error flags and filtering in parallel
-    records = await asyncio.gather(*[_process_and_filter_record(record, config, models, ds2threshold) for record in records])
-    
-    # Filter out records marked for filtering
-    records = [r for r in records if not r.get('_filtered', False)]
-    
-    # Split into failures and successes
-    failures = [r for r in records if r['error']]
-    successes = [r for r in records if not r['error']]
-
-    if failures:
-        sampled_failures = _sample_failures(failures, ratio, config.seed)
-    else:
-        sampled_failures = []
+    ds2threshold = {
+        df["dataset"].iat[0]: _default_threshold(*score_stats)
+        for df, score_stats in dataset_results if score_stats[1]
+    }
+
+    # Flag errors and filter, one columnar pass per dataset
+    flagged = []
+    for df, _ in dataset_results:
+        df = _flag_errors(df, config, models, ds2threshold)
+        flagged.append(df[~df['_filtered'].to_numpy()])
+
+    # Feed each (model, dataset) stratum of failures to the reservoir sampler
+    strata = {}
+    for df in flagged:
+        failures = df[df['error'].to_numpy()]
+        strata.update({key: (failures, positions) for key, positions in failures.groupby(['model', 'dataset'], sort=False).indices.items()})
+    num_failures = sum(len(positions) for _, positions in strata.values())
+
+    sampler = StratifiedReservoirSampler(ratio, {key: len(positions) for key, (_, positions) in strata.items()}, config.seed)
+    for key, (_, positions) in strata.items():
+        sampler.add(key, positions)
+    sampled_failures = []
+    for key, positions in sampler.samples().items():
+        sampled_failures.extend(strata[key][0].iloc[positions].to_dict('records'))
+
+    successes = [df[~df['error'].to_numpy()] for df in flagged]
+    successes = pd.concat(successes, ignore_index=True).to_dict('records') if successes else []
 
-    print(f"Total Num. of Errors: {len(failures)}, "
+    print(f"Total Num. of Errors: {num_failures}, "
           f"Sampled for Analysis: {len(sampled_failures)} "
           f"(ratio: {ratio*100:.1f}%)")
 
-    return sampled_failures + successes
\ No newline at end of file
+    return sampled_failures + successes
@@ -9,6 +9,7 @@ from error_map.utils.taxonomy_tree import TaxonomyNode, TaxonomyTree
 from ..utils.cache import cached
 from ..core.config import Config
 from ..inference import InferenceClient
+from ..inference.metering import meter_scope
 import math
 import asyncio
 
@@ -121,7 +122,8 @@ async def _recurse_error_collection(
     print(f"in recurse, records: {len(records)}")
 
     parent_node_name = parent_node.name if depth > 0 and parent_node.name else None # avoid using the name of the root node or an empty string
-    populated = await _run_taxonomy_stages(records, config, exp_id, inference_client, parent_category_name=parent_node_name, rare_freq=rare_freq)
+    with meter_scope(depth=depth):
+        populated = await _run_taxonomy_stages(records, config, exp_id, inference_client, parent_category_name=parent_node_name, rare_freq=rare_freq)
     if not populated:
         return
 
@@ -5,27 +5,110 @@ from pathlib import Path
 import random
 import string
 import sys
-from typing import List, Dict
-from ..utils.cache import cached
+from typing import List, Dict, Optional, Tuple
+from ..utils.cache import cached, json_default, StageResult
 from ..core.config import Config
 from ..inference import InferenceClient
 import ast
+import hashlib
+import json
 from tqdm.asyncio import tqdm_asyncio
 
 
-async def analyze_record(record: Dict, inference_client: InferenceClient, success_outputs: Dict, use_correct_predictions: bool) -> Dict:
+JUDGE_FIELDS = ["prompt", "judge_model", "judge_response", "template_used", "inference_success", "judge_error", "full_response"]
+
+
+def _is_final(result: Dict) -> bool:
+    """Judgments that a re-run wouldn't change: successes and permanent failures (e.g. context length)"""
+    return bool(result["inference_success"]) or str(result.get("judge_error") or "").startswith("permanent")
+
+
+def _judge_input_hash(record: Dict, success_outputs: Dict, use_correct_predictions: bool) -> str:
+    """
+    Content hash of everything the judge gets for a failure: the template inputs and, when used,
+    the pool of correct outputs its reference is drawn from
+    """
+    judge_inputs = {
+        "input_text": record.get('input_text', ''),
+        "output_text": record.get('output_text', ''),
+        "correct_answer": record.get('correct_answer', ''),
+    }
+    if use_correct_predictions:
+        judge_inputs["correct_outputs"] = success_outputs.get((record['dataset'], record['example_id']), [])
+    serialized = json.dumps(judge_inputs, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _journal_key(record: Dict) -> Tuple[str, str, str]:
+    return (str(record['dataset']), str(record['example_id']), str(record['model']))
+
+
+def _read_journal(journal_path: Optional[Path]) -> Dict[Tuple[str, str, str], Dict]:
+    """Judge results checkpointed by an interrupted run, by (dataset, example_id, model)"""
+    judged = {}
+    if journal_path is None or not journal_path.exists():
+        return judged
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:  # last line of a run killed mid-write
+                continue
+            judged[tuple(entry["key"])] = entry["result"]
+    return judged
+
+
+def _journal_entry(record: Dict, result: Dict) -> Dict:
+    return {"key": _journal_key(record), "result": {field: result[field] for field in JUDGE_FIELDS}}
+
+
+def _journal_write(journal, entry: Dict) -> None:
+    """Append a judge result to the journal, one JSON line per result"""
+    journal.write(json.dumps(entry, default=json_default, ensure_ascii=False) + "\n")
+
+
+async def _analyze_and_journal(record: Dict, inference_client: InferenceClient, success_outputs: Dict,
+                               use_correct_predictions: bool, journal) -> Dict:
+    result = await analyze_record(record, inference_client, success_outputs, use_correct_predictions)
+    # calls that failed after all retries aren't checkpointed, they are retried on resume
+    if journal is not None and _is_final(result):
+        _journal_write(journal, _journal_entry(record, result))
+        journal.flush()
+    return result
+
+
+def _template_vars(record: Dict, success_outputs: Dict, use_correct_predictions: bool) -> Dict:
     # Add correct outputs
     key = (record['dataset'], record['example_id'])
     record['correct_output_list'] = success_outputs.get(key, [])
 
-    # Analyze with inference
     template_vars = {
         "input_text": record.get('input_text', ''),
         "output_text": record.get('output_text', ''),
         "correct_answer": record.get('correct_answer', ''),
     }
     if use_correct_predictions:
-        template_vars['correct_outputs'] = random.sample(record['correct_output_list'], 1) if record['correct_output_list'] else []
+        # seeded by the record, so that re-runs render the same prompt (and hit the response cache)
+        rng = random.Random("|".join(_journal_key(record)))
+        template_vars['correct_outputs'] = rng.sample(record['correct_output_list'], 1) if record['correct_output_list'] else []
+    return template_vars
+
+
+def _judged_record(record: Dict, inference_result: Dict) -> Dict:
+    return {
+        **record,
+        "prompt": inference_result.get("prompt", ""),
+        "judge_model": inference_result.get("model", ""),
+        "judge_response": inference_result.get("content", ""),
+        "template_used": inference_result.get("template", ""),
+        "inference_success": inference_result.get("success", False),
+        "judge_error": f"{inference_result['error_type']}: {inference_result.get('error', '')}" if inference_result.get("error_type") else "",
+        "full_response": inference_result.get("full_response", "")
+    }
+
+
+async def analyze_record(record: Dict, inference_client: InferenceClient, success_outputs: Dict, use_correct_predictions: bool) -> Dict:
+    template_vars = _template_vars(record, success_outputs, use_correct_predictions)
 
     result = {
         **record,
@@ -34,31 +117,44 @@ async def analyze_record(record: Dict, inference_client: InferenceClient, succes
         "judge_response": "",
         "template_used": "",
         "inference_success": False,
+        "judge_error": "",
         "full_response": ""
     }
 
     try:
+        # Analyze with inference
         inference_result = await inference_client.infer(
             "single_error_analysis.j2",
             template_vars,
             schema_name="single_error_schema.json"
         )
-
-        result.update({
-            "prompt": inference_result.get("prompt", ""),
-            "judge_model": inference_result.get("model", ""),
-            "judge_response": inference_result.get("content", ""),
-            "template_used": inference_result.get("template", ""),
-            "inference_success": inference_result.get("success", False),
-            "full_response": inference_result.get("full_response", "")
-        })
+        result = _judged_record(record, inference_result)
 
     except Exception as e:
         result["full_response"] = str(e)
+        result["judge_error"] = f"permanent: {e}"
 
     return result
 
 
+async def _analyze_batch(records: List[Dict], inference_client: InferenceClient, success_outputs: Dict,
+                         use_correct_predictions: bool, journal) -> List[Dict]:
+    """Judge the records through the client's batch executor, journaling the final results"""
+    template_vars_list = [_template_vars(record, success_outputs, use_correct_predictions) for record in records]
+    inference_results = await inference_client.infer_batch(
+        "single_error_analysis.j2",
+        template_vars_list,
+        schema_name="single_error_schema.json"
+    )
+    results = [_judged_record(record, inference_result) for record, inference_result in zip(records, inference_results)]
+    if journal is not None:
+        for record, result in zip(records, results):
+            if _is_final(result):
+                _journal_write(journal, _journal_entry(record, result))
+        journal.flush()
+    return results
+
+
 async def _process_record_for_filtering(record: Dict) -> Dict:
     is_error = record.get('error', False)
     if is_error:
@@ -95,7 +191,14 @@ async def analyze_single_errors(
     exp_id: str,
     inference_client: InferenceClient,
     use_correct_predictions: bool,
+    deduplicate: bool = True,
+    journal_path: Optional[Path] = None,
 ) -> List[Dict]:
+    """
+    Judge every failure. When `journal_path` is given, each judgment is appended to it as it completes,
+    and judgments already in it (from an interrupted run) are reused instead of calling the judge again.
+    With a client in batch mode (`inference_client.batch_executor`), the judge calls are sent as one batch job.
+    """
     
     # Filter error records and build success lookup in parallel
     error_records, success_outputs = await _filter_and_build_lookup(records)
@@ -104,7 +207,72 @@ async def analyze_single_errors(
         print("No error records found")
         return []
 
-    print(f"Analyzing {len(error_records)} error records in parallel...")
+    # Group failures with identical judge inputs, each group is sent to the judge once
+    hashes = [_judge_input_hash(record, success_outputs, use_correct_predictions) for record in error_records]
+    key2records = {}
+    for ind, input_hash in enumerate(hashes):
+        key2records.setdefault(input_hash if deduplicate else ind, []).append(error_records[ind])
+    unique_records = [group[0] for group in key2records.values()]
+
+    num_duplicates = len(error_records) - len(unique_records)
+    if deduplicate:
+        print(f"🔁 Deduplicated {num_duplicates} of {len(error_records)} error records with identical judge inputs "
+              f"({num_duplicates / len(error_records) * 100:.1f}% of judge calls saved)")
+
+    # Resume from the judgments of an interrupted run
+    judged = _read_journal(journal_path)
+    key2result = {}
+    for key, group in key2records.items():
+        journal_result = judged.get(_journal_key(group[0]))
+        if journal_result is not None:
+            record = group[0]
+            key2result[key] = {
+                **record,
+                "correct_output_list": success_outputs.get((record['dataset'], record['example_id']), []),
+                **journal_result,
+            }
+    if judged:
+        print(f"♻️ Resuming from journal: {len(key2result)} of {len(key2records)} error records already judged")
+
+    pending = [key for key in key2records if key not in key2result]
+    print(f"Analyzing {len(pending)} error records in parallel...")
+
+    # Analyze all remaining unique errors in parallel
+    journal = None
+    if journal_path is not None:
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        journal = open(journal_path, "a", encoding="utf-8")
+        if journal.tell() and not journal_path.read_bytes().endswith(b"\n"):
+            # after the truncated last line of a killed run, or the next entry would be lost with it
+            journal.write("\n")
+    try:
+        if getattr(inference_client, "batch_executor", None) is not None:
+            analyzed = await _analyze_batch([key2records[key][0] for key in pending], inference_client, success_outputs,
+                                            use_correct_predictions, journal)
+        else:
+            analyzed = await tqdm_asyncio.gather(*[
+                _analyze_and_journal(key2records[key][0], inference_client, success_outputs, use_correct_predictions, journal)
+                for key in pending
+            ])
+    finally:
+        if journal is not None:
+            journal.close()
+    key2result.update(zip(pending, analyzed))
+
+    # Fan the judgment out to every duplicate, keeping the original order
+    results = []
+    for ind, record in enumerate(error_records):
+        key = hashes[ind] if deduplicate else ind
+        result = key2result[key]
+        if record is not key2records[key][0]:
+            result = {
+                **record,
+                "correct_output_list": success_outputs.get((record['dataset'], record['example_id']), []),
+                **{field: result[field] for field in JUDGE_FIELDS},
+            }
+        results.append({**result, "judge_input_hash": hashes[ind]})
 
-    # Analyze all errors in parallel
-    return await tqdm_asyncio.gather(*[analyze_record(record, inference_client, success_outputs, use_correct_predictions) for record in error_records])
+    num_unfinished = sum(not _is_final(result) for result in key2result.values())
+    if num_unfinished:
+        print(f"⚠️ {num_unfinished} judge calls still failed after retrying")
+    return StageResult(results, complete=not num_unfinished)
\ No newline at end of file
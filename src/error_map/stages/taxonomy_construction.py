@@ -45,8 +45,9 @@ async def construct_taxonomy(
     taxonomy_params = config.taxonomy_params if taxonomy_params is None else taxonomy_params
 
     # shufle before taxonomy construction, to make the batches more varied
-    random.seed(config.seed)
-    random.shuffle(error_records)
+    # (own generator: the global one is shared by concurrently running experiments)
+    rng = random.Random(config.seed)
+    rng.shuffle(error_records)
 
     description_results = await asyncio.gather(*[_extract_description(record, field) for record in error_records])
     
@@ -69,7 +70,7 @@ async def construct_taxonomy(
 
     for i in tqdm(range(range_from, range_to, range_jump)):
         if repeat_samples:
-            curr_batch = random.sample(descriptions, min(len(descriptions), batch_size))
+            curr_batch = rng.sample(descriptions, min(len(descriptions), batch_size))
         else:
             curr_batch = descriptions[i:i + batch_size]
         template_vars = {
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 from pathlib import Path
@@ -5,8 +6,7 @@ from typing import Any
 
 class JSONRenderer:
     def __init__(self, schema_dir: Path = None):
-        if schema_dir is None:
-            self.schema_dir = Path(__file__).parent / "response_schemas"
+        self.schema_dir = Path(schema_dir) if schema_dir is not None else Path(__file__).parent / "response_schemas"
 
     def render(self, file_name: str) -> Any:
         """Render JSON data."""
@@ -16,3 +16,8 @@ class JSONRenderer:
                 return self.data
         except Exception as e:
             print(f"Error loading JSON: {e}")
+
+    def fingerprint(self, file_name: str) -> str:
+        """Content hash of a schema file"""
+        with open(os.path.join(self.schema_dir, file_name), 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
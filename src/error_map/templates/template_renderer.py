@@ -1,5 +1,6 @@
+import hashlib
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from jinja2 import Environment, FileSystemLoader
 
 
@@ -9,6 +10,7 @@ class TemplateRenderer:
     def __init__(self, template_dir: Path = None):
         if template_dir is None:
             template_dir = Path(__file__).parent / "prompts"
+        self.template_dir = Path(template_dir)
         
         self.template_env = Environment(
             loader=FileSystemLoader(template_dir),
@@ -20,6 +22,20 @@ class TemplateRenderer:
         """Render a Jinja2 template with given variables"""
         template = self.template_env.get_template(template_name)
         return template.render(**kwargs)
+
+    def render_parts(self, template_name: str, **kwargs) -> Tuple[str, str]:
+        """
+        Render a template as its stable prefix (the `prefix` block: instructions and context shared by many calls)
+        and the rest; prefix + rest is the rendered template. Templates without a `prefix` block have an empty prefix.
+        """
+        template = self.template_env.get_template(template_name)
+        prompt = template.render(**kwargs)
+        if "prefix" not in template.blocks:
+            return "", prompt
+        prefix = "".join(template.blocks["prefix"](template.new_context(kwargs)))
+        if not prompt.startswith(prefix):
+            return "", prompt
+        return prefix, prompt[len(prefix):]
     
     def list_templates(self) -> list[str]:
         """List all available templates"""
@@ -31,4 +47,9 @@ class TemplateRenderer:
             self.template_env.get_template(template_name)
             return True
         except:
-            return False
\ No newline at end of file
+            return False
+
+    def fingerprint(self, template_name: str) -> str:
+        """Content hash of a template's source, to invalidate cached results when a prompt changes"""
+        source, _, _ = self.template_env.loader.get_source(self.template_env, template_name)
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
@@ -1,5 +1,8 @@
 from .cache import cached
+from .cache_store import CacheStore
+from .response_cache import ResponseCache, SQLiteBackend
 from .constants import TaxonomyParams, dataset2params, REQUIRED_DATA_COLUMNS
+from .sampling import StratifiedReservoirSampler
 from .taxonomy_tree import TaxonomyNode, TaxonomyTree
 
-__all__ = ["TaxonomyTree", "TaxonomyNode", "TaxonomyParams", "dataset2params", "cached", "REQUIRED_DATA_COLUMNS"]
\ No newline at end of file
+__all__ = ["TaxonomyTree", "TaxonomyNode", "TaxonomyParams", "dataset2params", "cached", "CacheStore", "ResponseCache", "SQLiteBackend", "REQUIRED_DATA_COLUMNS", "StratifiedReservoirSampler"]
\ No newline at end of file
@@ -1,11 +1,157 @@
-
 import functools
+import hashlib
+import inspect
+import json
+import math
+import os
+import shutil
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
-from typing import List, Dict, Callable, Optional
+from typing import Any, List, Dict, Callable, Optional
+from .cache_store import CacheStore, JOURNAL_SUFFIX
+
+# Bump when the stage outputs change for identical inputs, to invalidate existing caches
+CACHE_VERSION = 1
+CACHE_COMPRESSION = "zstd"
+# Parquet schema metadata key listing the columns stored as JSON text (nested or mixed-type values)
+JSON_COLUMNS_KEY = b"error_map.json_columns"
+
+# Record fields that don't take part in fingerprints: raw provider responses carry per-call ids and timestamps
+VOLATILE_FIELDS = {"full_response"}
+
+
+class StageResult(list):
+    """
+    Records returned by a cached stage, tagged with the cache key they are stored under.
+    Stages return `complete=False` results when some records should be recomputed by a re-run: they aren't cached.
+    """
+
+    def __init__(self, records: List[Dict], cache_key: Optional[str] = None, complete: bool = True):
+        super().__init__(records)
+        self.cache_key = cache_key
+        self.complete = complete
+
+
+def _update_fingerprint(digest: "hashlib._Hash", value: Any) -> None:
+    if isinstance(value, StageResult) and value.cache_key:
+        # outputs of an upstream stage are identified by its cache key (no need to hash their content)
+        digest.update(f"stage:{value.cache_key};".encode())
+    elif hasattr(value, "cache_fingerprint"):
+        _update_fingerprint(digest, value.cache_fingerprint())
+    elif isinstance(value, dict):
+        digest.update(b"{")
+        for key in sorted(value, key=str):
+            if key in VOLATILE_FIELDS:
+                continue
+            _update_fingerprint(digest, key)
+            _update_fingerprint(digest, value[key])
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value
+        digest.update(b"[")
+        for item in items:
+            _update_fingerprint(digest, item)
+        digest.update(b"]")
+    elif isinstance(value, float) and math.isnan(value):
+        digest.update(b"nan;")
+    elif isinstance(value, (str, int, float, bool, type(None))):
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+    elif isinstance(value, Path):
+        digest.update(f"path:{value};".encode())
+    elif hasattr(value, "item") and not hasattr(value, "__len__"):  # numpy scalars
+        _update_fingerprint(digest, value.item())
+    else:
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+def fingerprint(value: Any) -> str:
+    """Stable content hash of (nested) stage inputs"""
+    digest = hashlib.sha256()
+    _update_fingerprint(digest, value)
+    return digest.hexdigest()
+
+
+def json_default(value: Any) -> Any:
+    """`json.dumps` fallback for values found in stage records (e.g. litellm responses)"""
+    if hasattr(value, "model_dump"):  # litellm / pydantic responses
+        return value.model_dump()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _needs_json(values: pd.Series) -> bool:
+    """Object columns are stored natively only when all their values are strings (or all bools)"""
+    kinds = {type(value) for value in values if not _is_missing(value)}
+    return not (kinds <= {str} or kinds <= {bool})
+
+
+def write_frame(df: pd.DataFrame, path: Path) -> None:
+    """Write records to a compressed Parquet file, keeping dtypes; nested values are stored as JSON text"""
+    df = df.copy()
+    json_columns = [col for col in df.columns if df[col].dtype == object and _needs_json(df[col])]
+    for col in json_columns:
+        df[col] = [None if _is_missing(value) else json.dumps(value, default=json_default) for value in df[col]]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), JSON_COLUMNS_KEY: json.dumps(json_columns).encode()})
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp_path, compression=CACHE_COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def read_frame(path: Path) -> pd.DataFrame:
+    """Read records written by `write_frame` (memory-mapped)"""
+    table = pq.read_table(path, memory_map=True)
+    json_columns = json.loads((table.schema.metadata or {}).get(JSON_COLUMNS_KEY, b"[]"))
+    df = table.to_pandas()
+    for col in json_columns:
+        # missing values come back as None or NaN, depending on the pandas string dtype
+        df[col] = [None if _is_missing(value) else json.loads(value) for value in df[col]]
+    return df
 
 
-def cached(stage_name: str, output_path: Optional[Path]):
+def _copy(src: Path, dst: Path) -> None:
+    # copies rather than hard links: stages rewrite their experiment files in place
+    if dst.exists() and os.path.samefile(src, dst):
+        return
+    shutil.copyfile(src, dst)
+
+
+def _normalize_frame(df: pd.DataFrame, stage_name: str) -> pd.DataFrame:
+    # Fix data types for exact compatibility
+    if 'score' in df.columns:
+        df['score'] = pd.to_numeric(df['score'], errors='coerce')
+
+    # Ensure exact column order for data_preparation
+    if stage_name == "data_preparation":
+        original_columns = ['index', 'example_id', 'potential_answers', 'references', 'model',
+                           'output_text', 'score', 'input_text', 'correct_answer', 'dataset',
+                           'dataset_category', 'prediction', 'error']
+        available_columns = [col for col in original_columns if col in df.columns]
+        extra_columns = [col for col in df.columns if col not in original_columns]
+        df = df[available_columns + extra_columns]
+    return df
+
+
+def cached(stage_name: str, output_path: Optional[Path], export_csv: bool = True, store: Optional[CacheStore] = None):
+    """
+    Cache a stage's records under a key derived from a fingerprint of its inputs (everything but `exp_id`).
+
+    Results are stored as compressed Parquet in the stage namespace of `store` (default:
+    `CacheStore.default(output_path)`, i.e. `{output_path}/cache/stages/`) and reused by any experiment
+    whose stage inputs are unchanged, while stages whose inputs did change are recomputed. The experiment's
+    own `exp_name={stage}__exp_id={exp_id}.*` output files (`.parquet`, the `.csv` export when `export_csv`,
+    and files the stage writes itself) are published from the cache entry.
+
+    Stages that accept a `journal_path` argument get the path of a checkpoint journal for the entry, which
+    is removed once the results are cached. The store is pruned to its size/TTL limits after each write.
+    """
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         async def wrapper(*args, **kwargs) -> List[Dict]:
@@ -13,58 +159,73 @@ def cached(stage_name: str, output_path: Optional[Path]):
             exp_id = kwargs.get('exp_id')
             if not exp_id:
                 raise ValueError(f"Function {func.__name__} must have 'exp_id' parameter")
-            
-            # Generate cache filename exactly like original
-            cache_kwargs = {k: v for k, v in kwargs.items() if k != 'exp_id'}
-            filename_parts = [f"exp_name={stage_name}", f"exp_id={exp_id}"]
-            
-            # for key, value in cache_kwargs.items():
-            #     if value is not None and key in ['models', 'ratio', 'seed', 'field']:
-            #         if isinstance(value, list):
-            #             value = '_'.join(map(str, value))
-            #         filename_parts.append(f"{key}={value}")
-            
-            filename = "__".join(filename_parts) + ".csv"
             if output_path is None:
                 raise ValueError("output_path cannot be None")
-            cache_path = output_path / filename
-            
+
+            cache_kwargs = {k: v for k, v in kwargs.items() if k != 'exp_id'}
+            cache_key = fingerprint({"stage": stage_name, "version": CACHE_VERSION, "args": args, "kwargs": cache_kwargs})[:16]
+
+            cache_store = store or CacheStore.default(output_path)
+            cache_dir = cache_store.stages_dir
+            cache_stem = f"exp_name={stage_name}__key={cache_key}"
+            cache_path = cache_dir / f"{cache_stem}.parquet"
+            exp_stem = "__".join([f"exp_name={stage_name}", f"exp_id={exp_id}"])
+            # Stages that checkpoint partial results get a journal tied to the cache entry
+            journal_path = cache_dir / f"{cache_stem}{JOURNAL_SUFFIX}.jsonl"
+
             # Try to load from cache
             if cache_path.exists():
                 try:
-                    df = pd.read_csv(cache_path)
-                    print(f"📁 Using cached {stage_name} results ({len(df)} records)")
-                    return df.to_dict('records')
+                    df = read_frame(cache_path)
+                    print(f"📁 Using cached {stage_name} results ({len(df)} records, key={cache_key})")
+                    cache_store.touch(cache_stem)
+                    cache_store.record("hits", cache_path.stat().st_size)
+                    for path in cache_dir.glob(f"{cache_stem}.*"):
+                        _copy(path, output_path / f"{exp_stem}{path.suffix}")
+                    if export_csv and not (cache_dir / f"{cache_stem}.csv").exists():
+                        df.to_csv(output_path / f"{exp_stem}.csv", index=False)
+                    return StageResult(df.to_dict('records'), cache_key)
                 except Exception as e:
                     print(f"⚠️ Failed to load cache, regenerating: {e}")
-            
+
             # Execute function
             print(f"🔄 Running {stage_name}...")
+            cache_store.record("misses")
+            if "journal_path" in inspect.signature(func).parameters:
+                kwargs = {**kwargs, "journal_path": journal_path}
             results = await func(*args, **kwargs)
-            
-            # Save to cache with exact backward compatible format
+
+            if not getattr(results, "complete", True):
+                print(f"⚠️ {stage_name} results are incomplete and not cached, a re-run completes them")
+                try:
+                    df = _normalize_frame(pd.DataFrame(results), stage_name)
+                    write_frame(df, output_path / f"{exp_stem}.parquet")
+                    if export_csv:
+                        df.to_csv(output_path / f"{exp_stem}.csv", index=False)
+                except Exception as e:
+                    print(f"⚠️ Failed to save results: {e}")
+                return StageResult(results, None, complete=False)
+
+            # Save to cache, and export with the backward compatible CSV format
             try:
-                df = pd.DataFrame(results)
-                
-                # Fix data types for exact compatibility 
-                if 'score' in df.columns:
-                    df['score'] = pd.to_numeric(df['score'], errors='coerce')
-                
-                # Ensure exact column order for data_preparation
-                if stage_name == "data_preparation":
-                    original_columns = ['index', 'example_id', 'potential_answers', 'references', 'model', 
-                                       'output_text', 'score', 'input_text', 'correct_answer', 'dataset', 
-                                       'dataset_category', 'prediction', 'error']
-                    available_columns = [col for col in original_columns if col in df.columns]
-                    extra_columns = [col for col in df.columns if col not in original_columns]
-                    df = df[available_columns + extra_columns]
-                
-                df.to_csv(cache_path, index=False)
-                print(f"💾 Cached {stage_name} results ({len(results)} records)")
+                df = _normalize_frame(pd.DataFrame(results), stage_name)
+                write_frame(df, cache_path)
+                if export_csv:
+                    df.to_csv(output_path / f"{exp_stem}.csv", index=False)
+
+                # Publish the experiment's output files, and keep them (e.g. the csv export or a json) with the entry
+                _copy(cache_path, output_path / f"{exp_stem}.parquet")
+                for path in output_path.glob(f"{exp_stem}.*"):
+                    if path.suffix != ".parquet" and (export_csv or path.suffix != ".csv"):
+                        _copy(path, cache_dir / f"{cache_stem}{path.suffix}")
+                journal_path.unlink(missing_ok=True)
+                cache_store.record("writes", sum(path.stat().st_size for path in cache_dir.glob(f"{cache_stem}.*")))
+                print(f"💾 Cached {stage_name} results ({len(results)} records, key={cache_key})")
+                cache_store.prune()
             except Exception as e:
                 print(f"⚠️ Failed to cache results: {e}")
-            
-            return results
-        
+
+            return StageResult(results, cache_key)
+
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from .response_cache import DEFAULT_MAX_SIZE, ResponseCache, SQLiteBackend
+
+CACHE_DIR_ENV = "ERROR_MAP_CACHE_DIR"
+STAGES_DIR_NAME = "stages"
+RESPONSES_DIR_NAME = "responses"
+STATS_FILE_NAME = "stats.json"
+RESPONSES_DB_NAME = "responses.sqlite3"
+JOURNAL_SUFFIX = "__journal"
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+_TIME_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_size(size: Union[str, int, None]) -> Optional[int]:
+    """Bytes of a size such as 500MB or 20GB (plain numbers are bytes)"""
+    if size is None or isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B?)\s*", size.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+    unit = match.group(2) if match.group(2).endswith("B") or not match.group(2) else match.group(2) + "B"
+    return int(float(match.group(1)) * _SIZE_UNITS[unit])
+
+
+def parse_duration(duration: Union[str, float, None]) -> Optional[float]:
+    """Seconds of a duration such as 90m, 12h or 7d (plain numbers are seconds)"""
+    if duration is None or isinstance(duration, (int, float)):
+        return duration
+    match = re.fullmatch(r"\s*([\d.]+)\s*([smhdw]?)\s*", duration.lower())
+    if not match:
+        raise ValueError(f"Invalid duration: {duration}")
+    return float(match.group(1)) * _TIME_UNITS[match.group(2)]
+
+
+def format_size(num_bytes: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}TB"
+
+
+class CacheStore:
+    """
+    Managed location of ErrorMap's caches: stage results (`stages/`) and judge responses (`responses/`).
+
+    Both namespaces are bounded by `max_size` bytes each and evict the least recently used entries first.
+    Stage entries (all files of one cached stage result) not used for `ttl` seconds are expired; judge
+    responses expire `ttl` seconds after they were stored. Hit/miss/byte counters are kept in `stats.json`
+    for stage entries, and per template in the response database for responses.
+    """
+
+    def __init__(self, root: Union[str, Path], max_size: Union[str, int, None] = None, ttl: Union[str, float, None] = None):
+        self.root = Path(root)
+        self.max_size = parse_size(max_size)
+        self.ttl = parse_duration(ttl)
+        self.stages_dir = self.root / STAGES_DIR_NAME
+        self.responses_dir = self.root / RESPONSES_DIR_NAME
+        self.stages_dir.mkdir(parents=True, exist_ok=True)
+        self.responses_dir.mkdir(parents=True, exist_ok=True)
+        self._response_cache = None
+
+    @classmethod
+    def default(cls, output_dir: Optional[Path] = None, **kwargs) -> "CacheStore":
+        """Store in $ERROR_MAP_CACHE_DIR if set, else in `{output_dir}/cache`"""
+        root = os.getenv(CACHE_DIR_ENV) or Path(output_dir or "output") / "cache"
+        return cls(root, **kwargs)
+
+    # ---- stage entries ----
+
+    def stage_entries(self) -> List[Dict]:
+        """Cached stage results (journals of stages in progress excluded), least recently used first"""
+        entries = {}
+        for path in self.stages_dir.iterdir():
+            stem = path.name.split(".", 1)[0]
+            if not path.is_file() or stem.endswith(JOURNAL_SUFFIX):
+                continue
+            stat = path.stat()
+            entry = entries.setdefault(stem, {"stem": stem, "files": [], "bytes": 0, "last_used": 0.0})
+            entry["files"].append(path)
+            entry["bytes"] += stat.st_size
+            entry["last_used"] = max(entry["last_used"], stat.st_mtime)
+        return sorted(entries.values(), key=lambda entry: entry["last_used"])
+
+    def touch(self, stem: str) -> None:
+        """Mark a stage entry as used"""
+        now = time.time()
+        for path in self.stages_dir.glob(f"{stem}.*"):
+            os.utime(path, (now, now))
+
+    def record(self, event: str, num_bytes: int = 0) -> None:
+        """Count a stage cache hit/miss/write/eviction"""
+        stats = self.stage_stats()
+        stats[event] = stats.get(event, 0) + 1
+        if num_bytes:
+            stats[f"{event}_bytes"] = stats.get(f"{event}_bytes", 0) + num_bytes
+        try:
+            tmp_path = self.root / f"{STATS_FILE_NAME}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(stats, f, indent=2)
+            os.replace(tmp_path, self.root / STATS_FILE_NAME)
+        except OSError as e:
+            print(f"⚠️ Failed to update cache stats: {e}")
+
+    def stage_stats(self) -> Dict:
+        try:
+            with open(self.root / STATS_FILE_NAME) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    # ---- judge responses ----
+
+    def response_cache(self) -> ResponseCache:
+        """Judge-response cache in this store (SQLite, 1GB unless `max_size` is set)"""
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(self._response_backend())
+        return self._response_cache
+
+    def _response_backend(self) -> SQLiteBackend:
+        if self._response_cache is not None:
+            return self._response_cache.backend
+        max_size = self.max_size if self.max_size is not None else DEFAULT_MAX_SIZE
+        return SQLiteBackend(self.responses_dir / RESPONSES_DB_NAME, max_size=max_size, ttl=self.ttl)
+
+    # ---- maintenance ----
+
+    def prune(self, max_size: Union[str, int, None] = None, ttl: Union[str, float, None] = None, clear: bool = False) -> Dict:
+        """Evict expired entries, then least recently used ones until each namespace fits `max_size`"""
+        max_size = parse_size(max_size) if max_size is not None else self.max_size
+        ttl = parse_duration(ttl) if ttl is not None else self.ttl
+
+        entries = self.stage_entries()
+        total = sum(entry["bytes"] for entry in entries)
+        evicted, evicted_bytes = 0, 0
+        for entry in entries:
+            expired = ttl is not None and time.time() - entry["last_used"] > ttl
+            if not (clear or expired or (max_size is not None and total > max_size)):
+                continue
+            for path in entry["files"]:
+                path.unlink(missing_ok=True)
+            total -= entry["bytes"]
+            evicted += 1
+            evicted_bytes += entry["bytes"]
+            self.record("evictions", entry["bytes"])
+
+        backend = self._response_backend()
+        if clear:
+            responses_evicted = backend.clear()
+        else:
+            responses_evicted = backend.expire(ttl) + backend.cull(max_size)
+        return {
+            "stage_entries_evicted": evicted,
+            "stage_bytes_evicted": evicted_bytes,
+            "responses_evicted": responses_evicted,
+        }
+
+    def warm(self, source: Union[str, Path, "CacheStore"]) -> Dict:
+        """Copy the entries of another store (e.g. on shared storage) that this one doesn't have"""
+        source = source if isinstance(source, CacheStore) else CacheStore(source)
+        copied_entries = 0
+        for entry in source.stage_entries():
+            if any((self.stages_dir / path.name).exists() for path in entry["files"]):
+                continue
+            for path in entry["files"]:
+                shutil.copy2(path, self.stages_dir / path.name)
+            copied_entries += 1
+
+        copied_responses = self._response_backend().merge(source._response_backend())
+        return {"stage_entries_copied": copied_entries, "responses_copied": copied_responses}
+
+    def summary(self) -> Dict:
+        entries = self.stage_entries()
+        backend = self._response_backend()
+        if self._response_cache is not None:
+            self._response_cache.flush()
+        template_stats = backend.stats()
+        return {
+            "root": str(self.root),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "stages": {
+                "entries": len(entries),
+                "bytes": sum(entry["bytes"] for entry in entries),
+                **self.stage_stats(),
+            },
+            "responses": {
+                "entries": len(backend),
+                "bytes": backend.volume(),
+                "hits": sum(stats["hits"] for stats in template_stats.values()),
+                "misses": sum(stats["misses"] for stats in template_stats.values()),
+                "templates": template_stats,
+            },
+        }
@@ -104,3 +104,16 @@ dataset2params: Dict[str, Any] = {
 }
 
 REQUIRED_DATA_COLUMNS = ["example_id", "model", "input_text", "output_text", "score"]
+OPTIONAL_DATA_COLUMNS = ["correct_answer"]
+
+# Supported dataset file extensions (in lookup order) and their reader format
+DATA_FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "ipc",
+    ".feather": "ipc",
+    ".ipc": "ipc",
+}
+
+# Columns read by the first pass of chunked (bounded-memory) data preparation
+LIGHT_DATA_COLUMNS = ["example_id", "model", "score"]
@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+DEFAULT_MAX_SIZE = 1024 ** 3  # 1GB
+STATS_FLUSH_EVERY = 256
+# Beyond max_size, evict down to this fraction of it, so that eviction runs once per many writes
+CULL_LOW_WATER = 0.9
+# Counters and last-used times are best-effort: give up after this many seconds on a locked database, retry at the next flush
+STATS_BUSY_TIMEOUT = 0.1
+
+# Call parameters that don't change the judge's response
+UNKEYED_PARAMS = {"api_key", "api_base", "api_version", "extra_headers", "timeout", "num_retries", "messages", "model", "response_format"}
+
+
+def normalize_prompt(text: str) -> str:
+    """Unicode NFC, \\n line endings, no trailing whitespace: prompts differing only in these share a key"""
+    text = unicodedata.normalize("NFC", str(text)).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def response_cache_key(model: str, messages, response_format: Any = None, params: Optional[Dict] = None, namespace: str = "") -> str:
+    """
+    Key of a judge response: the rendered (normalized) prompt, the model, the response schema and the call
+    parameters that change the response (`max_tokens`, `temperature`, ...), in the `namespace` (e.g. the inference type)
+    """
+    payload = {
+        "namespace": namespace,
+        "model": str(model).strip().lower(),
+        "messages": [{"role": message.get("role", "user"), "content": normalize_prompt(message.get("content", ""))} for message in messages],
+        "response_format": response_format,
+        "params": {k: v for k, v in (params or {}).items() if k not in UNKEYED_PARAMS and v is not None},
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SQLiteBackend:
+    """
+    Judge responses in a SQLite database in WAL mode, shared by concurrent readers and writers (processes included).
+    Lookups go through their own connection, so they never wait for this process' writes (WAL readers
+    don't block on writers).
+
+    Responses expire `ttl` seconds after they were stored, and beyond `max_size` bytes the least recently
+    used ones are evicted down to `CULL_LOW_WATER` of it. Per-template hit/miss/write counters are kept in
+    the database too.
+    """
+
+    def __init__(self, path: Union[str, Path], max_size: Optional[int] = DEFAULT_MAX_SIZE, ttl: Optional[float] = None):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, template TEXT, value TEXT NOT NULL, size INTEGER NOT NULL,
+                created REAL NOT NULL, expires REAL, last_used REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE TABLE IF NOT EXISTS template_stats (
+                template TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0,
+                writes INTEGER NOT NULL DEFAULT 0);
+        """)
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._volume = None
+
+    def _execute(self, sql: str, params: Iterable = ()):
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._read_lock:
+            rows = self._reader.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchall()
+        if not rows or (rows[0][1] is not None and rows[0][1] < time.time()):
+            return None
+        return json.loads(rows[0][0])
+
+    def set(self, key: str, value: Dict, template: Optional[str] = None) -> None:
+        encoded = json.dumps(value, default=str)
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, template, value, size, created, expires, last_used) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)", (key, template, encoded, len(encoded), now, expires, now))
+            if self.max_size is None:
+                return
+            if self._volume is None:
+                self._volume = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self._volume += len(encoded)
+            if self._volume > self.max_size:
+                self._cull(int(self.max_size * CULL_LOW_WATER))
+
+    def _short_timeout_executemany(self, sql: str, params: list) -> None:
+        # neither wait long for a write of this process (e.g. an eviction) nor for another process' lock
+        if not self._lock.acquire(timeout=STATS_BUSY_TIMEOUT):
+            raise sqlite3.OperationalError("database is locked")
+        try:
+            self._conn.execute(f"PRAGMA busy_timeout={int(STATS_BUSY_TIMEOUT * 1000)}")
+            try:
+                self._conn.executemany(sql, params)
+            finally:
+                self._conn.execute("PRAGMA busy_timeout=30000")
+        finally:
+            self._lock.release()
+
+    def touch(self, keys: Iterable[str]) -> None:
+        """Mark responses as used (for the LRU eviction)"""
+        now = time.time()
+        self._short_timeout_executemany("UPDATE responses SET last_used = ? WHERE key = ?", [(now, key) for key in keys])
+
+    def add_stats(self, template_stats: Dict[str, Counter]) -> None:
+        self._short_timeout_executemany(
+            "INSERT INTO template_stats (template, hits, misses, writes) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (template) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses, "
+            "writes = writes + excluded.writes",
+            [(template, stats["hits"], stats["misses"], stats["writes"]) for template, stats in template_stats.items()])
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss/write counters per template, over all runs"""
+        rows = self._execute("SELECT template, hits, misses, writes FROM template_stats ORDER BY template")
+        return {template: {"hits": hits, "misses": misses, "writes": writes} for template, hits, misses, writes in rows}
+
+    def __len__(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM responses")[0][0]
+
+    def volume(self) -> int:
+        return self._execute("SELECT COALESCE(SUM(size), 0) FROM responses")[0][0]
+
+    def expire(self, ttl: Optional[float] = None) -> int:
+        """Remove expired responses (with `ttl`: also the ones stored more than `ttl` seconds ago)"""
+        now = time.time()
+        before = len(self)
+        self._execute("DELETE FROM responses WHERE expires < ?", (now,))
+        if ttl is not None:
+            self._execute("DELETE FROM responses WHERE created < ?", (now - ttl,))
+        self._volume = None
+        return before - len(self)
+
+    def cull(self, max_size: Optional[int] = None) -> int:
+        """Evict the least recently used responses until they fit `max_size` bytes (default: the backend's)"""
+        max_size = max_size if max_size is not None else self.max_size
+        if max_size is None:
+            return 0
+        with self._lock:
+            return self._cull(max_size)
+
+    def _cull(self, max_size: int) -> int:
+        evicted = ("FROM responses WHERE key IN (SELECT key FROM ("
+                   "SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM responses) WHERE total > ?)")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            count, size = self._conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) {evicted}", (max_size,)).fetchone()
+            self._conn.execute(f"DELETE {evicted}", (max_size,))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        if self._volume is not None:
+            self._volume -= size
+        return count
+
+    def clear(self) -> int:
+        before = len(self)
+        self._execute("DELETE FROM responses")
+        self._volume = 0
+        return before
+
+    def merge(self, source: "SQLiteBackend") -> int:
+        """Copy the unexpired responses of another database that this one doesn't have"""
+        before = len(self)
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS source", (str(source.path),))
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO responses SELECT * FROM source.responses "
+                                   "WHERE expires IS NULL OR expires >= ?", (time.time(),))
+            finally:
+                self._conn.execute("DETACH DATABASE source")
+        self._volume = None
+        return len(self) - before
+
+    def close(self) -> None:
+        with self._read_lock:
+            self._reader.close()
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Judge-response cache: an in-memory LRU of `memory_entries` responses in front of a persistent backend
+    (`SQLiteBackend`, or any object with the same get/set/touch/add_stats methods).
+
+    Counts hits, misses and writes per template, for this process (`stats`) and, flushed every few
+    hundred lookups and on `flush`, in the backend (all runs).
+    """
+
+    def __init__(self, backend: SQLiteBackend, memory_entries: int = 4096):
+        self.backend = backend
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._stats = defaultdict(Counter)
+        self._pending_stats = defaultdict(Counter)
+        self._pending_touches = set()
+        self._pending_events = 0
+
+    def get(self, key: str, template: Optional[str] = None) -> Optional[Dict]:
+        value = self._memory.get(key)
+        if value is not None:
+            value, expires = value
+            if expires is not None and expires < time.time():
+                del self._memory[key]
+                value = None
+            else:
+                self._memory.move_to_end(key)
+                self._pending_touches.add(key)
+        if value is None:
+            value = self.backend.get(key)
+            if value is not None:
+                self._remember(key, value)
+        self._count(template, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: Dict, template: Optional[str] = None) -> None:
+        self.backend.set(key, value, template)
+        self._remember(key, value)
+        self._count(template, "writes")
+
+    async def aset(self, key: str, value: Dict, template: Optional[str] = None) -> None:
+        """`set` with the backend write (waiting for the database lock, evicting) in a worker thread, off the event loop"""
+        await asyncio.to_thread(self.backend.set, key, value, template)
+        self._remember(key, value)
+        self._count(template, "writes")
+
+    def _remember(self, key: str, value: Dict) -> None:
+        ttl = getattr(self.backend, "ttl", None)
+        self._memory[key] = (value, time.time() + ttl if ttl is not None else None)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _count(self, template: Optional[str], event: str) -> None:
+        template = template or ""
+        self._stats[template][event] += 1
+        self._pending_stats[template][event] += 1
+        self._pending_events += 1
+        if self._pending_events >= STATS_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending counters and last-used times to the backend"""
+        pending_stats, pending_touches = self._pending_stats, self._pending_touches
+        self._pending_stats, self._pending_touches, self._pending_events = defaultdict(Counter), set(), 0
+        try:
+            if pending_touches:
+                self.backend.touch(pending_touches)
+                pending_touches = set()
+            if pending_stats:
+                self.backend.add_stats(pending_stats)
+        except sqlite3.OperationalError:
+            # database locked by another writer: keep them for the next flush
+            self._pending_touches |= pending_touches
+            for template, stats in pending_stats.items():
+                self._pending_stats[template].update(stats)
+        except sqlite3.Error as e:
+            print(f"⚠️ Failed to update response cache stats: {e}")
+
+    def stats(self, templates: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Hits, misses and writes of this process, summed over `templates` (default: all)"""
+        total = Counter()
+        for template, stats in self._stats.items():
+            if templates is None or template in templates:
+                total.update(stats)
+        return {key: total[key] for key in ["hits", "misses", "writes"]}
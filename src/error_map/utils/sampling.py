@@ -0,0 +1,74 @@
+import math
+import random
+import sys
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class StratifiedReservoirSampler:
+    """
+    One-pass stratified sampling with a fixed-size reservoir per stratum.
+
+    Each stratum keeps a uniform sample of round(ratio * size) items, the sample size of
+    `DataFrame.groupby(...).sample(frac=ratio)`, so memory is O(sample) however many items flow
+    through. Reservoirs are filled with Algorithm L, which jumps over the items that won't be kept
+    instead of drawing a random number for each of them. Every stratum has its own generator
+    derived from `seed`, so the sample doesn't depend on the order strata are fed in.
+    """
+
+    def __init__(self, ratio: float, stratum_sizes: Dict[Hashable, int], seed: Optional[int] = None):
+        self.ratio = ratio
+        self.seed = seed
+        self.capacities = {stratum: int(round(ratio * size)) for stratum, size in stratum_sizes.items()}
+        self._reservoirs: Dict[Hashable, List[Tuple[int, Any]]] = {}
+        self._seen: Counter = Counter()
+        self._rngs: Dict[Hashable, random.Random] = {}
+        self._weights: Dict[Hashable, float] = {}
+        self._next: Dict[Hashable, int] = {}
+
+    def _rng(self, stratum: Hashable) -> random.Random:
+        if stratum not in self._rngs:
+            self._rngs[stratum] = random.Random(f"{self.seed}:{stratum}") if self.seed is not None else random.Random()
+        return self._rngs[stratum]
+
+    def _skip(self, stratum: Hashable, capacity: int) -> None:
+        """Draw the next reservoir weight and the index of the next item to keep"""
+        rng = self._rng(stratum)
+        self._weights[stratum] *= math.exp(math.log(1.0 - rng.random()) / capacity)
+        gap = math.log(1.0 - rng.random()) / math.log(max(1.0 - self._weights[stratum], sys.float_info.min))
+        self._next[stratum] += int(math.floor(gap)) + 1
+
+    def add(self, stratum: Hashable, items: Sequence) -> None:
+        """Feed the next `items` of `stratum`, in arrival order"""
+        capacity = self.capacities.get(stratum, 0)
+        start = self._seen[stratum]
+        self._seen[stratum] += len(items)
+        if capacity <= 0:
+            return
+
+        reservoir = self._reservoirs.setdefault(stratum, [])
+        offset = 0
+        # fill phase
+        while len(reservoir) < capacity and offset < len(items):
+            reservoir.append((start + offset, items[offset]))
+            offset += 1
+            if len(reservoir) == capacity:
+                self._weights[stratum] = 1.0
+                self._next[stratum] = start + offset - 1
+                self._skip(stratum, capacity)
+
+        # replacement phase
+        end = start + len(items)
+        while len(reservoir) == capacity and self._next[stratum] < end:
+            index = self._next[stratum]
+            reservoir[self._rng(stratum).randrange(capacity)] = (index, items[index - start])
+            self._skip(stratum, capacity)
+
+    def samples(self) -> Dict[Hashable, List[Any]]:
+        """Sampled items of each stratum (strata sorted), in arrival order"""
+        return {stratum: [item for _, item in sorted(self._reservoirs[stratum], key=lambda entry: entry[0])]
+                for stratum in sorted(self._reservoirs, key=str)}
+
+    def sample(self) -> List[Tuple[Hashable, Any]]:
+        """All sampled (stratum, item) pairs, ordered by stratum and arrival"""
+        return [(stratum, item) for stratum, items in self.samples().items() for item in items]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from error_map.inference.batch import (
+    BatchPendingError, LocalBatchExecutor, OfflineBatchExecutor, batch_id, batch_request, read_batch_results, results_path,
+    write_batch_shards,
+)
+from error_map.inference.client import InferenceClient
+from error_map.utils.cache_store import CacheStore
+
+LITELLM_CONFIG = {"model": "openai/judge", "api_base": "http://localhost:1", "api_key": "key"}
+
+
+def _result_line(custom_id, status_code=200, content="answer", error=None):
+    body = {"choices": [{"message": {"content": content}}]} if status_code == 200 else {"error": {"message": "failed"}}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": status_code, "body": body} if status_code else None,
+                       "error": error}) + "\n"
+
+
+def test_batch_request_keeps_only_the_request_body():
+    request = batch_request("request-0", {
+        "model": "azure/gpt-4.1", "api_key": "secret", "api_base": "http://judge", "timeout": 10, "extra_headers": None,
+        "max_tokens": 100, "temperature": None,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": "prefix ", "cache_control": {"type": "ephemeral"}},
+                                                  {"type": "text", "text": "rest"}]}],
+    })
+    assert request == {"custom_id": "request-0", "method": "POST", "url": "/v1/chat/completions",
+                       "body": {"model": "gpt-4.1", "max_tokens": 100, "messages": [{"role": "user", "content": "prefix rest"}]}}
+
+
+def test_shards_stay_within_the_limits(tmp_path):
+    requests = [batch_request(f"request-{ind}", {"model": "judge", "messages": [{"role": "user", "content": "x" * 50}]})
+                for ind in range(10)]
+    line_bytes = len(json.dumps(requests[0]).encode("utf-8")) + 1
+
+    shards = write_batch_shards(requests, tmp_path / "by_count", max_requests=4)
+    assert [shard.name for shard in shards] == ["requests_00000.jsonl", "requests_00001.jsonl", "requests_00002.jsonl"]
+    shards = write_batch_shards(requests, tmp_path / "by_bytes", max_bytes=line_bytes * 3)
+    assert len(shards) == 4
+    written = [json.loads(line) for shard in shards for line in shard.read_text().splitlines()]
+    assert written == requests
+    assert results_path(shards[1]).name == "results_00001.jsonl"
+
+    assert batch_id(requests) == batch_id(list(requests)) != batch_id(requests[::-1])
+
+
+def test_read_batch_results(tmp_path):
+    output = tmp_path / "results_00000.jsonl"
+    output.write_text(_result_line("ok") + "\n" + _result_line("rate_limited", 429) + _result_line("bad", 400))
+    errors = tmp_path / "results_00000_errors.jsonl"
+    errors.write_text(_result_line("expired", None, error={"code": "batch_expired"}))
+
+    results = read_batch_results([output, errors])
+    assert results["ok"] == {"success": True, "content": "answer", "full_response": {"choices": [{"message": {"content": "answer"}}]}}
+    assert (results["rate_limited"]["success"], results["rate_limited"]["error_type"]) == (False, "retryable")
+    assert results["bad"]["error_type"] == "permanent" and "failed" in results["bad"]["error"]
+    assert results["expired"]["error_type"] == "retryable" and "batch_expired" in results["expired"]["error"]
+
+
+class AnsweringExecutor(LocalBatchExecutor):
+    """Local executor whose answers are cached, like a real judge's, counting the requests it gets"""
+
+    caches_responses = True
+
+    def __init__(self):
+        self.requests = []
+        super().__init__(respond=lambda body: "answer to " + re.search(r"error number \d+", body["messages"][0]["content"]).group())
+
+    async def run(self, shards):
+        for shard in shards:
+            self.requests += [json.loads(line)["custom_id"] for line in shard.read_text().splitlines()]
+        return await super().run(shards)
+
+
+def _template_vars(ind):
+    return {"data_type": "error_title", "data": [f"error number {ind:04d}"], "taxonomy": {}}
+
+
+def test_infer_batch_ingests_results_in_order_and_caches_them(tmp_path):
+    executor = AnsweringExecutor()
+    client = InferenceClient(inference_type="litellm", max_workers=1, litellm_config=LITELLM_CONFIG,
+                             cache_store=CacheStore(tmp_path / "cache"), batch_executor=executor, batch_dir=tmp_path / "batches")
+
+    results = asyncio.run(client.infer_batch("classify_errors.j2", [_template_vars(ind) for ind in range(5)]))
+    assert len(executor.requests) == 5
+    assert [result["success"] for result in results] == [True] * 5
+    assert [result["content"].endswith(f"{ind:04d}") for ind, result in enumerate(results)] == [True] * 5
+
+    # the answered calls come from the cache, only the new one goes to the batch
+    results = asyncio.run(client.infer_batch("classify_errors.j2", [_template_vars(ind) for ind in range(6)]))
+    assert len(executor.requests) == 6
+    assert [result.get("cached", False) for result in results] == [True] * 5 + [False]
+    assert client.call_stats(["classify_errors.j2"])["cache_hits"] == 5
+
+
+def test_offline_batch_is_picked_up_on_rerun(tmp_path):
+    client = InferenceClient(inference_type="litellm", max_workers=1, litellm_config=LITELLM_CONFIG,
+                             cache_store=CacheStore(tmp_path / "cache"), batch_executor=OfflineBatchExecutor(),
+                             batch_dir=tmp_path / "batches")
+    template_vars_list = [_template_vars(ind) for ind in range(3)]
+    with pytest.raises(BatchPendingError):
+        asyncio.run(client.infer_batch("classify_errors.j2", template_vars_list))
+
+    # the offline runner answers two of the requests
+    shard, = (tmp_path / "batches").glob("*/requests_00000.jsonl")
+    results_path(shard).write_text(_result_line("request-0", content="first") + _result_line("request-2", 400))
+
+    results = asyncio.run(client.infer_batch("classify_errors.j2", template_vars_list))
+    assert results[0]["success"] and results[0]["content"] == "first"
+    assert (results[1]["success"], results[1]["error_type"]) == (False, "retryable")
+    assert (results[2]["success"], results[2]["error_type"]) == (False, "permanent")
+    assert client.call_stats()["failed_retryable"] == 1 and client.call_stats()["failed_permanent"] == 1
@@ -0,0 +1,53 @@
+from error_map.inference.budget import MAX_TOKENS, TRIM_MARKER, TokenBudget, _fair_share
+from error_map.inference.client import InferenceClient
+from error_map.utils.cache_store import CacheStore
+
+
+def _budget(prompt_budget, **kwargs):
+    budget = TokenBudget("test/model", prompt_budgets={"t.j2": prompt_budget}, **kwargs)
+    budget._has_tokenizer = False  # CHARS_PER_TOKEN characters per token
+    return budget
+
+
+def test_fair_share_caps_only_the_longest_fields():
+    assert _fair_share([10, 20, 30], 100) == 30
+    assert _fair_share([10, 100, 100], 70) == 30
+    assert _fair_share([50, 50], 60) == 30
+
+
+def test_fit_leaves_prompts_within_budget_alone():
+    template_vars = {"input_text": "x" * 40, "correct_outputs": ["y" * 40], "score": 0.5}
+    fitted, trimmed = _budget(100).fit("t.j2", template_vars)
+    assert fitted is template_vars and trimmed == {}
+    # templates without a budget aren't trimmed
+    fitted, trimmed = _budget(1).fit("other.j2", template_vars)
+    assert fitted is template_vars and trimmed == {}
+
+
+def test_fit_trims_the_longest_fields_keeping_head_and_tail():
+    output_text = "H" * 200 + "m" * 1600 + "T" * 200  # 500 tokens
+    template_vars = {"input_text": "q" * 200, "output_text": output_text, "correct_outputs": ["a" * 40, "b" * 2000]}
+    fitted, trimmed = _budget(366).fit("t.j2", template_vars)
+
+    # 50 + 10 tokens kept, the two long fields share the other 306
+    assert fitted["input_text"] == template_vars["input_text"]
+    assert fitted["correct_outputs"][0] == "a" * 40
+    # each cut to 153 tokens: 137 kept (68 head, 69 tail) around the marker
+    assert trimmed == {"output_text": 363, "correct_outputs": 363}
+    marker = TRIM_MARKER.format(363)
+    assert fitted["output_text"] == "H" * 200 + "m" * 72 + marker + "m" * 76 + "T" * 200
+    assert fitted["correct_outputs"][1] == "b" * 68 * 4 + marker + "b" * 69 * 4
+    # the caller's variables are left untouched
+    assert template_vars["output_text"] == output_text and template_vars["correct_outputs"][1] == "b" * 2000
+
+
+def test_max_tokens_is_sized_per_template_over_the_litellm_config(tmp_path):
+    client = InferenceClient(inference_type="litellm", max_workers=1, cache_store=CacheStore(tmp_path),
+                             litellm_config={"model": "openai/judge", "api_base": "http://localhost:1", "api_key": "key",
+                                             "max_tokens": 5, "temperature": 0})
+    template_vars = {"data_type": "error_title", "data": ["wrong"], "taxonomy": {}}
+    _, infer_params, _, _ = client._prepare_call("classify_errors.j2", template_vars, "", 10.0, None, {})
+    assert infer_params["max_tokens"] == MAX_TOKENS["classify_errors.j2"]
+    assert infer_params["temperature"] == 0
+    _, infer_params, _, _ = client._prepare_call("classify_errors.j2", template_vars, "", 10.0, 77, {})
+    assert infer_params["max_tokens"] == 77
@@ -0,0 +1,96 @@
+import asyncio
+
+import pandas as pd
+
+from error_map.utils.cache import StageResult, cached, fingerprint, read_frame, write_frame
+from error_map.utils.cache_store import CacheStore
+
+
+class Client:
+    def __init__(self, model):
+        self.model = model
+
+    def cache_fingerprint(self):
+        return {"model": self.model}
+
+
+def test_fingerprint_is_a_content_hash():
+    records = [{"example_id": "ex_0", "score": 0.5, "tags": {"b", "a"}}, {"example_id": "ex_1", "score": float("nan")}]
+    assert fingerprint(records) == fingerprint([{"tags": {"a", "b"}, "score": 0.5, "example_id": "ex_0"},
+                                                {"score": float("nan"), "example_id": "ex_1"}])
+    assert fingerprint(records) != fingerprint(records[::-1])
+    assert fingerprint({"score": 1}) != fingerprint({"score": 1.0}) != fingerprint({"score": "1"})
+    # raw provider responses don't change the key
+    assert fingerprint({"judge_response": "r", "full_response": "id 1"}) == fingerprint({"judge_response": "r", "full_response": "id 2"})
+    # clients by their fingerprint, upstream results by their cache key
+    assert fingerprint(Client("judge_a")) == fingerprint(Client("judge_a")) != fingerprint(Client("judge_b"))
+    assert fingerprint(StageResult([{"a": 1}], "key_1")) == fingerprint(StageResult([{"a": 2}], "key_1"))
+    assert fingerprint(StageResult([{"a": 1}], "key_1")) != fingerprint(StageResult([{"a": 1}], "key_2"))
+
+
+def test_frames_round_trip(tmp_path):
+    df = pd.DataFrame({"example_id": ["ex_0", "ex_1"], "score": [0.5, None], "error": [True, False],
+                       "correct_output_list": [["42", "forty-two"], []], "meta": [{"k": 1}, None], "mixed": ["a", 1]})
+    write_frame(df, tmp_path / "frame.parquet")
+    read = read_frame(tmp_path / "frame.parquet")
+    assert read.to_dict("records")[0] == {"example_id": "ex_0", "score": 0.5, "error": True,
+                                          "correct_output_list": ["42", "forty-two"], "meta": {"k": 1}, "mixed": "a"}
+    assert read["mixed"].tolist() == ["a", 1] and read["meta"][1] is None
+
+
+def _stage(tmp_path, calls, complete=True):
+    @cached("toy_stage", tmp_path, store=CacheStore(tmp_path / "cache"))
+    async def toy_stage(records, exp_id, threshold, journal_path=None):
+        calls.append((exp_id, journal_path))
+        journal_path.write_text("partial\n")
+        return StageResult([{**record, "error": record["score"] < threshold} for record in records], complete=complete)
+    return toy_stage
+
+
+def test_unchanged_inputs_reuse_the_results_of_other_experiments(tmp_path):
+    calls = []
+    stage = _stage(tmp_path, calls)
+    records = [{"example_id": "ex_0", "score": 0.2}, {"example_id": "ex_1", "score": 0.8}]
+
+    first = asyncio.run(stage(records=records, exp_id="exp_a", threshold=0.5))
+    second = asyncio.run(stage(records=list(records), exp_id="exp_b", threshold=0.5))
+    assert len(calls) == 1
+    assert second == first and second.cache_key == first.cache_key
+    # both experiments get their output files
+    for exp_id in ("exp_a", "exp_b"):
+        assert (tmp_path / f"exp_name=toy_stage__exp_id={exp_id}.parquet").exists()
+        assert len(pd.read_csv(tmp_path / f"exp_name=toy_stage__exp_id={exp_id}.csv")) == 2
+    # the checkpoint journal goes once the results are cached
+    assert not calls[0][1].exists()
+
+    # changed inputs are recomputed
+    third = asyncio.run(stage(records=records, exp_id="exp_c", threshold=0.9))
+    fourth = asyncio.run(stage(records=records[:1], exp_id="exp_d", threshold=0.5))
+    assert len(calls) == 3
+    assert len({first.cache_key, third.cache_key, fourth.cache_key}) == 3
+    assert [record["error"] for record in third] == [True, True]
+
+
+def test_upstream_changes_invalidate_downstream_stages(tmp_path):
+    calls = []
+    stage = _stage(tmp_path, calls)
+    records = [{"example_id": "ex_0", "score": 0.2}]
+    asyncio.run(stage(records=StageResult(records, "upstream_1"), exp_id="exp_a", threshold=0.5))
+    asyncio.run(stage(records=StageResult(records, "upstream_1"), exp_id="exp_b", threshold=0.5))
+    assert len(calls) == 1
+    asyncio.run(stage(records=StageResult(records, "upstream_2"), exp_id="exp_c", threshold=0.5))
+    assert len(calls) == 2
+
+
+def test_incomplete_results_are_not_cached(tmp_path):
+    calls = []
+    stage = _stage(tmp_path, calls, complete=False)
+    records = [{"example_id": "ex_0", "score": 0.2}]
+    result = asyncio.run(stage(records=records, exp_id="exp_a", threshold=0.5))
+    assert not result.complete and result.cache_key is None
+    assert (tmp_path / "exp_name=toy_stage__exp_id=exp_a.parquet").exists()
+    # kept for the re-run to resume from
+    assert calls[0][1].exists()
+
+    asyncio.run(stage(records=records, exp_id="exp_a", threshold=0.5))
+    assert len(calls) == 2 and calls[1][1] == calls[0][1]
@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+
+from error_map.utils.cache_store import CACHE_DIR_ENV, CacheStore, parse_duration, parse_size
+
+
+def _write_entry(store, stem, size, age=0.0, suffixes=(".json",)):
+    """A cached stage result, last used `age` seconds ago"""
+    used = time.time() - age
+    for suffix in suffixes:
+        path = store.stages_dir / f"{stem}{suffix}"
+        path.write_bytes(b"x" * size)
+        os.utime(path, (used, used))
+
+
+def test_parse_size_and_duration():
+    assert parse_size("500MB") == 500 * 1024 ** 2
+    assert parse_size("1.5g") == int(1.5 * 1024 ** 3)
+    assert parse_size("2048") == 2048 and parse_size(10) == 10 and parse_size(None) is None
+    assert parse_duration("90m") == 5400 and parse_duration("7d") == 7 * 86400 and parse_duration("30") == 30
+    with pytest.raises(ValueError):
+        parse_size("lots")
+    with pytest.raises(ValueError):
+        parse_duration("1y")
+
+
+def test_default_location(tmp_path, monkeypatch):
+    monkeypatch.delenv(CACHE_DIR_ENV, raising=False)
+    assert CacheStore.default(tmp_path / "out").root == tmp_path / "out" / "cache"
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path / "shared"))
+    store = CacheStore.default(tmp_path / "out", max_size="1GB", ttl="7d")
+    assert store.root == tmp_path / "shared" and store.max_size == 1024 ** 3 and store.ttl == 7 * 86400
+
+
+def test_stage_entries_group_files_least_recently_used_first(tmp_path):
+    store = CacheStore(tmp_path)
+    _write_entry(store, "exp_a_single_error_1", 100, age=10, suffixes=(".json", ".parquet"))
+    _write_entry(store, "exp_a_taxonomy_2", 50, age=20)
+    _write_entry(store, "exp_a_single_error_3__journal", 70, suffixes=(".jsonl",))
+
+    entries = store.stage_entries()
+    assert [entry["stem"] for entry in entries] == ["exp_a_taxonomy_2", "exp_a_single_error_1"]
+    assert entries[1]["bytes"] == 200 and len(entries[1]["files"]) == 2
+
+    store.touch("exp_a_taxonomy_2")
+    assert [entry["stem"] for entry in store.stage_entries()] == ["exp_a_single_error_1", "exp_a_taxonomy_2"]
+
+
+def test_prune_evicts_expired_then_least_recently_used(tmp_path):
+    store = CacheStore(tmp_path)
+    for ind, age in enumerate([300, 200, 100, 0]):
+        _write_entry(store, f"entry_{ind}", 100, age=age)
+    response_cache = store.response_cache()
+    response_cache.set("k", {"content": "c", "full_response": "r"}, "t.j2")
+
+    result = store.prune(ttl="250s")
+    assert result == {"stage_entries_evicted": 1, "stage_bytes_evicted": 100, "responses_evicted": 0}
+    result = store.prune(max_size=150)
+    assert result["stage_entries_evicted"] == 2
+    assert [entry["stem"] for entry in store.stage_entries()] == ["entry_3"]
+    assert store.stage_stats()["evictions"] == 3 and store.stage_stats()["evictions_bytes"] == 300
+
+    result = store.prune(clear=True)
+    assert result == {"stage_entries_evicted": 1, "stage_bytes_evicted": 100, "responses_evicted": 1}
+    assert store.stage_entries() == [] and response_cache.backend.get("k") is None
+
+
+def test_stats_and_summary(tmp_path):
+    store = CacheStore(tmp_path, max_size="10MB")
+    _write_entry(store, "entry", 100)
+    store.record("hits")
+    store.record("writes", 100)
+    cache = store.response_cache()
+    assert store.response_cache() is cache
+    cache.set("k", {"content": "c", "full_response": "r"}, "t.j2")
+    cache.get("k", "t.j2")
+    cache.get("other", "t.j2")
+
+    summary = store.summary()
+    assert summary["max_size"] == 10 * 1024 ** 2
+    assert summary["stages"] == {"entries": 1, "bytes": 100, "hits": 1, "writes": 1, "writes_bytes": 100}
+    assert summary["responses"]["entries"] == 1 and summary["responses"]["hits"] == 1 and summary["responses"]["misses"] == 1
+    assert summary["responses"]["templates"]["t.j2"]["writes"] == 1
+
+
+def test_warm_copies_missing_entries(tmp_path):
+    shared = CacheStore(tmp_path / "shared")
+    _write_entry(shared, "entry_a", 100, suffixes=(".json", ".parquet"))
+    _write_entry(shared, "entry_b", 100)
+    shared.response_cache().set("k", {"content": "shared", "full_response": "r"})
+
+    local = CacheStore(tmp_path / "local")
+    _write_entry(local, "entry_b", 10)
+    local.response_cache().set("own", {"content": "local", "full_response": "r"})
+
+    assert local.warm(tmp_path / "shared") == {"stage_entries_copied": 1, "responses_copied": 1}
+    assert sorted(path.name for path in local.stages_dir.iterdir()) == ["entry_a.json", "entry_a.parquet", "entry_b.json"]
+    # the local entry is kept
+    assert (local.stages_dir / "entry_b.json").stat().st_size == 10
+    assert local.response_cache().get("k")["content"] == "shared"
+    assert local.warm(shared) == {"stage_entries_copied": 0, "responses_copied": 0}
@@ -0,0 +1,76 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from error_map.core.config import Config
+from error_map.stages import prepare_data
+from error_map.stages.data_preparation import (
+    _count_failures_sync, _default_threshold, _failures_from_histogram, _scan_dataset_sync, _scan_failure_counts,
+    _score_histogram,
+)
+
+
+def _boundary_scores():
+    grid = np.arange(-3, 104) / 100
+    rng = np.random.default_rng(0)
+    return np.concatenate([grid, np.nextafter(grid, -np.inf), np.nextafter(grid, np.inf), grid * 0.1 * 10,
+                           rng.random(500), [np.nan, np.inf, -np.inf]])
+
+
+def test_histogram_counts_match_the_threshold_comparison():
+    scores = _boundary_scores()
+    chunk = pd.DataFrame({"model": np.where(np.arange(len(scores)) % 2, "m_a", "m_b"), "score": scores})
+    histogram = _score_histogram(chunk, None)
+    for grid_index in range(-4, 106):
+        threshold = round(grid_index * 0.01, 2)
+        counts = _failures_from_histogram(histogram, "toy", threshold)
+        for model in ("m_a", "m_b"):
+            expected = int((chunk["score"][chunk["model"] == model] < threshold).sum())
+            assert counts[(model, "toy")] == expected, (threshold, model)
+
+    # only the models analyzed are counted
+    assert {model for model, _ in _score_histogram(chunk, ["m_a"])} == {"m_a"}
+    # thresholds off the grid can't be derived
+    assert _failures_from_histogram(histogram, "toy", 0.705) is None
+
+
+def _write_dataset(tmp_path, num_examples=60):
+    rng = np.random.default_rng(1)
+    rows = [{"example_id": f"ex_{i}", "model": model, "input_text": f"q {i}", "output_text": f"a {i}",
+             "correct_answer": "42", "score": round(float(rng.random()), 2), "extra": i}
+            for i in range(num_examples) for model in ("m_a", "m_b", "m_c")]
+    pd.DataFrame(rows).to_csv(tmp_path / "toy.csv", index=False)
+
+
+def test_scan_derives_the_failure_counts(tmp_path):
+    _write_dataset(tmp_path)
+    config = Config(data_path=str(tmp_path), output_dir=tmp_path)
+    scan = _scan_dataset_sync(config, "toy", ["m_a", "m_b"], chunk_size=7)
+    thresholds = {"toy": _default_threshold(scan["score_sum"], scan["score_count"])}
+
+    counts = _scan_failure_counts(scan, config, thresholds)
+    assert counts is not None
+    assert counts == _count_failures_sync(scan, config, ["m_a", "m_b"], thresholds, chunk_size=7)
+    assert {model for model, _ in counts} == {"m_a", "m_b"}
+
+    # a configured threshold is counted directly
+    config = Config(data_path=str(tmp_path), output_dir=tmp_path, dataset_params={"toy": {"success_threshold": 0.333}})
+    scan = _scan_dataset_sync(config, "toy", None, chunk_size=7)
+    assert scan["histogram"] is None
+    assert _scan_failure_counts(scan, config, {}) == _count_failures_sync(scan, config, None, {}, chunk_size=7)
+
+
+def test_chunked_samples_the_same_failures(tmp_path):
+    _write_dataset(tmp_path)
+
+    def run(chunk_size):
+        config = Config(data_path=str(tmp_path), output_dir=tmp_path, seed=3)
+        rows = asyncio.run(prepare_data.__wrapped__(exp_id="test", config=config, models=["m_a", "m_b"], ratio=0.3,
+                                                    chunk_size=chunk_size, cols_to_keep=["extra"]))
+        failures = pd.DataFrame([row for row in rows if row["error"]])
+        return failures.sort_values(["model", "example_id"]).reset_index(drop=True)[["model", "example_id", "score", "extra"]]
+
+    in_memory, chunked = run(None), run(11)
+    assert len(in_memory) and set(in_memory["model"]) == {"m_a", "m_b"}
+    pd.testing.assert_frame_equal(in_memory, chunked)
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from error_map.inference.endpoints import EndpointPool
+
+
+def _overloaded(retry_after=None):
+    error = Exception("HTTP 503")
+    error.status_code = 503
+    error.response = SimpleNamespace(headers={"retry-after": str(retry_after)} if retry_after is not None else {})
+    return error
+
+
+def test_endpoints_are_named_and_configured():
+    pool = EndpointPool(["http://a", {"api_base": "http://b", "api_key": "key_b", "max_concurrency": 2}, "http://a"])
+    assert [endpoint.name for endpoint in pool.endpoints] == ["http://a", "http://b", "http://a#3"]
+    assert pool.endpoints[1].params == {"api_base": "http://b", "api_key": "key_b"}
+    assert pool.endpoints[1].max_concurrency == 2
+    with pytest.raises(ValueError):
+        EndpointPool([])
+
+
+def test_calls_go_to_the_least_busy_endpoint():
+    async def scenario():
+        pool = EndpointPool(["http://a", "http://b", "http://c"])
+        taken = [await pool.acquire() for _ in range(3)]
+        assert sorted(endpoint.name for endpoint in taken) == ["http://a", "http://b", "http://c"]
+        pool.release(taken[1])
+        # b has nothing in flight now
+        assert (await pool.acquire()) is taken[1]
+        # ties go to the endpoint with the fewest calls so far
+        for endpoint in taken:
+            pool.release(endpoint)
+        assert (await pool.acquire()).name in ("http://a", "http://c")
+    asyncio.run(scenario())
+
+
+def test_max_concurrency_makes_calls_wait():
+    async def scenario():
+        pool = EndpointPool([{"api_base": "http://a", "max_concurrency": 1}])
+        first = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        pool.release(first)
+        assert (await asyncio.wait_for(waiter, 1.0)) is first
+    asyncio.run(scenario())
+
+
+def test_cooldown_after_consecutive_failures():
+    pool = EndpointPool(["http://a", "http://b"], cooldown=5.0, max_cooldown=60.0, failure_threshold=2)
+    a = pool.endpoints[0]
+
+    def fail(error=None):
+        a.in_flight += 1
+        pool.release(a, error or _overloaded())
+
+    fail()
+    assert not pool.stats()["http://a"]["cooling_down"]
+    fail()
+    assert pool.stats()["http://a"]["cooling_down"] and a.cooldowns == 1
+    assert a.cooldown_until - time.monotonic() == pytest.approx(5.0, abs=0.1)
+    # doubled on each further failure, up to max_cooldown, and at least the server's Retry-After
+    fail()
+    assert a.cooldown_until - time.monotonic() == pytest.approx(10.0, abs=0.1)
+    fail(_overloaded(retry_after=45))
+    assert a.cooldown_until - time.monotonic() == pytest.approx(45.0, abs=0.1)
+    for _ in range(5):
+        fail()
+    assert a.cooldown_until - time.monotonic() == pytest.approx(60.0, abs=0.1)
+    # still the same cooldown
+    assert a.cooldowns == 1 and a.errors == 9
+    assert not pool.all_cooling_down()
+
+    # a success resets the failure streak
+    a.in_flight += 1
+    pool.release(a)
+    assert a.consecutive_errors == 0
+
+
+def test_calls_avoid_cooling_endpoints_and_wait_when_all_are():
+    async def scenario():
+        pool = EndpointPool(["http://a", "http://b"], cooldown=0.2, failure_threshold=1)
+        a, b = pool.endpoints
+        pool.release(await pool.acquire(), _overloaded())
+        cooling = a if a.cooldown_until else b
+        for _ in range(3):
+            endpoint = await pool.acquire()
+            assert endpoint is not cooling
+            pool.release(endpoint)
+
+        pool.release(await pool.acquire(), _overloaded())
+        assert pool.all_cooling_down()
+        start = time.monotonic()
+        endpoint = await asyncio.wait_for(pool.acquire(), 2.0)
+        # the first cooldown to end
+        assert 0.1 < time.monotonic() - start < 1.0 and endpoint is cooling
+    asyncio.run(scenario())
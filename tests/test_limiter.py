@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from error_map.inference.limiter import AdaptiveLimiter, SUCCESS, OVERLOAD, ERROR
+
+
+def _run_batch(limiter, outcome=SUCCESS):
+    """Fill every slot, then release them all with `outcome`"""
+    async def batch():
+        tokens = [await limiter.acquire() for _ in range(limiter.limit)]
+        for token in tokens:
+            limiter.release(token, outcome)
+    asyncio.run(batch())
+
+
+def test_slow_start_grows_by_one_per_saturated_success():
+    limiter = AdaptiveLimiter(max_limit=100, initial_limit=4)
+    _run_batch(limiter)
+    # only the first release happens with all the slots taken (the limit is the bottleneck)
+    assert limiter.limit == 5
+    _run_batch(limiter)
+    assert limiter.limit == 6
+    assert limiter.successes == 9
+
+
+def test_no_growth_when_not_saturated():
+    limiter = AdaptiveLimiter(max_limit=100, initial_limit=4)
+
+    async def one_call():
+        limiter.release(await limiter.acquire(), SUCCESS)
+    for _ in range(20):
+        asyncio.run(one_call())
+    assert limiter.limit == 4
+
+
+def test_overload_cuts_the_limit_once_per_round_trip():
+    limiter = AdaptiveLimiter(max_limit=100, initial_limit=16, backoff=0.5)
+
+    async def overloaded():
+        tokens = [await limiter.acquire() for _ in range(8)]
+        for token in tokens:
+            limiter.release(token, OVERLOAD)
+    asyncio.run(overloaded())
+    # the 8 calls started before the first cut: a single halving
+    assert limiter.limit == 8
+    assert limiter.overloads == 8
+
+    _run_batch(limiter, OVERLOAD)
+    assert limiter.limit == 4
+
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveLimiter(max_limit=6, initial_limit=4, min_limit=2)
+    for _ in range(10):
+        _run_batch(limiter)
+    assert limiter.limit == 6
+    for _ in range(10):
+        _run_batch(limiter, OVERLOAD)
+    assert limiter.limit == 2
+
+
+def test_after_first_overload_growth_is_additive():
+    limiter = AdaptiveLimiter(max_limit=100, initial_limit=10)
+    _run_batch(limiter, OVERLOAD)
+    assert limiter.limit == 5
+    _run_batch(limiter)
+    # 1 / limit per saturated success instead of 1
+    assert limiter._limit == pytest.approx(5.2)
+
+
+def test_errors_leave_the_limit_alone():
+    limiter = AdaptiveLimiter(max_limit=100, initial_limit=8)
+    _run_batch(limiter, ERROR)
+    assert limiter.limit == 8
+    assert limiter.errors == 8
+
+
+def test_waiters_get_freed_slots():
+    limiter = AdaptiveLimiter(max_limit=2, adaptive=False)
+
+    async def scenario():
+        first, second = await limiter.acquire(), await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done() and limiter.queue_depth == 1
+        limiter.release(first)
+        limiter.release(await waiter)
+        limiter.release(second)
+        assert limiter.in_flight == 0
+    asyncio.run(scenario())
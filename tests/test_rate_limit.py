@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from error_map.inference.rate_limit import EndpointRateLimiter, TokenBucket
+
+
+def test_bucket_starts_full_and_reserves():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=600, burst_seconds=10)  # 10 tokens/s, 100 at most
+        assert bucket.capacity == 100
+        waited = await bucket.acquire(60)
+        assert waited < 0.05
+        assert bucket.tokens == pytest.approx(40, abs=1)
+    asyncio.run(scenario())
+
+
+def test_bucket_waits_for_the_refill():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=6000, burst_seconds=1)  # 100 tokens/s, 100 at most
+        await bucket.acquire(100)
+        waited = await bucket.acquire(20)
+        assert 0.15 < waited < 0.5
+    asyncio.run(scenario())
+
+
+def test_refund_wakes_a_waiter():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=60, burst_seconds=10)  # 1 token/s, 10 at most
+        await bucket.acquire(10)
+        waiter = asyncio.ensure_future(bucket.acquire(5))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        bucket.refund(8)
+        waited = await asyncio.wait_for(waiter, 1.0)
+        assert waited < 0.5
+    asyncio.run(scenario())
+
+
+def test_refund_is_capped_by_the_capacity():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=60, burst_seconds=10)
+        await bucket.acquire(4)
+        bucket.refund(100)
+        assert bucket.tokens == pytest.approx(10)
+        # negative refunds take more (a response that used more than reserved)
+        bucket.refund(-15)
+        assert bucket.tokens == pytest.approx(-5, abs=0.1)
+    asyncio.run(scenario())
+
+
+def test_reconcile_gives_back_the_unused_tokens():
+    async def scenario():
+        limiter = EndpointRateLimiter(rpm_limit=60, tpm_limit=6000)  # 1000 tokens at most
+        reserved = await limiter.reserve(800)
+        assert limiter.tokens.tokens == pytest.approx(200, abs=1)
+        limiter.reconcile(reserved, 300)
+        assert limiter.tokens.tokens == pytest.approx(700, abs=1)
+        assert limiter.stats()["reserved_tokens"] == 800
+        assert limiter.stats()["used_tokens"] == 300
+
+        # unknown usage keeps the reservation
+        reserved = await limiter.reserve(100)
+        limiter.reconcile(reserved, None)
+        assert limiter.tokens.tokens == pytest.approx(600, abs=1)
+        assert limiter.stats()["used_tokens"] == 400
+    asyncio.run(scenario())
+
+
+def test_no_quota_no_wait():
+    async def scenario():
+        limiter = EndpointRateLimiter()
+        for _ in range(1000):
+            limiter.reconcile(await limiter.reserve(10 ** 6), 10)
+        assert limiter.stats()["rate_limit_wait_s"] == 0
+    asyncio.run(scenario())
+
+
+def test_cancelled_call_gives_back_its_reservation(tmp_path):
+    from error_map.inference.client import InferenceClient
+    from error_map.inference.synthetic import SyntheticJudge
+    from error_map.utils.cache_store import CacheStore
+
+    async def scenario():
+        client = InferenceClient("synthetic", max_workers=4, tpm_limit=600000, cache_store=CacheStore(tmp_path),
+                                 synthetic_judge=SyntheticJudge(latency="fixed", latency_mean=60))
+        template_vars = {"data_type": "error_title", "data": ["wrong"], "taxonomy": {}}
+        call = asyncio.ensure_future(client.infer("classify_errors.j2", template_vars, schema_name="classify_errors_schema.json"))
+        await asyncio.sleep(0.2)
+        limiter = client._rate_limiter()
+        assert limiter.stats()["reserved_tokens"] > 0
+        before = limiter.tokens.tokens
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        # only the prompt is kept, the completion budget is given back
+        stats = limiter.stats()
+        assert stats["used_tokens"] < stats["reserved_tokens"]
+        assert limiter.tokens.tokens - before >= stats["reserved_tokens"] - stats["used_tokens"]
+        await client.aclose()
+    asyncio.run(scenario())
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+from error_map.utils.response_cache import ResponseCache, SQLiteBackend, response_cache_key
+
+MESSAGES = [{"role": "user", "content": "Judge this answer"}]
+
+
+def _value(size=100):
+    return {"content": "x" * size, "full_response": "response"}
+
+
+def test_key_ignores_formatting_and_transport_parameters():
+    key = response_cache_key("Judge", MESSAGES, None, {"max_tokens": 10, "api_key": "a", "timeout": 5})
+    assert key == response_cache_key("judge ", [{"role": "user", "content": "Judge this answer  \r\n"}], None,
+                                     {"max_tokens": 10, "api_key": "b", "timeout": 60})
+    assert key != response_cache_key("judge", MESSAGES, None, {"max_tokens": 20})
+    assert key != response_cache_key("judge", MESSAGES, {"type": "json_schema"}, {"max_tokens": 10})
+    assert key != response_cache_key("judge", MESSAGES, None, {"max_tokens": 10}, namespace="litellm-mock")
+    # composed and decomposed accents are the same prompt
+    assert response_cache_key("judge", [{"content": "caf\u00e9"}]) == response_cache_key("judge", [{"content": "cafe\u0301"}])
+
+
+def test_set_get_across_instances(tmp_path):
+    backend = SQLiteBackend(tmp_path / "responses.sqlite3")
+    cache = ResponseCache(backend)
+    assert cache.get("k", "t.j2") is None
+    cache.set("k", _value(), "t.j2")
+    assert cache.get("k", "t.j2") == _value()
+    backend.close()
+
+    reopened = SQLiteBackend(tmp_path / "responses.sqlite3")
+    assert ResponseCache(reopened).get("k") == _value()
+    assert len(reopened) == 1
+    reopened.close()
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path):
+    backend = SQLiteBackend(tmp_path / "responses.sqlite3", max_size=10 ** 6)
+    cache = ResponseCache(backend, memory_entries=0)
+    for ind in range(10):
+        cache.set(f"k{ind}", _value(), "t.j2")
+        time.sleep(0.002)
+    entry_size = backend.volume() // 10
+    # the oldest entries used again: the least recently used are now k2...
+    for key in ("k0", "k1"):
+        cache._pending_touches.add(key)
+    cache.flush()
+
+    backend.max_size = entry_size * 10 - 1
+    cache.set("k10", _value(), "t.j2")
+    # evicted down to 90% of max_size: 8 entries of 11
+    assert len(backend) == 8
+    assert backend.volume() <= backend.max_size * 0.9
+    kept = {f"k{ind}" for ind in range(11) if backend.get(f"k{ind}") is not None}
+    assert kept == {"k0", "k1", "k5", "k6", "k7", "k8", "k9", "k10"}
+
+    assert backend.cull(entry_size * 3) == 5
+    assert len(backend) == 3
+    backend.close()
+
+
+def test_responses_expire(tmp_path):
+    backend = SQLiteBackend(tmp_path / "responses.sqlite3", ttl=0.2)
+    cache = ResponseCache(backend)
+    cache.set("k", _value())
+    assert cache.get("k") == _value()
+    time.sleep(0.3)
+    # expired in memory and in the database
+    assert cache.get("k") is None and backend.get("k") is None
+    assert backend.expire() == 1 and len(backend) == 0
+
+    backend.ttl = None
+    cache.set("old", _value())
+    time.sleep(0.1)
+    cache.set("new", _value())
+    assert backend.expire(ttl=0.05) == 1
+    assert backend.get("new") is not None
+    backend.close()
+
+
+def test_memory_lru_is_bounded(tmp_path):
+    cache = ResponseCache(SQLiteBackend(tmp_path / "responses.sqlite3"), memory_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, _value())
+    assert list(cache._memory) == ["b", "c"]
+    # still in the database
+    assert cache.get("a") == _value()
+    assert list(cache._memory) == ["c", "a"]
+    cache.backend.close()
+
+
+def test_stats_per_template_and_over_runs(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    for run in range(2):
+        backend = SQLiteBackend(path)
+        cache = ResponseCache(backend)
+        cache.get("k1", "a.j2")
+        asyncio.run(cache.aset("k1", _value(), "a.j2"))
+        cache.get("k1", "a.j2")
+        cache.get("k2", "b.j2")
+        # the second run finds k1 in the database
+        assert cache.stats() == {"hits": 1 + run, "misses": 2 - run, "writes": 1}
+        cache.flush()
+        backend.close()
+
+    assert cache.stats(["a.j2"]) == {"hits": 2, "misses": 0, "writes": 1}
+    assert cache.stats(["b.j2"]) == {"hits": 0, "misses": 1, "writes": 0}
+    backend = SQLiteBackend(path)
+    assert backend.stats() == {"a.j2": {"hits": 3, "misses": 1, "writes": 2}, "b.j2": {"hits": 0, "misses": 2, "writes": 0}}
+    backend.close()
+
+
+def test_lookups_dont_wait_for_writes(tmp_path):
+    backend = SQLiteBackend(tmp_path / "responses.sqlite3")
+    cache = ResponseCache(backend)
+    cache.set("k", _value(), "t.j2")
+    cache.get("k", "t.j2")
+
+    with backend._lock:  # a long write (e.g. an eviction) in another thread
+        start = time.monotonic()
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(value=backend.get("k")))
+        reader.start()
+        reader.join(5.0)
+        assert result["value"] == _value() and time.monotonic() - start < 1.0
+        # counters can wait: kept for the next flush
+        cache.flush()
+        assert cache._pending_stats["t.j2"]["hits"] == 1
+    cache.flush()
+    assert not cache._pending_stats and backend.stats()["t.j2"]["hits"] == 1
+    backend.close()
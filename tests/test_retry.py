@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import httpx
+import litellm
+import pytest
+
+from error_map.inference.retry import PERMANENT, RETRYABLE, RetryPolicy, retry_after
+from error_map.inference.streaming import StreamAbortedError
+
+
+def _status_error(status_code, headers=None):
+    error = Exception(f"HTTP {status_code}")
+    error.status_code = status_code
+    if headers is not None:
+        error.response = SimpleNamespace(headers=headers)
+    return error
+
+
+@pytest.mark.parametrize("error", [
+    litellm.RateLimitError("slow down", llm_provider="openai", model="judge"),
+    litellm.ServiceUnavailableError("down", llm_provider="openai", model="judge"),
+    litellm.Timeout("timed out", model="judge", llm_provider="openai"),
+    httpx.ConnectError("refused"),
+    asyncio.TimeoutError(),
+    ConnectionResetError(),
+    StreamAbortedError("repeats itself"),
+    _status_error(503),
+    _status_error(429),
+    _status_error(408),
+])
+def test_transient_errors_are_retryable(error):
+    assert RetryPolicy.classify(error) == RETRYABLE
+
+
+@pytest.mark.parametrize("error", [
+    litellm.ContextWindowExceededError("too long", model="judge", llm_provider="openai"),
+    litellm.AuthenticationError("bad key", llm_provider="openai", model="judge"),
+    litellm.BadRequestError("bad request", model="judge", llm_provider="openai"),
+    _status_error(400),
+    ValueError("bug"),
+])
+def test_other_errors_are_permanent(error):
+    assert RetryPolicy.classify(error) == PERMANENT
+
+
+def test_should_retry_up_to_max_retries():
+    policy = RetryPolicy(max_retries=2)
+    error = _status_error(500)
+    assert [policy.should_retry(error, attempt) for attempt in range(4)] == [True, True, False, False]
+    assert not policy.should_retry(_status_error(401), 0)
+
+
+def test_retry_after_header():
+    assert retry_after(_status_error(429, {"Retry-After": "7"})) == 7
+    assert retry_after(_status_error(429, {"retry-after-ms": "1500", "retry-after": "7"})) == 1.5
+    in_ten_seconds = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert 8 < retry_after(_status_error(429, {"Retry-After": in_ten_seconds})) <= 10
+    assert retry_after(_status_error(429, {"Retry-After": "soon"})) is None
+    assert retry_after(_status_error(429, {})) is None
+
+
+def test_delay_follows_the_server_then_backs_off():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, max_retry_after=30.0)
+    assert 7 <= policy.delay(_status_error(429, {"retry-after": "7"}), 0) <= 8
+    # capped: a server asking for an hour doesn't stall the run
+    assert 30 <= policy.delay(_status_error(429, {"retry-after": "3600"}), 0) <= 31
+    delays = [policy.delay(_status_error(503), attempt) for attempt in range(10) for _ in range(50)]
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert max(policy.delay(_status_error(503), 0) for _ in range(200)) <= 1
@@ -0,0 +1,52 @@
+from error_map.utils.sampling import StratifiedReservoirSampler
+
+
+def _feed(sampler, strata, chunk_size):
+    for stratum, items in strata.items():
+        for start in range(0, len(items), chunk_size):
+            sampler.add(stratum, items[start:start + chunk_size])
+    return sampler.samples()
+
+
+def test_stratum_sizes_follow_ratio():
+    strata = {("m_a", "toy"): list(range(100)), ("m_b", "toy"): list(range(7)), ("m_c", "toy"): list(range(3))}
+    sampler = StratifiedReservoirSampler(0.3, {stratum: len(items) for stratum, items in strata.items()}, seed=1)
+    samples = _feed(sampler, strata, chunk_size=10)
+
+    assert {stratum: len(items) for stratum, items in samples.items()} == {("m_a", "toy"): 30, ("m_b", "toy"): 2, ("m_c", "toy"): 1}
+    for stratum, items in samples.items():
+        assert len(set(items)) == len(items)
+        assert set(items) <= set(strata[stratum])
+        # kept in arrival order
+        assert items == sorted(items)
+
+
+def test_empty_capacity_keeps_nothing():
+    sampler = StratifiedReservoirSampler(0.1, {"small": 4}, seed=0)
+    sampler.add("small", [1, 2, 3, 4])
+    sampler.add("unknown", [5, 6])
+    assert sampler.sample() == []
+
+
+def test_same_seed_same_sample_whatever_the_chunking():
+    strata = {"a": list(range(1000)), "b": list(range(500, 900))}
+    sizes = {stratum: len(items) for stratum, items in strata.items()}
+
+    first = _feed(StratifiedReservoirSampler(0.1, sizes, seed=42), strata, chunk_size=1000)
+    chunked = _feed(StratifiedReservoirSampler(0.1, sizes, seed=42), strata, chunk_size=7)
+    reordered = _feed(StratifiedReservoirSampler(0.1, sizes, seed=42), dict(reversed(list(strata.items()))), chunk_size=64)
+    other_seed = _feed(StratifiedReservoirSampler(0.1, sizes, seed=43), strata, chunk_size=1000)
+
+    assert first == chunked == reordered
+    assert first != other_seed
+
+
+def test_sample_is_uniform():
+    counts = [0] * 20
+    for seed in range(2000):
+        sampler = StratifiedReservoirSampler(0.25, {"s": 20}, seed=seed)
+        sampler.add("s", list(range(20)))
+        for item in sampler.samples()["s"]:
+            counts[item] += 1
+    # each item is kept with probability 5/20: 500 times in expectation
+    assert all(400 < count < 600 for count in counts)
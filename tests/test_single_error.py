@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from error_map.core.config import Config
+from error_map.stages.single_error import JUDGE_FIELDS, _journal_entry, _journal_key, _read_journal, analyze_single_errors
+
+
+class CountingClient:
+    """Stand-in judge answering every call, counting them"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def infer(self, template_name, template_vars, schema_name=""):
+        self.calls.append(template_vars["input_text"])
+        return {"success": True, "prompt": "prompt", "model": "judge", "template": template_name,
+                "content": json.dumps({"error_title": f"wrong: {template_vars['output_text']}"}), "full_response": "response"}
+
+
+def _records(num_errors):
+    records = [{"dataset": "toy", "example_id": f"ex_{i}", "model": "m_a", "input_text": f"question {i}",
+                "output_text": f"answer {i}", "correct_answer": "42", "score": 0.0, "error": True} for i in range(num_errors)]
+    records.append({"dataset": "toy", "example_id": "ex_0", "model": "m_b", "input_text": "question 0",
+                    "output_text": "42", "correct_answer": "42", "score": 1.0, "error": False})
+    return records
+
+
+def _journal_line(record, response="journaled"):
+    result = {field: "" for field in JUDGE_FIELDS}
+    result.update(judge_response=response, inference_success=True)
+    return json.dumps(_journal_entry(record, result)) + "\n"
+
+
+def test_read_journal_skips_a_truncated_last_line(tmp_path):
+    records = _records(3)
+    journal_path = tmp_path / "journal.jsonl"
+    journal_path.write_text(_journal_line(records[0]) + _journal_line(records[1]) + '{"key": ["toy", "ex_2", "m')
+
+    judged = _read_journal(journal_path)
+    assert set(judged) == {_journal_key(records[0]), _journal_key(records[1])}
+    assert _read_journal(tmp_path / "missing.jsonl") == {}
+
+
+def test_resume_judges_only_the_records_missing_from_the_journal(tmp_path):
+    records = _records(5)
+    journal_path = tmp_path / "journal.jsonl"
+    # an interrupted run: two judgments written, the third cut mid-write
+    journal_path.write_text(_journal_line(records[0]) + _journal_line(records[1]) + _journal_line(records[2])[:25])
+
+    client = CountingClient()
+    config = Config(data_path=str(tmp_path), output_dir=tmp_path)
+    results = asyncio.run(analyze_single_errors.__wrapped__(
+        records=records, config=config, exp_id="test", inference_client=client,
+        use_correct_predictions=True, journal_path=journal_path,
+    ))
+
+    assert sorted(client.calls) == ["question 2", "question 3", "question 4"]
+    assert [result["example_id"] for result in results] == [f"ex_{i}" for i in range(5)]
+    assert [result["judge_response"] == "journaled" for result in results] == [True, True, False, False, False]
+    assert all(result["inference_success"] for result in results)
+    assert results[0]["correct_output_list"] == ["42"]
+
+    # the new judgments were appended after the truncated line and are read back
+    assert set(_read_journal(journal_path)) == {_journal_key(record) for record in records[:5]}
+
+
+def _duplicated_records():
+    """m_a and m_b give the same wrong answer to question 0, m_c a different one"""
+    records = [{"dataset": "toy", "example_id": "ex_0", "model": model, "input_text": "question 0", "output_text": output,
+                "correct_answer": "42", "score": 0.0, "error": True} for model, output in [("m_a", "41"), ("m_b", "41"), ("m_c", "40")]]
+    records.append({"dataset": "toy", "example_id": "ex_0", "model": "m_d", "input_text": "question 0", "output_text": "42",
+                    "correct_answer": "42", "score": 1.0, "error": False})
+    return records
+
+
+def _analyze(records, client, tmp_path, **kwargs):
+    config = Config(data_path=str(tmp_path), output_dir=tmp_path)
+    return asyncio.run(analyze_single_errors.__wrapped__(
+        records=records, config=config, exp_id="test", inference_client=client, use_correct_predictions=True, **kwargs))
+
+
+def test_identical_judge_inputs_are_judged_once(tmp_path):
+    client = CountingClient()
+    results = _analyze(_duplicated_records(), client, tmp_path)
+
+    assert len(client.calls) == 2
+    # every failure gets its judgment, in the original order, with its own fields
+    assert [result["model"] for result in results] == ["m_a", "m_b", "m_c"]
+    assert results[0]["judge_response"] == results[1]["judge_response"] != results[2]["judge_response"]
+    assert results[0]["judge_input_hash"] == results[1]["judge_input_hash"] != results[2]["judge_input_hash"]
+    assert all(result["inference_success"] and result["correct_output_list"] == ["42"] for result in results)
+
+    client = CountingClient()
+    results = _analyze(_duplicated_records(), client, tmp_path, deduplicate=False)
+    assert len(client.calls) == 3 and [result["model"] for result in results] == ["m_a", "m_b", "m_c"]
+
+
+def test_different_correct_outputs_are_judged_apart(tmp_path):
+    records = _duplicated_records()[:2]
+    # same question and answer on another example, whose correct outputs differ
+    records[1] = {**records[1], "example_id": "ex_1"}
+    records.append({**records[0], "example_id": "ex_1", "model": "m_d", "output_text": "forty-two", "score": 1.0, "error": False})
+    records.append({**records[0], "model": "m_d", "output_text": "42", "score": 1.0, "error": False})
+
+    client = CountingClient()
+    results = _analyze(records, client, tmp_path)
+    assert len(client.calls) == 2
+    assert results[0]["judge_input_hash"] != results[1]["judge_input_hash"]
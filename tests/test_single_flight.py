@@ -0,0 +1,68 @@
+import asyncio
+
+from error_map.inference.client import InferenceClient
+from error_map.inference.synthetic import SyntheticJudge
+from error_map.utils.cache_store import CacheStore
+
+TEMPLATE = "classify_errors.j2"
+SCHEMA = "classify_errors_schema.json"
+
+
+def _client(tmp_path, latency=0.2):
+    judge = SyntheticJudge(latency="fixed", latency_mean=latency)
+    return InferenceClient("synthetic", max_workers=8, cache_store=CacheStore(tmp_path), synthetic_judge=judge), judge
+
+
+def _template_vars(error="wrong"):
+    return {"data_type": "error_title", "data": [error], "taxonomy": {}}
+
+
+def test_identical_calls_in_flight_share_one_provider_call(tmp_path):
+    client, judge = _client(tmp_path)
+
+    async def scenario():
+        return await asyncio.gather(*[client.infer(TEMPLATE, _template_vars(), schema_name=SCHEMA, use_cache=False)
+                                      for _ in range(5)],
+                                    client.infer(TEMPLATE, _template_vars("other"), schema_name=SCHEMA, use_cache=False))
+    results = asyncio.run(scenario())
+
+    assert judge.calls == 2
+    assert all(result["success"] for result in results)
+    assert len({result["content"] for result in results[:5]}) == 1
+    assert [bool(result.get("coalesced")) for result in results] == [False] + [True] * 4 + [False]
+    assert client.call_stats()["coalesced"] == 4 and client.call_stats()["calls"] == 6
+    assert not client._in_flight_calls
+
+
+def test_waiters_call_again_when_the_leading_call_is_cancelled(tmp_path):
+    client, judge = _client(tmp_path)
+
+    async def scenario():
+        leader = asyncio.ensure_future(client.infer(TEMPLATE, _template_vars(), schema_name=SCHEMA))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(client.infer(TEMPLATE, _template_vars(), schema_name=SCHEMA))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        result = await asyncio.wait_for(follower, 2.0)
+        assert leader.cancelled()
+        return result
+    result = asyncio.run(scenario())
+
+    # the follower made its own call
+    assert judge.calls == 2 and result["success"] and not result.get("coalesced")
+    assert client.call_stats()["coalesced"] == 0
+
+
+def test_cancelled_waiter_leaves_the_leading_call_alone(tmp_path):
+    client, judge = _client(tmp_path)
+
+    async def scenario():
+        leader = asyncio.ensure_future(client.infer(TEMPLATE, _template_vars(), schema_name=SCHEMA))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(client.infer(TEMPLATE, _template_vars(), schema_name=SCHEMA))
+        await asyncio.sleep(0.05)
+        follower.cancel()
+        return await asyncio.wait_for(leader, 2.0)
+    result = asyncio.run(scenario())
+
+    assert judge.calls == 1 and result["success"]
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from error_map.inference.streaming import StreamAbortedError, StreamingJSONValidator
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": ["A\"B", "café", "yes"]},
+        "count": {"type": "integer"},
+        "notes": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 2},
+    },
+    "required": ["verdict"],
+    "additionalProperties": False,
+}
+
+
+def _validate(text, chunk_size=1, schema=SCHEMA, **kwargs):
+    validator = StreamingJSONValidator(schema, **kwargs)
+    for start in range(0, len(text), chunk_size):
+        validator.feed(text[start:start + chunk_size])
+    validator.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+@pytest.mark.parametrize("text", [
+    json.dumps({"verdict": "yes", "count": 3, "notes": "a \"quoted\" \\ note\n", "tags": ["x", "y"]}),
+    # escaped enum values
+    '{"verdict": "A\\"B"}',
+    '{"verdict": "\\u0041\\"\\u0042"}',
+    json.dumps({"verdict": "café"}, ensure_ascii=True),
+    # integers with an exponent or a zero fractional part
+    '{"verdict": "yes", "count": 1e2}',
+    '{"verdict": "yes", "count": 4.0}',
+    '```json\n{"verdict": "yes"}\n```',
+])
+def test_accepts_valid_responses(text, chunk_size):
+    _validate(text, chunk_size)
+
+
+@pytest.mark.parametrize("text, reason", [
+    ('{"verdict": "no"}', "is not one of"),
+    ('{"verdict": "\\u0042"}', "is not one of"),
+    ('{"verdict": "yes", "count": 2.5}', "is not an integer"),
+    ('{"verdict": "yes", "count": "2"}', "string instead of integer"),
+    ('{"verdict": "yes", "extra": 1}', "unknown property"),
+    ('{"count": 1}', "missing required properties"),
+    ('{"verdict": "yes", "tags": ["a", "b", "c"]}', "more than 2 items"),
+    ('{"verdict": "yes", "notes": "\\x"}', "invalid escape"),
+    ('Sure! {"verdict": "yes"}', "instead of a value"),
+    ('``{"verdict": "yes"}', "text before the JSON value"),
+    ('{"verdict": "yes"} done', "text after the JSON value"),
+    ('{"verdict": "yes", "notes": "cut', "truncated response"),
+    ('{"verdict": "yes"', "truncated response"),
+    ('', "truncated response"),
+])
+def test_aborts_invalid_responses(text, reason):
+    with pytest.raises(StreamAbortedError, match=reason):
+        _validate(text)
+
+
+def test_aborts_on_the_first_invalid_chunk():
+    validator = StreamingJSONValidator(SCHEMA)
+    validator.feed('{"verdict": "y')
+    with pytest.raises(StreamAbortedError):
+        validator.feed('o')
+    assert validator.length == len('{"verdict": "yo')
+
+
+def test_top_level_scalars_end_with_the_stream():
+    _validate("1e2", schema={"type": "integer"})
+    _validate("true", schema={"type": "boolean"})
+    with pytest.raises(StreamAbortedError, match="truncated response"):
+        _validate("tru", schema={"type": "boolean"})
+
+
+def test_aborts_runaway_responses():
+    with pytest.raises(StreamAbortedError, match="longer than 50 characters"):
+        _validate(json.dumps({"verdict": "yes", "notes": "x" * 100}), chunk_size=10, max_chars=50)
+    looping = "".join(f"the same sentence again and again, {n % 2}. " for n in range(500))
+    with pytest.raises(StreamAbortedError, match="repeats itself"):
+        _validate(json.dumps({"verdict": "yes", "notes": looping}), chunk_size=64)
+
+
+class _StreamingProvider:
+    """Stand-in for LiteLLM streaming `text` in 4-character chunks"""
+
+    def __init__(self, text):
+        self.text = text
+
+    async def acompletion(self, **kwargs):
+        async def chunks():
+            for start in range(0, len(self.text), 4):
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(
+                    delta=SimpleNamespace(content=self.text[start:start + 4]), finish_reason=None)])
+        return chunks()
+
+
+def _stream(text, call_params, tmp_path):
+    from error_map.inference.client import InferenceClient
+    from error_map.utils.cache_store import CacheStore
+
+    client = InferenceClient(inference_type="litellm", max_workers=1, cache_store=CacheStore(tmp_path),
+                             litellm_config={"model": "openai/judge", "api_base": "http://localhost:1", "api_key": "key"})
+    client.client = _StreamingProvider(text)
+
+    async def call():
+        async with client:
+            return await client._stream_completion({"model": "openai/judge", "max_tokens": 100, **call_params}, {})
+    return asyncio.run(call()).choices[0].message.content
+
+
+def test_only_calls_with_a_schema_are_validated(tmp_path):
+    response_format = {"type": "json_schema", "json_schema": {"name": "schema", "schema": SCHEMA}}
+    assert _stream('{"verdict": "yes"}', {"response_format": response_format}, tmp_path) == '{"verdict": "yes"}'
+    with pytest.raises(StreamAbortedError, match="instead of a value"):
+        _stream("Free text answer", {"response_format": response_format}, tmp_path)
+    assert _stream("Free text answer", {}, tmp_path) == "Free text answer"